@@ -4,9 +4,16 @@ Excelテンプレート作成スクリプト（テーブル構造なし）
 ヘッダー情報のみを含む最小限のテンプレートを作成
 """
 
+import sys
+from pathlib import Path
+
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-import base64
+
+# 実行時のカレントディレクトリによらず standalone-app を参照する
+APP_DIR = Path(__file__).resolve().parent / 'standalone-app'
+sys.path.insert(0, str(APP_DIR))
+from template_artifact import write_template_artifacts  # noqa: E402
 
 # 新しいワークブック作成
 wb = Workbook()
@@ -39,36 +46,16 @@ ws.row_dimensions[10].height = 20
 print("✅ クリーンテンプレート作成完了")
 
 # ファイル保存
-template_path = 'standalone-app/template-clean-no-table.xlsx'
+template_path = APP_DIR / 'template-clean-no-table.xlsx'
 wb.save(template_path)
 print(f"💾 保存先: {template_path}")
 
-# Base64エンコード
+# template-data.js（テンプレート本体）と template-manifest.js に出力
 with open(template_path, 'rb') as f:
     template_bytes = f.read()
-    template_base64 = base64.b64encode(template_bytes).decode('utf-8')
-
-# template-data.jsに出力
-js_content = f"""/**
- * Excelテンプレートデータ（Base64エンコード）
- * Version: 2.3.3 - テーブル構造なしバージョン
- */
-
-const TEMPLATE_BASE64 = '{template_base64}';
-
-// ブラウザ環境で使用
-if (typeof window !== 'undefined') {{
-    window.TEMPLATE_BASE64 = TEMPLATE_BASE64;
-}}
-
-// Node.js環境で使用
-if (typeof module !== 'undefined' && module.exports) {{
-    module.exports = TEMPLATE_BASE64;
-}}
-"""
 
-with open('standalone-app/template-data.js', 'w', encoding='utf-8') as f:
-    f.write(js_content)
+manifest = write_template_artifacts(
+    template_bytes, str(APP_DIR), 'Excelテンプレートデータ（Base64エンコード） Version: 2.3.3 - テーブル構造なしバージョン')
 
-print(f"✅ template-data.js 更新完了")
-print(f"📊 Base64サイズ: {len(template_base64)} 文字")
+print("✅ template-data.js / template-manifest.js 更新完了")
+print(f"📊 Base64サイズ: {manifest['base64Length']} 文字")
@@ -24,7 +24,9 @@ let previousMonthFilteredData = null;
 // 'utf8-first': UTF-8優先
 let currentEncodingMode = 'ansi-first';  // デフォルトをANSI優先に変更
 
-// テンプレートファイルは template-data.js から読み込み（TEMPLATE_BASE64定数）
+// テンプレートファイルは template-manifest.js（TEMPLATE_MANIFEST定数）のみ起動時に読み込み、
+// 本体の template-data.js（TEMPLATE_BASE64定数）は loadTemplate() の初回呼び出し時に読み込む
+let templateBufferPromise = null;
 
 /**
  * ============================================================================
@@ -35,8 +37,10 @@ document.addEventListener('DOMContentLoaded', () => {
     loadSettings();
     setupEventListeners();
 
-    // テンプレートデータ読み込み確認
-    if (typeof TEMPLATE_BASE64 !== 'undefined') {
+    // テンプレートマニフェスト確認（本体はExcel生成時に読み込む）
+    if (typeof TEMPLATE_MANIFEST !== 'undefined') {
+        console.log(`✅ テンプレートマニフェスト読み込み成功: ${TEMPLATE_MANIFEST.file} (${TEMPLATE_MANIFEST.size} バイト)`);
+    } else if (typeof TEMPLATE_BASE64 !== 'undefined') {
         console.log('✅ テンプレートデータ読み込み成功:', TEMPLATE_BASE64.substring(0, 50) + '...');
     } else {
         console.error('❌ テンプレートデータが読み込まれていません');
@@ -969,12 +973,52 @@ async function handleExcelDownload() {
 }
 
 /**
- * テンプレート読み込み（ハードコーディングされたBase64から読み込み）
+ * テンプレート読み込み（初回のみ template-data.js を読み込んでデコードし、以降は結果を再利用）
  */
 async function loadTemplate() {
+    if (!templateBufferPromise) {
+        templateBufferPromise = decodeTemplate().catch(error => {
+            // 失敗した場合は次回呼び出し時に再試行
+            templateBufferPromise = null;
+            throw error;
+        });
+    }
+    // ExcelJSが読み込み中にバッファを変更しても影響しないよう複製を返す
+    const buffer = await templateBufferPromise;
+    return buffer.slice(0);
+}
+
+/**
+ * テンプレート本体（template-data.js）を<script>タグで読み込む
+ * file:// でも動作するよう fetch ではなく<script>タグを使用
+ */
+function loadTemplateScript() {
+    if (typeof TEMPLATE_BASE64 !== 'undefined') {
+        return Promise.resolve();
+    }
+    if (typeof TEMPLATE_MANIFEST === 'undefined') {
+        return Promise.reject(new Error('テンプレートデータが見つかりません。template-manifest.jsが読み込まれていることを確認してください。'));
+    }
+
+    return new Promise((resolve, reject) => {
+        const script = document.createElement('script');
+        script.src = TEMPLATE_MANIFEST.file;
+        script.onload = () => resolve();
+        script.onerror = () => reject(new Error(`テンプレートデータ（${TEMPLATE_MANIFEST.file}）を読み込めませんでした`));
+        document.head.appendChild(script);
+    });
+}
+
+/**
+ * テンプレート読み込み・Base64デコード・マニフェスト照合
+ */
+async function decodeTemplate() {
+    const startTime = performance.now();
+    await loadTemplateScript();
     if (typeof TEMPLATE_BASE64 === 'undefined') {
         throw new Error('テンプレートデータが見つかりません。template-data.jsが読み込まれていることを確認してください。');
     }
+    const loadedTime = performance.now();
 
     console.log('組み込みテンプレートを読み込み中...');
 
@@ -984,8 +1028,23 @@ async function loadTemplate() {
     for (let i = 0; i < binaryString.length; i++) {
         bytes[i] = binaryString.charCodeAt(i);
     }
+    const decodedTime = performance.now();
+
+    if (typeof TEMPLATE_MANIFEST !== 'undefined') {
+        if (bytes.length !== TEMPLATE_MANIFEST.size) {
+            throw new Error(`テンプレートデータのサイズがマニフェストと一致しません（${bytes.length} / ${TEMPLATE_MANIFEST.size} バイト）`);
+        }
+        // SHA-256照合（crypto.subtle が使えない環境ではサイズのみ確認）
+        if (window.crypto && window.crypto.subtle) {
+            const digest = await window.crypto.subtle.digest('SHA-256', bytes);
+            const hex = Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+            if (hex !== TEMPLATE_MANIFEST.sha256) {
+                throw new Error('テンプレートデータのハッシュがマニフェストと一致しません。template-data.jsを再作成してください。');
+            }
+        }
+    }
 
-    console.log('テンプレート読み込み成功: クリーン版テンプレート');
+    console.log(`テンプレート読み込み成功: クリーン版テンプレート（読み込み ${(loadedTime - startTime).toFixed(1)}ms / デコード ${(decodedTime - loadedTime).toFixed(1)}ms）`);
     return bytes.buffer;
 }
 
@@ -1387,7 +1446,7 @@ function handleSettingsClear() {
  * テンプレートファイル選択（廃止：組み込みテンプレートを使用）
  */
 // function handleTemplateFileSelect() は削除されました
-// テンプレートはtemplate-data.jsから読み込まれます
+// テンプレートはtemplate-data.jsから読み込まれます（loadTemplate() の初回呼び出し時）
 
 /**
  * ============================================================================
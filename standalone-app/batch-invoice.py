@@ -0,0 +1,20 @@
+"""
+調剤券請求書をCSVフォルダから一括作成するスクリプト
+
+使い方:
+1. Pythonをインストール (3.8以上)
+2. pip install -r requirements.txt
+3. python batch-invoice.py CSVフォルダ -o 出力フォルダ --stores stores.json
+
+店舗設定JSON（stores.json）の例:
+{
+  "tsuruha_asahikawa_01.csv": {"pharmacy_name": "○○薬局 旭川店", "medical_code": "0141234567"}
+}
+"""
+
+import sys
+
+from invoice_batch.batch import main
+
+if __name__ == '__main__':
+    sys.exit(main())
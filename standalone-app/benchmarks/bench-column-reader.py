@@ -0,0 +1,95 @@
+"""
+CSV読み込みのベンチマーク（全列を解析する stream_csv_file vs 必要な列のみの stream_csv_columns）
+
+合成HR形式CSV（70列）と、65列目より後ろに備考などの列を追加した列数の多いCSVで
+読み込みのみ・読み込み + 旭川市フィルタの時間とピークメモリを比較する。
+
+使い方:
+python benchmarks/bench-column-reader.py
+python benchmarks/bench-column-reader.py --rows 500000 --extra-columns 200
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch.column_reader import READ_COLUMNS, stream_csv_columns  # noqa: E402
+from invoice_batch.csv_reader import get_column, stream_csv_file  # noqa: E402
+from invoice_batch.patient_filter import filter_patients  # noqa: E402
+from synthetic_hr import format_row, generate_rows  # noqa: E402
+
+REMARK = 'ｺﾒﾝﾄ 備考欄の自由記載テキスト'
+
+
+def write_csv(path: Path, rows: int, extra_columns: int):
+    """合成HR形式CSV（cp932）の各行の末尾に extra_columns 列を追加して書き出す"""
+    extra = [REMARK] * extra_columns
+    with open(path, 'w', encoding='cp932', newline='\n', buffering=1024 * 1024) as f:
+        for row in generate_rows(rows):
+            f.write(format_row(row + extra) + '\n')
+
+
+def read_only(reader, path: Path):
+    records, _ = reader(path)
+    return sum(1 for _ in records)
+
+
+def read_and_filter(reader, path: Path):
+    records, _ = reader(path)
+    return len(filter_patients(records, 1, keep_all=False)['target'])
+
+
+def measure(func, *args):
+    """実行時間とピークメモリ（tracemallocは処理を遅くするため時間とは別に計測）"""
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024, result
+
+
+def verify(path: Path):
+    """参照列の値が stream_csv_file() と一致することを確認"""
+    stream, _ = stream_csv_file(path)
+    columns, _ = stream_csv_columns(path)
+    for expected, row in zip(stream, columns):
+        assert [get_column(row, c) for c in READ_COLUMNS] == [get_column(expected, c) for c in READ_COLUMNS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='必要な列のみのCSV読み込みのベンチマーク')
+    parser.add_argument('--rows', type=int, default=100_000, help='データ行数')
+    parser.add_argument('--extra-columns', type=int, default=130, help='列数の多いCSVで追加する列数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for extra_columns in (0, args.extra_columns):
+            path = Path(tmp) / f'hr_{extra_columns}.csv'
+            write_csv(path, args.rows, extra_columns)
+            size_mb = path.stat().st_size / 1024 / 1024
+            print(f'📄 {args.rows:,} 行 / {70 + extra_columns} 列 ({size_mb:.0f} MB)')
+            verify(path)
+
+            for label, func in (('読み込み', read_only), ('読み込み+フィルタ', read_and_filter)):
+                stream_elapsed, stream_peak, expected = measure(func, stream_csv_file, path)
+                columns_elapsed, columns_peak, result = measure(func, stream_csv_columns, path)
+                assert result == expected
+                print(f'  {label:<10} 全列: {stream_elapsed:7.2f} 秒 / ピーク {stream_peak:6.1f} MB | '
+                      f'必要な列のみ: {columns_elapsed:7.2f} 秒 / ピーク {columns_peak:6.1f} MB '
+                      f'({stream_elapsed / columns_elapsed:.1f}倍)')
+        print('✅ 参照列の値が一致')
+
+
+if __name__ == '__main__':
+    main()
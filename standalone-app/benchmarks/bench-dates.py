@@ -0,0 +1,70 @@
+"""
+日付解析のベンチマーク（キャッシュなし vs LRUキャッシュ）
+
+合成HR形式CSV（1か月分）の生年月日・調剤年月日を、パイプラインと同じ回数だけ解析する
+（調剤年月日はグループ化で2回、生年月日はExcel出力で1回）。
+
+使い方:
+python benchmarks/bench-dates.py
+python benchmarks/bench-dates.py --rows 1000000 --cache-size 8192
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch.date_parser import DEFAULT_CACHE_SIZE, DateParser  # noqa: E402
+from synthetic_hr import generate_rows  # noqa: E402
+
+
+def collect_dates(rows: int, seed: int):
+    """合成CSVの生年月日（12列目）・調剤年月日（55列目）"""
+    birth_dates, treatment_dates = [], []
+    for row in generate_rows(rows, seed):
+        if row[0] in ('H', '項目解析結果'):
+            continue
+        birth_dates.append(row[11])
+        treatment_dates.append(row[54])
+    return birth_dates, treatment_dates
+
+
+def run(parser: DateParser, birth_dates, treatment_dates) -> float:
+    start = time.perf_counter()
+    for value in treatment_dates:
+        parser.parse_yyyymmdd(value)
+    for value in treatment_dates:
+        parser.parse_yyyymmdd(value)
+    for value in birth_dates:
+        parser.parse_japanese_date(value)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日付解析のベンチマーク')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='合成CSVの行数（1か月分）')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE, help='LRUキャッシュの上限')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    args = parser.parse_args()
+
+    birth_dates, treatment_dates = collect_dates(args.rows, args.seed)
+    calls = len(birth_dates) + len(treatment_dates) * 2
+    print(f'生年月日: {len(set(birth_dates)):,} 種類 / 調剤年月日: {len(set(treatment_dates)):,} 種類 / 解析 {calls:,} 回')
+
+    uncached = run(DateParser(maxsize=0), birth_dates, treatment_dates)
+    cached_parser = DateParser(maxsize=args.cache_size)
+    cached = run(cached_parser, birth_dates, treatment_dates)
+
+    print(f'キャッシュなし: {uncached:6.2f} 秒 ({calls / uncached:>12,.0f} 回/秒)')
+    print(f'LRUキャッシュ:  {cached:6.2f} 秒 ({calls / cached:>12,.0f} 回/秒) | {uncached / cached:.1f} 倍')
+    for name, stats in cached_parser.stats().items():
+        print(f"  {name:<9} ヒット率 {stats['hit_rate']:6.1%} "
+              f"(ヒット {stats['hits']:,} / ミス {stats['misses']:,} / 保持 {stats['size']:,}/{stats['maxsize']:,})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+エンコーディング判定のベンチマーク（全体を候補ごとにデコード vs 先頭サンプル判定 + 1回デコード）
+
+使い方:
+python benchmarks/bench-encoding.py
+python benchmarks/bench-encoding.py --size-mb 500
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from invoice_batch.encoding_detect import detect_file_encoding, has_garbled_text  # noqa: E402
+
+try:
+    import chardet
+except ImportError:
+    chardet = None
+
+SAMPLE_CSV = Path(__file__).resolve().parent.parent.parent / 'sample' / 'test_data_20250202_sjis.csv'
+
+
+def build_cp932_file(path: Path, size_mb: int):
+    """サンプルCSV（CP932）のデータ行を繰り返して指定サイズのファイルを作成"""
+    lines = SAMPLE_CSV.read_bytes().splitlines(keepends=True)
+    header, body = b''.join(lines[:1]), b''.join(lines[1:])
+    target = size_mb * 1024 * 1024
+    with open(path, 'wb') as f:
+        f.write(header)
+        written = len(header)
+        while written < target:
+            f.write(body)
+            written += len(body)
+
+
+def legacy_decode(path: Path):
+    """app.js の parseCSVFile() と同じく全体をUTF-8 → Shift-JIS の順にデコードして文字化けチェック"""
+    data = path.read_bytes()
+    text = data.decode('utf-8', errors='replace')
+    if not has_garbled_text(text):
+        return text, 'UTF-8'
+    text = data.decode('cp932', errors='replace')
+    return text, 'Shift-JIS'
+
+
+def legacy_detect(path: Path):
+    """tool/vba_import_gui_v2.py の旧 detect_encoding()（UTF-8 → Shift-JIS → chardet で全体を読む）"""
+    try:
+        path.read_text(encoding='utf-8')
+        return 'UTF-8'
+    except UnicodeDecodeError:
+        pass
+    try:
+        path.read_text(encoding='shift_jis')
+        return 'Shift-JIS'
+    except UnicodeDecodeError:
+        pass
+    if chardet is None:
+        return 'Unknown'
+    return chardet.detect(path.read_bytes())['encoding'] or 'Unknown'
+
+
+def sampled_decode(path: Path):
+    """先頭サンプルで判定し、全体は1回だけデコード"""
+    detection = detect_file_encoding(path, 'utf8-first')
+    return path.read_bytes().decode(detection.codec, errors='replace'), detection.label
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='エンコーディング判定のベンチマーク')
+    parser.add_argument('--size-mb', type=int, default=100, help='生成するCP932ファイルのサイズ（MB）')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'large_cp932.csv'
+        build_cp932_file(path, args.size_mb)
+        size_mb = path.stat().st_size / 1024 / 1024
+        print(f'📄 {size_mb:.0f} MB (CP932)')
+
+        elapsed, label = timed(legacy_detect, path)
+        print(f'判定のみ   旧方式（全体を順に読む）: {elapsed:8.3f} 秒  → {label}'
+              + ('' if chardet else '（chardet未インストール）'))
+        elapsed, detection = timed(detect_file_encoding, path, 'utf8-first')
+        print(f'判定のみ   先頭サンプル         : {elapsed:8.3f} 秒  → {detection.label} '
+              f'(confidence={detection.confidence})')
+
+        legacy_elapsed, (legacy_text, _) = timed(legacy_decode, path)
+        print(f'判定+デコード 旧方式            : {legacy_elapsed:8.3f} 秒  ({size_mb / legacy_elapsed:7.1f} MB/秒)')
+        sampled_elapsed, (sampled_text, _) = timed(sampled_decode, path)
+        print(f'判定+デコード 先頭サンプル      : {sampled_elapsed:8.3f} 秒  ({size_mb / sampled_elapsed:7.1f} MB/秒)')
+
+        assert legacy_text == sampled_text
+        print(f'✅ デコード結果一致 / {legacy_elapsed / sampled_elapsed:.1f}倍')
+
+
+if __name__ == '__main__':
+    main()
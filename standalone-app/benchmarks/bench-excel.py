@@ -0,0 +1,70 @@
+"""
+請求書Excel生成のベンチマーク（openpyxlでテンプレート読み込み vs ストリーム書き込み）
+
+使い方:
+python benchmarks/bench-excel.py
+python benchmarks/bench-excel.py --rows 1000,10000,100000 --skip-openpyxl-above 10000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from invoice_batch import filter_patients, group_patients_by_recipient, load_template_bytes, read_csv_file  # noqa: E402
+from invoice_batch.excel_writer import generate_excel  # noqa: E402
+from invoice_batch.xlsx_stream import write_excel_stream  # noqa: E402
+
+SAMPLE_CSV = Path(__file__).resolve().parent.parent.parent / 'sample' / 'test_data_20250202_sjis.csv'
+
+
+def build_groups(count: int):
+    """サンプルCSVのグループを繰り返して count 行分のグループを作成"""
+    rows, _ = read_csv_file(SAMPLE_CSV)
+    groups = group_patients_by_recipient(filter_patients(rows, 1)['target'])
+    return [groups[i % len(groups)] for i in range(count)]
+
+
+def measure(func):
+    """実行時間とピークメモリ（tracemallocは処理を遅くするため時間とは別に計測）"""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='請求書Excel生成のベンチマーク')
+    parser.add_argument('--rows', default='500,5000,50000', help='行数（カンマ区切り）')
+    parser.add_argument('--skip-openpyxl-above', type=int, default=5000,
+                        help='この行数を超える場合はopenpyxl版の計測を省略')
+    args = parser.parse_args()
+
+    template = load_template_bytes()
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in [int(s) for s in args.rows.split(',') if s]:
+            groups = build_groups(count)
+            line = f'{count:>8,} 行 |'
+            if count <= args.skip_openpyxl_above:
+                out = Path(tmp) / 'openpyxl.xlsx'
+                elapsed, peak = measure(lambda: out.write_bytes(generate_excel(groups, template, 'テスト薬局', '0112345678')))
+                line += f' openpyxl: {elapsed:7.2f} 秒 / ピーク {peak:7.1f} MB |'
+            else:
+                line += f" openpyxl: {'(skip)':>27} |"
+            out = Path(tmp) / 'stream.xlsx'
+            elapsed, peak = measure(lambda: write_excel_stream(groups, template, out, 'テスト薬局', '0112345678'))
+            line += f' ストリーム: {elapsed:7.2f} 秒 / ピーク {peak:7.1f} MB'
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
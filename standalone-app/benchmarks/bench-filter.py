@@ -0,0 +1,101 @@
+"""
+旭川市フィルタのベンチマーク（1行ずつ処理 vs pandas列演算）
+
+使い方:
+python benchmarks/bench-filter.py
+python benchmarks/bench-filter.py --sizes 10000,100000 --json result.json
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from invoice_batch.csv_reader import read_csv_file  # noqa: E402
+from invoice_batch.patient_filter import filter_patients, is_data_row  # noqa: E402
+from invoice_batch.vector_filter import compute_flags, filter_patients_frame, frame_from_records  # noqa: E402
+
+SAMPLE_CSV = Path(__file__).resolve().parent.parent.parent / 'sample' / 'test_data_20250202_sjis.csv'
+
+INSURER_CHOICES = ('12016010', '12012019', '01010016', '06010013', '')
+PUBLIC_CODE_CHOICES = ('', '', '', '12', '21', '15', '16', '54')
+
+
+def build_variants(count: int, seed: int = 0):
+    """サンプルCSVのデータ行を元に保険者番号・受給者番号・公費番号を変えた行を作成"""
+    rng = random.Random(seed)
+    rows, _ = read_csv_file(SAMPLE_CSV)
+    base_rows = [row for row in rows if is_data_row(row)]
+
+    variants = []
+    for i in range(count):
+        row = list(base_rows[i % len(base_rows)])
+        row[22] = rng.choice(INSURER_CHOICES)           # 23列目: 保険者番号
+        row[57] = rng.choice((row[57], row[57], ''))   # 58列目: 受給者番号
+        for index in (21, 25, 29):                      # 22/26/30列目: 公費種別番号
+            row[index] = rng.choice(PUBLIC_CODE_CHOICES)
+        variants.append(row)
+    return variants
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def run(sizes, skip_scalar_above: int):
+    variants = build_variants(997)
+    results = []
+    for size in sizes:
+        records = [variants[i % len(variants)] for i in range(size)]
+        entry = {'rows': size}
+
+        if size <= skip_scalar_above:
+            elapsed, scalar = timed(lambda: filter_patients(records, 1, keep_all=False))
+            entry['scalar_rows_per_sec'] = size / elapsed
+            entry['scalar_target'] = len(scalar['target'])
+
+        elapsed_frame, frame = timed(lambda: frame_from_records(records))
+        elapsed_flags, _ = timed(lambda: compute_flags(frame))
+        elapsed_filter, vector = timed(lambda: filter_patients_frame(frame, 1))
+        entry['frame_build_sec'] = elapsed_frame
+        entry['vector_flags_rows_per_sec'] = size / elapsed_flags
+        entry['vector_filter_rows_per_sec'] = size / elapsed_filter
+        entry['vector_target'] = len(vector['target'])
+
+        if 'scalar_target' in entry and entry['scalar_target'] != entry['vector_target']:
+            raise AssertionError(f"判定結果が一致しません: {entry['scalar_target']} != {entry['vector_target']}")
+
+        results.append(entry)
+        scalar_rate = entry.get('scalar_rows_per_sec')
+        scalar_text = f'{scalar_rate:>12,.0f}' if scalar_rate else f"{'(skip)':>12}"
+        print(f"{size:>10,} 行 | 1行ずつ: {scalar_text} 行/秒 | "
+              f"列演算(判定のみ): {entry['vector_flags_rows_per_sec']:>12,.0f} 行/秒 | "
+              f"列演算(レコード作成込み): {entry['vector_filter_rows_per_sec']:>12,.0f} 行/秒")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='旭川市フィルタのベンチマーク')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='行数（カンマ区切り）')
+    parser.add_argument('--skip-scalar-above', type=int, default=10_000_000,
+                        help='この行数を超える場合は1行ずつ処理の計測を省略')
+    parser.add_argument('--json', help='結果をJSONで保存')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    results = run(sizes, args.skip_scalar_above)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'💾 保存先: {args.json}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+患者の識別ハッシュのベンチマーク（処理速度・衝突率）
+
+合成請求データ（既定100万件、--claims 10000000 で1000万件。患者1人あたり平均 --visits 回受診し、
+患者ごとに氏名・受給者番号はすべて異なる）について
+- 処理速度: simpleHash（旧形式）/ patient_fingerprint（1件ずつ）/ fingerprint_frame（列単位）
+- 衝突率: 別の患者同士で同じ値になった件数（simpleHash は氏名、識別ハッシュは氏名・生年月日・受給者番号）
+を計測する。データはチャンクごとに生成し、ハッシュ値のみ保持する。
+
+使い方:
+python benchmarks/bench-fingerprint.py
+python benchmarks/bench-fingerprint.py --claims 10000000 --chunk 1000000
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch.fingerprint import patient_fingerprint  # noqa: E402
+from invoice_batch.patient_filter import simple_hash  # noqa: E402
+from invoice_batch.vector_filter import fingerprint_frame  # noqa: E402
+from synthetic_hr import BIRTH_ERAS, SURNAMES  # noqa: E402
+
+KATAKANA = 'アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワヲン'
+# 1件ずつの計測はチャンクの一部のみ（全件では時間がかかりすぎる）
+SCALAR_SAMPLE = 200_000
+
+
+def given_name(index: int) -> str:
+    """連番から重複しない名（カタカナ）を作る"""
+    chars = []
+    while True:
+        index, digit = divmod(index, len(KATAKANA))
+        chars.append(KATAKANA[digit])
+        if index == 0:
+            return ''.join(chars)
+
+
+def patient_row(rng: random.Random, patient: int):
+    """患者番号から氏名・生年月日・受給者番号を作る（氏名・受給者番号は患者ごとに異なる）"""
+    surname, _ = SURNAMES[patient % len(SURNAMES)]
+    era, offset, first_year, last_year = BIRTH_ERAS[rng.randrange(len(BIRTH_ERAS))]
+    birth = f'{era}{rng.randrange(first_year, last_year) - offset}年{rng.randint(1, 12)}月{rng.randint(1, 28)}日'
+    return f'{surname} {given_name(patient // len(SURNAMES))}', birth, f'{patient:08d}'
+
+
+def make_chunk(rng: random.Random, patients, start: int, count: int, visits: int) -> pd.DataFrame:
+    """合成請求データ（列名はCSV列番号）。patients は患者番号 → 行のキャッシュ"""
+    rows = []
+    for claim in range(start, start + count):
+        patient = claim // visits
+        row = patients.get(patient)
+        if row is None:
+            row = patients[patient] = patient_row(rng, patient)
+        rows.append(row)
+    # 前のチャンクの患者は以降に現れない
+    for patient in [p for p in patients if p < start // visits]:
+        del patients[patient]
+    rng.shuffle(rows)
+    names, births, recipients = zip(*rows)
+    return pd.DataFrame({10: names, 12: births, 58: recipients}, dtype=object)
+
+
+def collisions(values: np.ndarray, distinct: int) -> int:
+    """別の患者と同じハッシュになった患者数（患者数 - 異なるハッシュの数）"""
+    return distinct - len(np.unique(values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='患者の識別ハッシュのベンチマーク')
+    parser.add_argument('--claims', type=int, default=1_000_000, help='請求件数（1000万件まで）')
+    parser.add_argument('--visits', type=int, default=3, help='患者1人あたりの受診回数')
+    parser.add_argument('--chunk', type=int, default=500_000, help='1回に生成する件数')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    legacy = np.empty(args.claims, dtype=np.int64)
+    fingerprints = np.empty(args.claims, dtype=np.uint64)
+    seconds = {'simpleHash': 0.0, 'scalar': 0.0, 'frame': 0.0}
+    scalar_rows = 0
+    patients = {}
+
+    for start in range(0, args.claims, args.chunk):
+        count = min(args.chunk, args.claims - start)
+        frame = make_chunk(rng, patients, start, count, args.visits)
+
+        begin = time.perf_counter()
+        legacy[start:start + count] = [int(simple_hash(name), 16) for name in frame[10]]
+        seconds['simpleHash'] += time.perf_counter() - begin
+
+        sample = frame.iloc[:SCALAR_SAMPLE].to_numpy().tolist()
+        begin = time.perf_counter()
+        scalar = [patient_fingerprint(name, birth, recipient) for name, birth, recipient in sample]
+        seconds['scalar'] += time.perf_counter() - begin
+        scalar_rows += len(sample)
+
+        begin = time.perf_counter()
+        fingerprints[start:start + count] = fingerprint_frame(frame)
+        seconds['frame'] += time.perf_counter() - begin
+
+        assert scalar == fingerprints[start:start + len(scalar)].tolist()
+
+    distinct = (args.claims + args.visits - 1) // args.visits
+    print(f'📊 請求件数: {args.claims:,} 件 / 患者数: {distinct:,} 人')
+    for name, rows in (('simpleHash', args.claims), ('scalar', scalar_rows), ('frame', args.claims)):
+        print(f'{name:>11}: {seconds[name]:7.2f} 秒 ({rows / seconds[name]:,.0f} 件/秒)')
+
+    legacy_collisions = collisions(legacy, distinct)
+    fingerprint_collisions = collisions(fingerprints, distinct)
+    expected = distinct * (distinct - 1) / 2 / 2.0 ** 64
+    print(f'💥 衝突: simpleHash {legacy_collisions:,} 人 ({legacy_collisions / distinct:.4%}) / '
+          f'識別ハッシュ {fingerprint_collisions:,} 人（64bitの期待値 {expected:.2g} 組）')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+患者グループ化のベンチマーク（従来の実装 vs 集合・初回調剤日の逐次更新・整数年月キー）
+
+使い方:
+python benchmarks/bench-grouping.py
+python benchmarks/bench-grouping.py --rows 1000000 --residents 2000 --visits 40
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch.grouping import group_patients_by_recipient, parse_yyyymmdd  # noqa: E402
+from invoice_batch.patient_filter import create_patient_data, is_data_row  # noqa: E402
+from invoice_batch.records import PatientRecord, StringPool  # noqa: E402
+from synthetic_hr import generate_rows  # noqa: E402
+
+
+def group_patients_reference(patients):
+    """従来の実装（リストでの重複判定・グループ化後の再解析・年月文字列での並べ替え）"""
+    groups = {}
+    for patient in patients:
+        if not patient.patient_name or not patient.treatment_date:
+            continue
+        parsed = parse_yyyymmdd(patient.treatment_date)
+        if not isinstance(parsed, datetime):
+            continue
+        year_month = f'{parsed.year}-{parsed.month:02d}'
+        key = (patient.recipient_number, patient.patient_name, year_month, patient.medical_code)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'records': [], 'treatment_dates': [], 'year_month': year_month,
+                                   'first_treatment_date': None}
+        group['records'].append(patient)
+        if patient.treatment_date not in group['treatment_dates']:
+            group['treatment_dates'].append(patient.treatment_date)
+
+    result = list(groups.values())
+    for group in result:
+        dates = [parse_yyyymmdd(d) for d in group['treatment_dates']]
+        dates = [d for d in dates if isinstance(d, datetime)]
+        if dates:
+            group['first_treatment_date'] = min(dates)
+    result.sort(key=lambda g: g['year_month'], reverse=True)
+    return result
+
+
+def synthetic_month(rows: int, seed: int):
+    """合成HR形式CSV（一般的な薬局の1か月分）"""
+    pool = StringPool()
+    return [create_patient_data(row, pool) for row in generate_rows(rows, seed) if is_data_row(row)]
+
+
+def nursing_home(residents: int, visits: int, months: int, seed: int):
+    """施設調剤（入居者1人あたり月 visits 回、同じ医療機関、複数月）"""
+    rng = random.Random(seed)
+    patients = []
+    for resident in range(residents):
+        name = f'入居者{resident:05d}'
+        recipient = f'{resident:07d}'
+        for month in range(months):
+            year_month = f'2025{12 - month:02d}'
+            for _ in range(visits):
+                patients.append(PatientRecord(recipient, name, '', '19400101', f'{year_month}{rng.randint(1, 28):02d}',
+                                              '旭川施設クリニック', '12345678', '公費単独', ('', '', ''),
+                                              '北海道旭川市', '12016010'))
+    rng.shuffle(patients)
+    return patients
+
+
+def best_of(repeat: int, func, patients):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(patients)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='患者グループ化のベンチマーク')
+    parser.add_argument('--rows', type=int, default=200_000, help='合成CSVの行数')
+    parser.add_argument('--residents', type=int, default=2_000, help='施設調剤の入居者数')
+    parser.add_argument('--visits', type=int, default=30, help='施設調剤の1人あたり月間調剤回数')
+    parser.add_argument('--months', type=int, default=3, help='施設調剤の月数')
+    parser.add_argument('--repeat', type=int, default=3, help='繰り返し回数（最良値を表示）')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    args = parser.parse_args()
+
+    scenarios = {
+        '一般（合成CSV）': synthetic_month(args.rows, args.seed),
+        f'施設調剤（{args.visits}回/月）': nursing_home(args.residents, args.visits, args.months, args.seed),
+    }
+    for name, patients in scenarios.items():
+        old, expected = best_of(args.repeat, group_patients_reference, patients)
+        new, actual = best_of(args.repeat, group_patients_by_recipient, patients)
+        if expected != actual:
+            raise AssertionError(f'{name}: グループ化の結果が一致しません')
+        print(f'{name:<16} {len(patients):>9,} 件 → {len(actual):>8,} 行 | 従来: {old:6.3f} 秒 | '
+              f'新方式: {new:6.3f} 秒 | {old / new:4.1f} 倍')
+
+
+if __name__ == '__main__':
+    main()
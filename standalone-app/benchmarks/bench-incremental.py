@@ -0,0 +1,68 @@
+"""
+増分処理のベンチマーク（日次追記の処理時間、月末の請求書作成: 全体再処理 vs 状態ファイルから作成）
+
+使い方:
+python benchmarks/bench-incremental.py
+python benchmarks/bench-incremental.py --rows 1000000 --days 20
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch import load_template_bytes  # noqa: E402
+from invoice_batch.batch import process_csv_file  # noqa: E402
+from synthetic_hr import format_row, generate_rows  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='増分処理のベンチマーク')
+    parser.add_argument('--rows', type=int, default=100_000, help='1か月分の行数')
+    parser.add_argument('--days', type=int, default=10, help='日次書き出しの回数')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    args = parser.parse_args()
+
+    template_bytes = load_template_bytes()
+    lines = [format_row(row) for row in generate_rows(args.rows, args.seed)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        csv_path = tmp / 'csv' / 'store.csv'
+        csv_path.parent.mkdir()
+        state_dir = tmp / 'state'
+
+        # 日次: 同じファイルに追記して増分処理（請求書も毎回作成）
+        daily = []
+        with open(csv_path, 'w', encoding='cp932', newline='\n') as f:
+            for day in range(1, args.days + 1):
+                f.write('\n'.join(lines[len(lines) * (day - 1) // args.days:len(lines) * day // args.days]) + '\n')
+                f.flush()
+                start = time.perf_counter()
+                result = process_csv_file(csv_path, tmp / 'out', template_bytes=template_bytes, state_dir=state_dir)
+                daily.append(time.perf_counter() - start)
+
+        # 月末: 状態ファイルから作成（CSVは変更なし）
+        start = time.perf_counter()
+        incremental = process_csv_file(csv_path, tmp / 'out', template_bytes=template_bytes, state_dir=state_dir)
+        assemble = time.perf_counter() - start
+
+        # 従来: CSV全体を再処理
+        start = time.perf_counter()
+        full = process_csv_file(csv_path, tmp / 'full', template_bytes=template_bytes)
+        full_time = time.perf_counter() - start
+
+    assert incremental['rows'] == full['rows'] == result['rows']
+    print(f"{args.rows:,} 行 / {args.days} 回の追記 → {full['rows']:,} 行")
+    print(f'日次の増分処理（請求書作成込み）: 平均 {sum(daily) / len(daily):6.2f} 秒 / 最大 {max(daily):6.2f} 秒')
+    print(f'月末: 全体を再処理 {full_time:6.2f} 秒 | 状態ファイルから作成 {assemble:6.2f} 秒 | '
+          f'{full_time / assemble:4.1f} 倍')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+受付フォルダの常駐処理（ingest.IngestDaemon）のベンチマーク（合成HR形式CSV）
+
+--files 件のCSVを --interval 秒ごとに受付フォルダへ書き出し（各CSVは2回に分けて書き込み、書き込み途中を再現）、
+すべて処理し終わるまでの時間と、書き込み完了 → 処理完了 の待ち時間（中央値・95パーセンタイル・最大）を計測する。
+1件は処理に --slow 秒かかるCSV（--timeout でタイムアウト）、1件は壊れたCSV（例外）として、
+他のCSVの待ち時間への影響を確認する（ワーカーが1つの場合は、タイムアウトした処理が終わるまで後続のCSVが待つ）。
+
+ピーク時の想定は1時間に200件（18秒に1件）。既定の --interval 0.2 はその90倍の頻度。
+
+使い方:
+python benchmarks/bench-ingest.py
+python benchmarks/bench-ingest.py --files 200 --rows 20000 --interval 1 -j 4 --timeout 10
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch.batch import process_csv_file  # noqa: E402
+from invoice_batch.ingest import DONE, IngestDaemon  # noqa: E402
+from synthetic_hr import write_hr_csv  # noqa: E402
+
+SLOW_FILE = 'store_slow.csv'
+CORRUPT_FILE = 'store_corrupt.csv'
+_slow_seconds = 0.0
+
+
+def _init_slow(seconds: float):
+    global _slow_seconds
+    _slow_seconds = seconds
+
+
+def bench_processor(csv_path, *args):
+    """時間のかかるCSV・壊れたCSVを再現する処理（ワーカープロセス用）"""
+    name = Path(csv_path).name
+    if name == CORRUPT_FILE:
+        raise ValueError('壊れたCSV')
+    if name == SLOW_FILE:
+        time.sleep(_slow_seconds)
+    return process_csv_file(csv_path, *args)
+
+
+class TimedDaemon(IngestDaemon):
+    """CSVごとの処理完了時刻を記録する"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.finished = {}
+
+    async def _run_job(self, job):
+        abandoned = await super()._run_job(job)
+        self.finished[job['csv']] = time.monotonic()
+        return abandoned
+
+
+def drop_files(drop_dir: Path, data: bytes, names, interval: float, dropped: dict):
+    """CSVを2回に分けて受付フォルダへ書き出す（各店舗の書き出しを再現）"""
+    half = len(data) // 2
+    for name in names:
+        path = drop_dir / name
+        with open(path, 'wb') as f:
+            f.write(data[:half])
+            f.flush()
+            time.sleep(interval / 2)
+            f.write(data[half:])
+        dropped[name] = time.monotonic()
+        time.sleep(interval / 2)
+
+
+async def run(daemon: TimedDaemon, writer: threading.Thread, count: int):
+    task = asyncio.create_task(daemon.run())
+    writer.start()
+    while len(daemon.finished) < count:
+        await asyncio.sleep(0.05)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='受付フォルダの常駐処理のベンチマーク')
+    parser.add_argument('--files', type=int, default=200, help='CSVの件数')
+    parser.add_argument('--rows', type=int, default=2000, help='CSV1件あたりのデータ行数')
+    parser.add_argument('--interval', type=float, default=0.2, help='CSVを書き出す間隔（秒）')
+    parser.add_argument('--settle', type=float, default=0.2, help='書き込み完了とみなすまでの秒数')
+    parser.add_argument('--slow', type=float, default=5.0, help='時間のかかるCSVの処理時間（秒）')
+    parser.add_argument('--timeout', type=float, default=2.0, help='1ファイルの処理時間の上限（秒）')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='ワーカープロセス数')
+    parser.add_argument('--queue-size', type=int, help='処理待ちの上限（既定: ワーカー数の2倍）')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    args = parser.parse_args()
+
+    _init_slow(args.slow)
+    names = [f'store_{i:03d}.csv' for i in range(args.files - 2)]
+    # 時間のかかるCSV・壊れたCSVは先頭近くに置き、後続のCSVを待たせないことを確認する
+    names[1:1] = [SLOW_FILE, CORRUPT_FILE]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        data = write_hr_csv(tmp / 'source.csv', args.rows, 'cp932', args.seed).read_bytes()
+        drop_dir = tmp / 'drop'
+        drop_dir.mkdir()
+        daemon = TimedDaemon(drop_dir, tmp / 'out', 1, workers=args.workers, queue_size=args.queue_size,
+                             settle_seconds=args.settle, poll_seconds=0.05, timeout=args.timeout,
+                             processor=bench_processor, log=lambda message: None)
+        dropped = {}
+        writer = threading.Thread(target=drop_files, args=(drop_dir, data, names, args.interval, dropped))
+        start = time.monotonic()
+        asyncio.run(run(daemon, writer, len(names)))
+        seconds = time.monotonic() - start
+        writer.join()
+        counts = daemon._counts()
+
+    latency = sorted(daemon.finished[name] - dropped[name] for name in names if name != SLOW_FILE)
+    p95 = latency[min(len(latency) - 1, int(len(latency) * 0.95))]
+    print(f'📥 CSV: {len(names)} 件 × {args.rows:,} 行（{len(data) / 1024:,.0f} KB、{args.interval:g} 秒間隔）'
+          f' / ワーカー数: {daemon.workers} / 処理待ちの上限: {daemon.queue_size}')
+    print(f'   完了 {counts[DONE]} 件 / 失敗 {counts["failed"]} 件 / タイムアウト {counts["timeout"]} 件:'
+          f' {seconds:.2f} 秒（{len(names) / seconds:.1f} 件/秒 = {len(names) / seconds * 3600:,.0f} 件/時）')
+    print(f'   書き込み完了 → 処理完了: 中央値 {statistics.median(latency):.2f} 秒 / 95% {p95:.2f} 秒 /'
+          f' 最大 {latency[-1]:.2f} 秒（{SLOW_FILE} 以外）')
+    print(f'   {SLOW_FILE}: {daemon.finished[SLOW_FILE] - dropped[SLOW_FILE]:.2f} 秒')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+半角カナ→全角カナ変換のベンチマーク（正規表現2回 vs 変換表 + 濁点合成）
+
+使い方:
+python benchmarks/bench-kana.py
+python benchmarks/bench-kana.py --rows 100000 --repeat 5
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch.patient_filter import KANA_MAP, fix_kana_and_trim  # noqa: E402
+from synthetic_hr import generate_rows  # noqa: E402
+
+# 従来の実装（app.js の fixKanaAndTrim() と同じ2段階の正規表現置換）
+_PATTERN2 = re.compile('|'.join(k for k in KANA_MAP if len(k) == 2))
+_PATTERN1 = re.compile('|'.join(k for k in KANA_MAP if len(k) == 1))
+
+
+def fix_kana_and_trim_regex(value) -> str:
+    if not value:
+        return ''
+    result = _PATTERN2.sub(lambda m: KANA_MAP[m.group(0)], str(value))
+    result = _PATTERN1.sub(lambda m: KANA_MAP[m.group(0)], result)
+    return result.strip()
+
+
+def build_values(rows: int, seed: int):
+    """合成CSVの変換対象列（氏名・カナ氏名・医療機関名・住所・医療機関コード・保険者番号・受給者番号）"""
+    columns = {'氏名': 9, 'カナ氏名（半角）': 10, '医療機関名': 33, '住所': 37, 'コード・番号': None}
+    values = {name: [] for name in columns}
+    for row in generate_rows(rows, seed):
+        if row[0] in ('H', '項目解析結果'):
+            continue
+        for name, index in columns.items():
+            if index is None:
+                values[name].extend((row[64], row[22], row[57]))
+            else:
+                values[name].append(row[index])
+    return values
+
+
+def best_of(repeat: int, func, values):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for value in values:
+            func(value)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='半角カナ→全角カナ変換のベンチマーク')
+    parser.add_argument('--rows', type=int, default=100_000, help='合成CSVの行数')
+    parser.add_argument('--repeat', type=int, default=3, help='繰り返し回数（最良値を表示）')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    args = parser.parse_args()
+
+    for name, values in build_values(args.rows, args.seed).items():
+        mismatches = sum(fix_kana_and_trim(v) != fix_kana_and_trim_regex(v) for v in values)
+        if mismatches:
+            raise AssertionError(f'{name}: 変換結果が {mismatches} 件一致しません')
+        old = best_of(args.repeat, fix_kana_and_trim_regex, values)
+        new = best_of(args.repeat, fix_kana_and_trim, values)
+        print(f'{name:<12} {len(values):>9,} 件 | 正規表現: {len(values) / old:>12,.0f} 件/秒 | '
+              f'変換表: {len(values) / new:>12,.0f} 件/秒 | {old / new:5.1f} 倍')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+月遅れ請求の照合ベンチマーク（12か月分の処理済みキー × 全店舗）
+
+処理済みキー（SQLite）に直近12か月・全店舗分のキーを登録し、前月分CSVの旭川市の患者のキーを
+次の方法で照合する。
+- probe:     1件ずつSQLで照合（同じキー・同じ請求年月の同じ患者をキーごとに2回検索）
+- reconcile: 一時テーブルとの1回の結合（請求済み・要確認・請求漏れを同時に判定）
+- set:       JSONから読み込んだ集合での照合（reconcile_keys）
+
+使い方:
+python benchmarks/bench-late-claims.py
+python benchmarks/bench-late-claims.py --stores 200 --keys-per-store 3000 --candidates 200000
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch.processed_keys import (ProcessedKeyStore, _reconcile_status, count_statuses,  # noqa: E402
+                                          parse_processed_key, reconcile_keys)
+
+MONTHS = 12
+
+
+def month_keys(rng: random.Random, year_month: str, stores: int, keys_per_store: int):
+    """1か月分の処理済みキー（店舗ごとに医療機関コードが異なる）"""
+    prefix = f'{year_month}0'
+    for store in range(stores):
+        medical_code = f'{store:07d}'
+        for _ in range(keys_per_store):
+            yield f'{prefix}_{rng.getrandbits(32):x}_{medical_code}'
+
+
+def build_store(path: Path, rng: random.Random, stores: int, keys_per_store: int):
+    months = [f'{2024 + (month + 2) // 12}{(month + 2) % 12 + 1:02d}' for month in range(MONTHS)]
+    billed = []
+    with ProcessedKeyStore(path) as store:
+        for year_month in months:
+            keys = list(month_keys(rng, year_month, stores, keys_per_store))
+            store.add_keys(keys)
+            billed = keys
+    return months[-1], billed
+
+
+def make_candidates(rng: random.Random, billed, count: int, stores: int):
+    """前月分の照合対象（請求済み・別の医療機関コード・請求漏れを混在）"""
+    candidates = []
+    for i in range(count):
+        key = rng.choice(billed)
+        kind = i % 4
+        if kind == 1:
+            year_month, name_hash, _ = key.split('_')
+            key = f'{year_month}_{name_hash}_{rng.randrange(stores, stores * 2):07d}'
+        elif kind == 2:
+            key = f'{key[:7]}_{rng.getrandbits(32):x}_{key.rsplit("_", 1)[1]}'
+        candidates.append(key)
+    return candidates
+
+
+def probe(store: ProcessedKeyStore, candidates):
+    """1件ずつSQLで照合（reconcile と同じ判定）"""
+    conn = store.conn
+    statuses = []
+    for key in candidates:
+        year_month, patient_hash, _ = parse_processed_key(key)
+        billed = conn.execute('SELECT 1 FROM processed_keys WHERE key = ?', (key,)).fetchone()
+        same_patient = conn.execute(
+            'SELECT 1 FROM processed_keys WHERE year_month = ? AND patient_hash = ? LIMIT 1',
+            (year_month, patient_hash)).fetchone()
+        statuses.append(_reconcile_status(year_month, billed is not None, same_patient is not None))
+    return statuses
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='月遅れ請求の照合ベンチマーク')
+    parser.add_argument('--stores', type=int, default=100, help='店舗数')
+    parser.add_argument('--keys-per-store', type=int, default=2000, help='1店舗・1か月あたりの処理済みキー数')
+    parser.add_argument('--candidates', type=int, default=100_000, help='前月分の照合件数')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'processed-keys.db'
+        (last_month, billed), build_seconds = timed(
+            lambda: build_store(db_path, rng, args.stores, args.keys_per_store))
+        candidates = make_candidates(rng, billed, args.candidates, args.stores)
+
+        with ProcessedKeyStore(db_path) as store:
+            total = len(store)
+            print(f'📦 処理済みキー: {total:,} 件（{MONTHS}か月 × {args.stores} 店舗、登録 {build_seconds:.1f} 秒）')
+            print(f'🔎 照合対象: {len(candidates):,} 件（{last_month}）')
+
+            probe_statuses, probe_seconds = timed(lambda: probe(store, candidates))
+            statuses, reconcile_seconds = timed(lambda: store.reconcile(candidates))
+            keys = {key for (key,) in store.conn.execute('SELECT key FROM processed_keys')}
+            set_statuses, set_seconds = timed(lambda: reconcile_keys(candidates, keys))
+
+        assert statuses == set_statuses == probe_statuses
+        counts = count_statuses(statuses)
+        print(f"   請求済み {counts['billed']:,} / 要確認 {counts['ambiguous']:,} / 請求漏れ {counts['unbilled']:,}")
+        for name, seconds in (('probe', probe_seconds), ('reconcile', reconcile_seconds), ('set', set_seconds)):
+            print(f'{name:>10}: {seconds:7.3f} 秒 ({len(candidates) / seconds:,.0f} 件/秒)')
+        print(f'⚡ reconcile / probe: {probe_seconds / reconcile_seconds:.1f} 倍')
+
+
+if __name__ == '__main__':
+    main()
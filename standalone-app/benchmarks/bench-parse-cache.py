@@ -0,0 +1,103 @@
+"""
+CSV解析結果キャッシュのベンチマーク（1回目請求 → 2回目請求 → 翌月の前月分CSV）
+
+同じ合成HR形式CSVを3回処理し、キャッシュなし（毎回デコード・解析・カナ変換）と
+キャッシュあり（1回目のみ解析、2回目以降はハッシュ計算 + 保存済みの解析結果の読み込み）の
+解析 + フィルタの時間とキャッシュファイルのサイズを比較する。
+
+使い方:
+python benchmarks/bench-parse-cache.py
+python benchmarks/bench-parse-cache.py --rows 500000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch.csv_reader import stream_csv_file  # noqa: E402
+from invoice_batch.parse_cache import ParseCache, ParsedCSV  # noqa: E402
+from invoice_batch.patient_filter import (classify_previous_month_patients, filter_parsed_patients,  # noqa: E402
+                                          filter_patients, filter_previous_month_patients, make_processed_key)
+from synthetic_hr import write_hr_csv  # noqa: E402
+
+ENCODING_MODE = 'ansi-first'
+
+
+def run_uncached(path: Path, keys):
+    """キャッシュなし: 1回目・2回目・前月分とも CSV を解析する"""
+    counts = []
+    for batch_number in (1, 2):
+        records, _ = stream_csv_file(path, ENCODING_MODE)
+        result = filter_patients(records, batch_number, keys, keep_all=False)
+        counts.append((result['total'], len(result['target']), len(result['duplicate'])))
+    records, _ = stream_csv_file(path, ENCODING_MODE)
+    previous = filter_previous_month_patients(records, keys)
+    counts.append((previous['total'], len(previous['asahikawa']), len(previous['duplicate'])))
+    return counts
+
+
+def run_cached(path: Path, keys, cache: ParseCache):
+    """キャッシュあり: 1回目のみ解析して保存し、2回目・前月分は保存済みの解析結果を使う"""
+    counts = []
+    for batch_number in (1, 2):
+        key = cache.key(path, ENCODING_MODE)
+        parsed = cache.load(key)
+        if parsed is None:
+            records, encoding = stream_csv_file(path, ENCODING_MODE)
+            result = filter_patients(records, batch_number, keys, keep_all=False)
+            cache.store(path, key, ParsedCSV(encoding, result['total'], result['asahikawa']))
+        else:
+            result = filter_parsed_patients(parsed.patients, parsed.total, batch_number, keys)
+        counts.append((result['total'], len(result['target']), len(result['duplicate'])))
+    parsed = cache.load(cache.key(path, ENCODING_MODE))
+    previous = classify_previous_month_patients(parsed.patients, parsed.total, keys)
+    counts.append((previous['total'], len(previous['asahikawa']), len(previous['duplicate'])))
+    return counts
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CSV解析結果キャッシュのベンチマーク')
+    parser.add_argument('--rows', type=int, default=200_000, help='データ行数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_hr_csv(Path(tmp) / 'hr.csv', args.rows)
+        size_mb = path.stat().st_size / 1024 / 1024
+        print(f'📄 {args.rows:,} 行 ({size_mb:.0f} MB)')
+
+        # 1回目請求の処理済みキー（2回目請求・前月分の照合に使う）
+        records, _ = stream_csv_file(path, ENCODING_MODE)
+        first = filter_patients(records, 1, keep_all=False)
+        keys = {make_processed_key(p) for p in first['asahikawa'][::2]}
+
+        uncached_elapsed, expected = timed(run_uncached, path, keys)
+        cache = ParseCache(Path(tmp) / 'cache')
+        cached_elapsed, counts = timed(run_cached, path, keys, cache)
+        assert counts == expected
+
+        # 2回目以降（キャッシュ読み込み）のみの時間
+        repeat_elapsed, _ = timed(run_cached, path, keys, cache)
+        cache_mb = sum(p.stat().st_size for p in cache.cache_dir.iterdir()) / 1024 / 1024
+
+        print(f'キャッシュなし（3回解析）      : {uncached_elapsed:7.2f} 秒')
+        print(f'キャッシュあり（1回解析 + 2回読込）: {cached_elapsed:7.2f} 秒')
+        print(f'キャッシュあり（3回とも読込）    : {repeat_elapsed:7.2f} 秒 '
+              f'（1回あたり {repeat_elapsed / 3:.2f} 秒）')
+        print(f'キャッシュファイル: {cache_mb:.1f} MB（CSVの {cache_mb / size_mb:.1%}）')
+        print(f'✅ 件数一致 / {uncached_elapsed / cached_elapsed:.1f}倍')
+
+
+if __name__ == '__main__':
+    main()
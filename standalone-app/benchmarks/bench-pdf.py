@@ -0,0 +1,91 @@
+"""
+請求書PDF一括生成のベンチマーク（合成HR形式データ）
+
+合成データをグループ化し、--rows 行ずつの請求書PDFを --invoices 件描画する。
+- uncached: 請求書ごとにフォント登録・テンプレート解析をやり直す（キャッシュなし）
+- cached:   フォント・レイアウトをプロセス内で1回だけ準備（pdf_writer の既定）
+- parallel: cached をプロセスプール（-j）で並列実行
+を計測する。
+
+使い方:
+python benchmarks/bench-pdf.py
+python benchmarks/bench-pdf.py --invoices 500 --rows 80 -j 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch import filter_patients, group_patients_by_recipient, load_template_bytes  # noqa: E402
+from invoice_batch import pdf_writer  # noqa: E402
+from synthetic_hr import generate_rows  # noqa: E402
+
+_groups = None
+_template = None
+
+
+def _init_worker(groups, template_bytes):
+    global _groups, _template
+    _groups = groups
+    _template = template_bytes
+
+
+def render(job):
+    """請求書1件を描画（ワーカープロセス用）"""
+    index, start, count, output_dir, cached = job
+    if not cached:
+        # 請求書ごとにフォント・レイアウトを準備し直す
+        pdf_writer._registered_fonts.clear()
+        pdf_writer._layouts.clear()
+    return pdf_writer.write_pdf(_groups[start:start + count], Path(output_dir) / f'invoice_{index:04d}.pdf',
+                                f'ベンチマーク薬局{index}', '0112345', _template)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='請求書PDF一括生成のベンチマーク')
+    parser.add_argument('--invoices', type=int, default=200, help='請求書の件数')
+    parser.add_argument('--rows', type=int, default=60, help='請求書1件あたりの行数')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='並列実行のプロセス数')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    args = parser.parse_args()
+
+    groups = group_patients_by_recipient(filter_patients(generate_rows(args.rows * 3, args.seed), 1)['target'])
+    groups = (groups * (args.rows // max(1, len(groups)) + 1))[:args.rows]
+    template_bytes = load_template_bytes()
+    _init_worker(groups, template_bytes)
+
+    seconds = {}
+    pages = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, cached in (('uncached', False), ('cached', True)):
+            jobs = [(i, 0, args.rows, tmp, cached) for i in range(args.invoices)]
+            start = time.perf_counter()
+            pages = sum(render(job) for job in jobs)
+            seconds[name] = time.perf_counter() - start
+
+        jobs = [(i, 0, args.rows, tmp, True) for i in range(args.invoices)]
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(groups, template_bytes)) as executor:
+            assert sum(executor.map(render, jobs, chunksize=8)) == pages
+        seconds['parallel'] = time.perf_counter() - start
+        size = sum(p.stat().st_size for p in Path(tmp).glob('*.pdf')) / args.invoices
+
+    print(f'🖨️ 請求書: {args.invoices} 件 × {args.rows} 行（{pages // args.invoices} ページ/件、平均 {size / 1024:.0f} KB）')
+    for name, value in seconds.items():
+        label = f'{name}（{args.workers} プロセス）' if name == 'parallel' else name
+        print(f'{label:>16}: {value:6.2f} 秒 ({args.invoices / value:6.1f} 件/秒, {value / args.invoices * 1000:5.1f} ms/件)')
+    print(f"⚡ cached / uncached: {seconds['uncached'] / seconds['cached']:.1f} 倍, "
+          f"parallel / cached: {seconds['cached'] / seconds['parallel']:.1f} 倍")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+一括作成パイプラインの段階別ベンチマーク（合成HR形式CSV）
+
+デコード → CSV解析 → 旭川市フィルタ → グループ化 → Excel書き込み の各段階を個別に計測する。
+CSVは benchmarks/synthetic_hr.py で生成し、--data-dir を指定した場合は再利用する。
+
+使い方:
+python benchmarks/bench-pipeline.py
+python benchmarks/bench-pipeline.py --rows 10000,100000,1000000 --encodings cp932,utf-8-sig
+python benchmarks/bench-pipeline.py --rows 5000000 --data-dir bench-data --json result.json
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch import group_patients_by_recipient, load_template_bytes  # noqa: E402
+from invoice_batch.csv_reader import decode_csv_bytes, parse_csv_text  # noqa: E402
+from invoice_batch.patient_filter import filter_patients  # noqa: E402
+from invoice_batch.xlsx_stream import write_excel_stream  # noqa: E402
+from synthetic_hr import ENCODINGS, write_hr_csv  # noqa: E402
+
+STAGES = ('decode', 'parse', 'filter', 'group', 'write')
+
+
+def prepare_csv(data_dir: Path, rows: int, encoding: str, seed: int) -> Path:
+    """合成CSVを作成（同じ条件のファイルがあれば再利用）"""
+    path = data_dir / f'hr_{rows}_{encoding}_{seed}.csv'
+    if not path.exists():
+        start = time.perf_counter()
+        write_hr_csv(path, rows, encoding, seed)
+        print(f'  📝 生成: {path.name}（{time.perf_counter() - start:.1f} 秒）')
+    return path
+
+
+def run_pipeline(csv_path: Path, template_bytes: bytes, output_dir: Path) -> dict:
+    """1ファイル分のパイプラインを実行し、段階ごとの秒数と件数を返す"""
+    timings = {}
+
+    start = time.perf_counter()
+    data = csv_path.read_bytes()
+    text, used_encoding = decode_csv_bytes(data)
+    timings['decode'] = time.perf_counter() - start
+    del data
+
+    start = time.perf_counter()
+    records = parse_csv_text(text)
+    timings['parse'] = time.perf_counter() - start
+    del text
+
+    start = time.perf_counter()
+    filter_result = filter_patients(records, 1, keep_all=False)
+    included = [p for p in filter_result['target'] if p.is_included]
+    timings['filter'] = time.perf_counter() - start
+    del records
+
+    start = time.perf_counter()
+    grouped = group_patients_by_recipient(included)
+    timings['group'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    write_excel_stream(grouped, template_bytes, output_dir / f'{csv_path.stem}.xlsx', 'ベンチマーク薬局', '0000000')
+    timings['write'] = time.perf_counter() - start
+
+    return {
+        'encoding': used_encoding,
+        'total': filter_result['total'],
+        'target': len(filter_result['target']),
+        'groups': len(grouped),
+        'seconds': timings,
+    }
+
+
+def run(sizes, encodings, seed: int, data_dir: Path, output_dir: Path):
+    template_bytes = load_template_bytes()
+    results = []
+    for encoding in encodings:
+        for size in sizes:
+            csv_path = prepare_csv(data_dir, size, encoding, seed)
+            entry = {'rows': size, 'file_mb': csv_path.stat().st_size / 1024 / 1024}
+            entry.update(run_pipeline(csv_path, template_bytes, output_dir))
+            results.append(entry)
+
+            seconds = entry['seconds']
+            stage_text = ' | '.join(f'{stage}: {seconds[stage]:7.2f}s' for stage in STAGES)
+            total = sum(seconds.values())
+            print(f"{encoding:>9} {size:>10,} 行 | {stage_text} | 合計: {total:7.2f}s "
+                  f"({size / total:,.0f} 行/秒, 対象 {entry['target']:,} 件 → {entry['groups']:,} 行)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='一括作成パイプラインの段階別ベンチマーク')
+    parser.add_argument('--rows', default='10000,100000', help='データ行数（カンマ区切り、1万〜500万行）')
+    parser.add_argument('--encodings', default='cp932', help=f'文字コード（カンマ区切り: {",".join(ENCODINGS)}）')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    parser.add_argument('--data-dir', help='合成CSVの保存先（指定した場合は次回以降も再利用）')
+    parser.add_argument('--json', help='結果をJSONで保存')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.rows.split(',') if s]
+    encodings = [e for e in args.encodings.split(',') if e]
+    for encoding in encodings:
+        if encoding not in ENCODINGS:
+            parser.error(f'未対応の文字コード: {encoding}')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(args.data_dir) if args.data_dir else Path(tmp) / 'data'
+        results = run(sizes, encodings, args.seed, data_dir, Path(tmp))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'💾 保存先: {args.json}')
+
+
+if __name__ == '__main__':
+    main()
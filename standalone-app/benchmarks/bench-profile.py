@@ -0,0 +1,64 @@
+"""
+段階別計測（--profile）のオーバーヘッドのベンチマーク（合成HR形式CSV）
+
+同じCSVを process_csv_file() で profile=False / profile=True の順に交互に処理し、
+処理時間の差（計測のオーバーヘッド）と段階ごとの内訳を表示する。
+計測しない場合は行ごとのループに何も追加しないため、profile=False は計測追加前と同じ処理になる。
+
+使い方:
+python benchmarks/bench-profile.py
+python benchmarks/bench-profile.py --rows 1000000 --repeat 3 --key-format fingerprint
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch import load_template_bytes  # noqa: E402
+from invoice_batch.batch import process_csv_file  # noqa: E402
+from invoice_batch.fingerprint import KEY_FORMATS, LEGACY_KEY_FORMAT  # noqa: E402
+from invoice_batch.profiling import STAGES  # noqa: E402
+from synthetic_hr import write_hr_csv  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='段階別計測のオーバーヘッドのベンチマーク')
+    parser.add_argument('--rows', type=int, default=200_000, help='データ行数')
+    parser.add_argument('--repeat', type=int, default=3, help='繰り返し回数（最小値を表示）')
+    parser.add_argument('--key-format', choices=KEY_FORMATS, default=LEGACY_KEY_FORMAT)
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    args = parser.parse_args()
+
+    template_bytes = load_template_bytes()
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = write_hr_csv(Path(tmp) / 'hr.csv', args.rows, 'cp932', args.seed)
+        seconds = {False: [], True: []}
+        profile = None
+        for _ in range(args.repeat):
+            for enabled in (False, True):
+                start = time.perf_counter()
+                result = process_csv_file(csv_path, Path(tmp) / 'out', 1, key_format=args.key_format,
+                                          template_bytes=template_bytes, profile=enabled)
+                seconds[enabled].append(time.perf_counter() - start)
+                if enabled:
+                    profile = result['profile']
+
+    off, on = min(seconds[False]), min(seconds[True])
+    print(f"📄 {args.rows:,} 行（対象 {result['target']:,} 件 → {result['rows']:,} 行、{args.key_format}）")
+    print(f'   計測なし: {off:6.2f} 秒 ({args.rows / off:,.0f} 行/秒)')
+    print(f'   計測あり: {on:6.2f} 秒 ({args.rows / on:,.0f} 行/秒, オーバーヘッド {on / off - 1:+.1%})')
+    stages = profile['stages']
+    print('   ' + ' | '.join(f"{stage}: {stages[stage]['seconds']:.2f}s" for stage in STAGES))
+    memory = profile['memory']
+    if memory['peak_rss_bytes']:
+        print(f"   最大常駐メモリ: {memory['peak_rss_bytes'] / 1024 / 1024:,.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+ローカルHTTPサービス（invoice_batch.service）の負荷試験（合成HR形式CSV）
+
+127.0.0.1 の空きポートでサービスを起動し、--requests 件のCSVアップロード（multipart/form-data）を
+同時接続数 --concurrency ごとに送信して、1件あたりの応答時間（中央値・95パーセンタイル・最大）と
+処理件数/秒、応答ステータスの内訳を表示する。
+比較として、同じCSVをHTTPを経由せずに1件ずつ render_invoice() で処理した時間も表示する。
+
+使い方:
+python benchmarks/bench-service.py
+python benchmarks/bench-service.py --rows 20000 --requests 200 --concurrency 1 8 32 -j 8
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch import batch, load_template_bytes  # noqa: E402
+from invoice_batch.service import InvoiceServer, InvoiceService, render_invoice  # noqa: E402
+from synthetic_hr import write_hr_csv  # noqa: E402
+
+BOUNDARY = 'bench-service-boundary'
+
+
+def multipart_body(csv_bytes: bytes, index: int) -> bytes:
+    fields = {'batch': '1', 'pharmacy_name': f'ベンチマーク薬局{index}', 'medical_code': '0112345'}
+    parts = [f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8')
+             for name, value in fields.items()]
+    parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="store_{index}.csv"\r\n'
+                 'Content-Type: text/csv\r\n\r\n'.encode('utf-8'))
+    parts.append(csv_bytes)
+    parts.append(f'\r\n--{BOUNDARY}--\r\n'.encode('utf-8'))
+    return b''.join(parts)
+
+
+def upload(url: str, body: bytes):
+    request = urllib.request.Request(url, data=body,
+                                     headers={'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ローカルHTTPサービスの負荷試験')
+    parser.add_argument('--rows', type=int, default=5000, help='CSV1件あたりのデータ行数')
+    parser.add_argument('--requests', type=int, default=60, help='同時接続数ごとの送信件数')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help='同時接続数')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='ワーカープロセス数')
+    parser.add_argument('--max-pending', type=int, help='同時に受け付ける件数（既定: ワーカー数の4倍）')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_bytes = write_hr_csv(Path(tmp) / 'hr.csv', args.rows, 'cp932', args.seed).read_bytes()
+    bodies = [multipart_body(csv_bytes, i) for i in range(args.requests)]
+
+    # HTTPを経由しない場合（1件ずつ、テンプレートは保持済み）
+    batch._init_worker(load_template_bytes())
+    start = time.perf_counter()
+    for _ in range(min(args.requests, 10)):
+        render_invoice(csv_bytes, 1, 'ベンチマーク薬局', '0112345')
+    direct = (time.perf_counter() - start) / min(args.requests, 10)
+
+    service = InvoiceService(workers=args.workers, max_pending=args.max_pending)
+    server = InvoiceServer(service, '127.0.0.1', 0, log=None)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/invoice'
+    try:
+        upload(url, bodies[0])  # ワーカープロセスの起動
+        print(f'🌐 CSV: {args.rows:,} 行（{len(csv_bytes) / 1024:,.0f} KB） / ワーカー数: {service.workers}'
+              f' / 同時に受け付ける件数: {service.max_pending}')
+        print(f'   HTTPなし（1件ずつ）: {direct * 1000:7.1f} ms/件')
+        for concurrency in args.concurrency:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(lambda body: upload(url, body), bodies))
+            seconds = time.perf_counter() - start
+            statuses = Counter(status for status, _ in results)
+            latency = sorted(elapsed for status, elapsed in results if status == 200)
+            p95 = latency[min(len(latency) - 1, int(len(latency) * 0.95))] if latency else 0.0
+            print(f'   同時接続 {concurrency:>3}: {seconds:6.2f} 秒（{statuses[200] / seconds:5.1f} 件/秒）'
+                  f' 応答 中央値 {statistics.median(latency) * 1000 if latency else 0:7.1f} ms /'
+                  f' 95% {p95 * 1000:7.1f} ms / 最大 {latency[-1] * 1000 if latency else 0:7.1f} ms'
+                  f' / ステータス {dict(sorted(statuses.items()))}')
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
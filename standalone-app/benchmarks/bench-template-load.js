@@ -0,0 +1,80 @@
+/**
+ * テンプレート読み込みのベンチマーク（起動時に template-data.js を読み込む従来方式 vs マニフェストのみ）
+ *
+ * 使い方:
+ * node benchmarks/bench-template-load.js
+ * node benchmarks/bench-template-load.js --repeat 50
+ */
+
+const fs = require('fs');
+const path = require('path');
+const vm = require('vm');
+
+const APP_DIR = path.resolve(__dirname, '..');
+
+function parseRepeat() {
+    const index = process.argv.indexOf('--repeat');
+    return index >= 0 ? parseInt(process.argv[index + 1], 10) : 20;
+}
+
+function readScript(name) {
+    return fs.readFileSync(path.join(APP_DIR, name), 'utf8');
+}
+
+/** Base64デコード（app.js の decodeTemplate() と同じ処理） */
+function decodeBase64(base64) {
+    const binaryString = atob(base64);
+    const bytes = new Uint8Array(binaryString.length);
+    for (let i = 0; i < binaryString.length; i++) {
+        bytes[i] = binaryString.charCodeAt(i);
+    }
+    return bytes.buffer;
+}
+
+function median(values) {
+    const sorted = [...values].sort((a, b) => a - b);
+    return sorted[Math.floor(sorted.length / 2)];
+}
+
+/** func(context) の実行時間の中央値（コンテキスト作成＝ページ読み込みは計測に含めない） */
+function time(repeat, func) {
+    const samples = [];
+    for (let i = 0; i < repeat; i++) {
+        const context = vm.createContext({ atob });
+        const start = performance.now();
+        func(context);
+        samples.push(performance.now() - start);
+    }
+    return median(samples);
+}
+
+function main() {
+    const repeat = parseRepeat();
+    const manifestSource = readScript('template-manifest.js');
+    const templateSource = readScript('template-data.js');
+
+    // 従来方式: 起動時に template-data.js を読み込み・デコード（Excel生成のたびにデコード）
+    const eager = time(repeat, context => {
+        new vm.Script(templateSource).runInContext(context);
+        decodeBase64(vm.runInContext('TEMPLATE_BASE64', context));
+    });
+
+    // 新方式: 起動時はマニフェストのみ
+    const startup = time(repeat, context => {
+        new vm.Script(manifestSource).runInContext(context);
+    });
+
+    // 新方式: 2回目以降の loadTemplate()（デコード済みバッファの複製のみ）
+    const cachedContext = vm.createContext({});
+    new vm.Script(templateSource).runInContext(cachedContext);
+    const cached = decodeBase64(vm.runInContext('TEMPLATE_BASE64', cachedContext));
+    const secondLoad = time(repeat, () => cached.slice(0));
+
+    console.log(`template-data.js: ${templateSource.length} 文字 / template-manifest.js: ${manifestSource.length} 文字`);
+    console.log(`従来方式（起動時 読み込み + デコード）: ${eager.toFixed(2)} ms`);
+    console.log(`マニフェストのみ（起動時）:             ${startup.toFixed(2)} ms`);
+    console.log(`初回 loadTemplate():                    ${eager.toFixed(2)} ms（従来方式の起動時処理をExcel生成時に移動）`);
+    console.log(`2回目以降 loadTemplate():               ${secondLoad.toFixed(3)} ms`);
+}
+
+main();
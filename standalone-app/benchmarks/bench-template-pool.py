@@ -0,0 +1,73 @@
+"""
+テンプレート解析結果の共有（xlsx_stream.TemplateForm）のベンチマーク（合成HR形式データ）
+
+--rows 行の請求書Excelを --invoices 件作成し、1件あたりの作成時間（平均・中央値・95パーセンタイル）を
+- 共有なし: 請求書ごとにテンプレートxlsxを解析し直す（parse_template_form を毎回実行）
+- 共有あり: 解析結果をプロセス内で共有する（write_excel_stream の既定）
+で比較する。出力はメモリ上（BytesIO）に書き込み、ディスクの書き込み時間は含めない。
+
+使い方:
+python benchmarks/bench-template-pool.py
+python benchmarks/bench-template-pool.py --invoices 1000 --rows 200
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+from invoice_batch import filter_patients, group_patients_by_recipient, load_template_bytes  # noqa: E402
+from invoice_batch import xlsx_stream  # noqa: E402
+from synthetic_hr import generate_rows  # noqa: E402
+
+
+def run(groups, template_bytes: bytes, invoices: int, pooled: bool):
+    latencies = []
+    size = 0
+    for index in range(invoices):
+        start = time.perf_counter()
+        if not pooled:
+            # 請求書ごとにテンプレートを解析し直す
+            xlsx_stream.load_template_form.cache_clear()
+        output = BytesIO()
+        xlsx_stream.write_excel_stream(groups, template_bytes, output, f'ベンチマーク薬局{index}', '0112345')
+        latencies.append(time.perf_counter() - start)
+        size = len(output.getvalue())
+    return latencies, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='テンプレート解析結果の共有のベンチマーク')
+    parser.add_argument('--invoices', type=int, default=1000, help='請求書の件数')
+    parser.add_argument('--rows', type=int, default=30, help='請求書1件あたりの行数')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    args = parser.parse_args()
+
+    groups = group_patients_by_recipient(filter_patients(generate_rows(args.rows * 3, args.seed), 1)['target'])
+    groups = (groups * (args.rows // max(1, len(groups)) + 1))[:args.rows]
+    template_bytes = load_template_bytes()
+
+    start = time.perf_counter()
+    form = xlsx_stream.parse_template_form(template_bytes)
+    parse_ms = (time.perf_counter() - start) * 1000
+    print(f'📐 テンプレート解析: {parse_ms:.1f} ms（テンプレート行 {form.last_row} 行）')
+
+    results = {}
+    for name, pooled in (('共有なし', False), ('共有あり', True)):
+        latencies, size = run(groups, template_bytes, args.invoices, pooled)
+        results[name] = latencies
+        ordered = sorted(latencies)
+        print(f'{name}: {args.invoices} 件 × {args.rows} 行 合計 {sum(latencies):6.2f} 秒 |'
+              f' 平均 {statistics.mean(latencies) * 1000:6.2f} ms / 中央値 {statistics.median(latencies) * 1000:6.2f} ms /'
+              f' 95% {ordered[int(len(ordered) * 0.95)] * 1000:6.2f} ms（{size / 1024:.0f} KB/件）')
+    print(f"⚡ 共有あり / 共有なし: {sum(results['共有なし']) / sum(results['共有あり']):.1f} 倍")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+VBAモジュール インポート バッチモードのベンチマーク（stubバックエンド）
+
+合成した .bas モジュール（UTF-8 / Shift-JIS 混在）について
+- gui:   旧GUI版の手順（1件ずつ判定 → その場でShift-JISに書き換え → インポート）
+- staged: 現GUI版の手順（1回だけ読み込み → メモリ上で判定 → ステージングフォルダに変換 → インポート）
+- cold:  バッチモード初回（スレッドプールで読み込み・判定・変換 → インポート）
+- warm:  バッチモード2回目（内容ハッシュが同じため全モジュールをスキップ）
+を計測する。COMの処理時間は --delay 秒/モジュールで模擬する（既定0秒: データ処理のみ）。
+
+あわせて既存モジュール名の検索（モジュールごとに VBComponents を全件走査 / 開いた時に1回だけ
+列挙した対応表）を、COMの要素アクセス --item-us マイクロ秒/件で模擬して比較する。
+
+使い方:
+python benchmarks/bench-vba-import.py
+python benchmarks/bench-vba-import.py --modules 200 --size-kb 200 --delay 0.05 -j 8
+"""
+
+import argparse
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT_DIR = BENCH_DIR.parent.parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(ROOT_DIR / 'tool'))
+
+from invoice_batch.encoding_detect import FALLBACK_CODEC, detect_file_encoding  # noqa: E402
+from vba_import_batch import (STATE_FILE, ComImportBackend, StubImportBackend, classify_encoding,  # noqa: E402
+                              run_batch_import, stage_module)
+
+LINES = (
+    "    ' 旭川市の調剤券請求書を作成する\r\n",
+    "    Dim ws As Worksheet: Set ws = ThisWorkbook.Worksheets(\"請求書\")\r\n",
+    "    ws.Range(\"A\" & i).Value = patientName & \"（\" & recipientNumber & \"）\"\r\n",
+    "    If Len(medicalCode) = 0 Then Exit Sub\r\n",
+)
+
+
+def write_modules(modules_dir: Path, count: int, size_kb: int, seed: int):
+    """合成モジュール（半分はUTF-8、半分はShift-JIS）"""
+    rng = random.Random(seed)
+    modules_dir.mkdir(parents=True, exist_ok=True)
+    names = []
+    for i in range(count):
+        name = f'Module{i:03d}'
+        body = [f'Attribute VB_Name = "{name}"\r\n', f'Sub Run{i}()\r\n']
+        size = 0
+        while size < size_kb * 1024:
+            line = rng.choice(LINES)
+            body.append(line)
+            size += len(line.encode('utf-8'))
+        body.append('End Sub\r\n')
+        encoding = 'utf-8' if i % 2 == 0 else 'cp932'
+        (modules_dir / f'{name}.bas').write_bytes(''.join(body).encode(encoding))
+        names.append(f'{name}.bas')
+    return names
+
+
+def run_gui_style(modules_dir: Path, names, delay: float) -> float:
+    """GUI版の手順（1件ずつ判定、UTF-8はその場で書き換えてからインポート）"""
+    start = time.perf_counter()
+    backend = StubImportBackend(delay)
+    files = []
+    for name in names:
+        path = modules_dir / name
+        detection = detect_file_encoding(path, 'utf8-first')
+        is_utf8 = detection.codec in ('utf-8', 'utf-8-sig')
+        files.append((path, 'UTF-8' if is_utf8 else
+                      'Shift-JIS' if (detection.codec, detection.label) != FALLBACK_CODEC else 'Unknown'))
+    for path, encoding in files:
+        if encoding == 'UTF-8':
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            with open(path, 'w', encoding='shift_jis', errors='replace') as f:
+                f.write(content)
+    backend.open(None)
+    for path, _ in files:
+        backend.import_module(path)
+    backend.save()
+    return time.perf_counter() - start
+
+
+def run_staged_style(modules_dir: Path, staging_dir: Path, names, delay: float) -> float:
+    """現GUI版の手順（1回だけ読み込み、メモリ上で判定・変換してステージングフォルダに書き出す）"""
+    start = time.perf_counter()
+    backend = StubImportBackend(delay)
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    files = []
+    for name in names:
+        data = (modules_dir / name).read_bytes()
+        files.append((name, data, classify_encoding(data)))
+    staged = [stage_module(name, data, encoding, staging_dir)[0] for name, data, encoding in files]
+    backend.open(None)
+    for path in staged:
+        backend.import_module(path)
+    backend.save()
+    return time.perf_counter() - start
+
+
+class SlowComponent:
+    def __init__(self, name: str, item_seconds: float):
+        self._name = name
+        self._item_seconds = item_seconds
+
+    @property
+    def Name(self):
+        # COMのプロパティ取得（プロセス間呼び出し）を模擬
+        spin(self._item_seconds)
+        return self._name
+
+
+class SlowComponents:
+    """VBProject.VBComponents の模擬（要素ごとにCOMの呼び出し時間がかかる）"""
+
+    def __init__(self, names, item_seconds: float):
+        self.item_seconds = item_seconds
+        self.items = [SlowComponent(name, item_seconds) for name in names]
+
+    def __iter__(self):
+        for item in list(self.items):
+            spin(self.item_seconds)
+            yield item
+
+    def Remove(self, component):
+        self.items.remove(component)
+
+    def Import(self, path):
+        component = SlowComponent(Path(path).stem, self.item_seconds)
+        self.items.append(component)
+        return component
+
+
+def spin(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def run_component_lookup(count: int, item_seconds: float, existing: bool):
+    """
+    既存モジュール名の検索（旧: モジュールごとに全件走査 / 新: 対応表）
+
+    existing=False は初回インポート（一致しないため毎回全件を走査）、True は再インポート。
+    """
+    names = [f'Module{i:03d}' for i in range(count)]
+    paths = [Path(f'{name}.bas') for name in names]
+    initial = ['ThisWorkbook', 'Sheet1', 'Sheet2'] + (names if existing else [])
+
+    components = SlowComponents(initial, item_seconds)
+    start = time.perf_counter()
+    for path in paths:
+        for component in components:
+            if component.Name == path.stem:
+                components.Remove(component)
+                break
+        components.Import(str(path))
+    scan = time.perf_counter() - start
+
+    workbook = type('Workbook', (), {})()
+    workbook.VBProject = type('VBProject', (), {})()
+    workbook.VBProject.VBComponents = SlowComponents(initial, item_seconds)
+    backend = ComImportBackend()
+    start = time.perf_counter()
+    backend.attach(workbook)
+    for path in paths:
+        backend.import_module(path)
+    mapped = time.perf_counter() - start
+    return scan, mapped
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VBAモジュール インポート バッチモードのベンチマーク')
+    parser.add_argument('--modules', type=int, default=60, help='モジュール数')
+    parser.add_argument('--size-kb', type=int, default=100, help='1モジュールのサイズ（KB）')
+    parser.add_argument('--delay', type=float, default=0.0, help='COMのインポート時間の模擬（秒/モジュール）')
+    parser.add_argument('--item-us', type=float, default=50.0, help='COMの要素アクセスの模擬（マイクロ秒/件）')
+    parser.add_argument('-j', '--workers', type=int, help='読み込み・変換のスレッド数')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        project = Path(tmp) / 'project'
+        names = write_modules(project / 'modules', args.modules, args.size_kb, args.seed)
+        (project / 'book.xlsm').write_bytes(b'PK')
+        config_path = project / 'vba_import_config.json'
+        config_path.write_text(json.dumps({'workbook': 'book.xlsm', 'modules': names, 'auto_backup': False,
+                                           'modules_dir': 'modules'}), encoding='utf-8')
+
+        # GUI版はモジュールを書き換えるためコピーで計測
+        gui_dir = Path(tmp) / 'gui-modules'
+        shutil.copytree(project / 'modules', gui_dir)
+        seconds = {'gui': run_gui_style(gui_dir, names, args.delay),
+                   'staged': run_staged_style(project / 'modules', Path(tmp) / 'staging', names, args.delay)}
+
+        def quiet(message, level):
+            pass
+
+        for name in ('cold', 'warm'):
+            result = run_batch_import(config_path, StubImportBackend(args.delay), args.workers, log=quiet)
+            seconds[name] = result['seconds']
+            print(f"  {name}: インポート {len(result['imported'])} / スキップ {len(result['skipped'])}")
+        assert (project / STATE_FILE).exists()
+
+    total_mb = args.modules * args.size_kb / 1024
+    print(f'📦 モジュール: {args.modules} 件 × {args.size_kb} KB（{total_mb:.1f} MB、COM模擬 {args.delay} 秒/件）')
+    for name, value in seconds.items():
+        print(f'{name:>6}: {value:7.3f} 秒')
+    print(f'🔎 既存モジュールの検索（{args.modules} 件、COM模擬 {args.item_us:g} µs/件）')
+    for label, existing in (('初回', False), ('再インポート', True)):
+        scan, mapped = run_component_lookup(args.modules, args.item_us / 1e6, existing)
+        print(f'   {label}: 全件走査 {scan:.3f} 秒 / 対応表 {mapped:.3f} 秒（{scan / mapped:.1f} 倍）')
+    print(f"⚡ staged / gui: {seconds['gui'] / seconds['staged']:.1f} 倍, cold / gui: {seconds['gui'] / seconds['cold']:.1f} 倍, warm / gui: {seconds['gui'] / seconds['warm']:.0f} 倍")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+ベンチマーク用のHR形式CSV生成（sample/test_data_*.csv と同じ形式の合成データ）
+
+- 薬局情報ヘッダー行（H）・項目解析結果行・元号形式の1列目（R1, R6, H31 など）
+- シングルクォートで囲んだ文字列列（数値列はクォートなし）、70列
+- 半角カナの患者カナ氏名（一部は氏名も半角カナ）、漢字和暦の生年月日（明治〜令和）
+- 公費種別番号（12/21/15/16/54）・旭川市/旭川市以外の保険者番号・医療機関コード
+
+使い方:
+python benchmarks/synthetic_hr.py --rows 100000 --out bench-data/hr_100k_sjis.csv
+python benchmarks/synthetic_hr.py --rows 1000000 --encoding utf-8-sig --out bench-data/hr_1m_utf8bom.csv
+"""
+
+import argparse
+import random
+from pathlib import Path
+from typing import Iterator, List
+
+COLUMN_COUNT = 70
+ENCODINGS = ('cp932', 'utf-8', 'utf-8-sig')
+
+# クォートなしで出力する列（1始まり、サンプルCSVと同じ）
+UNQUOTED_COLUMNS = frozenset((1, 2, 4, 5, 6, 8))
+HEADER_UNQUOTED_COLUMNS = frozenset((1, 2, 4, 9))
+
+HEADER_ROW = ['H', '3', '101833', '1', '2025年2月', '2025年2月', '2026/01/20', '氏名順-昇順', '',
+              '調剤薬局ツルハドラッグ札幌駅前店', '北海道札幌市', '', '011-000-0000', '八幡 政浩']
+ANALYSIS_ROW = ['項目解析結果', '', 'レコード番号', '', '', '', '患者番号', '負担額', '請求額', '患者氏名', 'カナ氏名',
+                '生年月日']
+# ヘッダー行（H）を挟む間隔（サンプルCSVは数行〜数十行ごと）
+HEADER_INTERVAL = 500
+
+ERA_PREFIXES = ('R1', 'R1', 'R1', 'R6', 'R7', 'H31')
+SURNAMES = (('佐藤', 'ｻﾄｳ'), ('鈴木', 'ｽｽﾞｷ'), ('高橋', 'ﾀｶﾊｼ'), ('田中', 'ﾀﾅｶ'), ('伊藤', 'ｲﾄｳ'),
+            ('渡辺', 'ﾜﾀﾅﾍﾞ'), ('山本', 'ﾔﾏﾓﾄ'), ('中村', 'ﾅｶﾑﾗ'), ('小林', 'ｺﾊﾞﾔｼ'), ('加藤', 'ｶﾄｳ'),
+            ('吉田', 'ﾖｼﾀﾞ'), ('山田', 'ﾔﾏﾀﾞ'), ('佐々木', 'ｻｻｷ'), ('松本', 'ﾏﾂﾓﾄ'), ('井上', 'ｲﾉｳｴ'))
+GIVEN_NAMES = (('花子', 'ﾊﾅｺ'), ('太郎', 'ﾀﾛｳ'), ('美咲', 'ﾐｻｷ'), ('一郎', 'ｲﾁﾛｳ'), ('恵子', 'ｹｲｺ'),
+               ('修', 'ｵｻﾑ'), ('さくら', 'ｻｸﾗ'), ('健太', 'ｹﾝﾀ'), ('由美', 'ﾕﾐ'), ('翔', 'ｼｮｳ'),
+               ('陽菜', 'ﾋﾅ'), ('大輔', 'ﾀﾞｲｽｹ'), ('直美', 'ﾅｵﾐ'), ('蓮', 'ﾚﾝ'), ('ぺこ', 'ﾍﾟｺ'))
+# 漢字和暦の元号と西暦の範囲（生年月日）
+BIRTH_ERAS = (('明治', 1867, 1908, 1912), ('大正', 1911, 1912, 1926), ('昭和', 1925, 1926, 1989),
+              ('昭和', 1925, 1926, 1989), ('昭和', 1925, 1926, 1989), ('平成', 1988, 1989, 2019),
+              ('平成', 1988, 1989, 2019), ('令和', 2018, 2019, 2025))
+INSTITUTIONS = (('旭川中央病院', '内科', '0112345678'), ('医療法人社団旭川歯科医院', '歯科', '0132987654'),
+                ('旭川整形外科クリニック', '整形外科', '0113456789'), ('旭川メンタルクリニック', '精神科', '0114567890'),
+                ('ｱｻﾋｶﾜ ﾋﾌｶ', '皮膚科', '0115678901'), ('札幌北病院', '内科', '0116789012'))
+# 旭川市の保険者番号を多めに、旭川市以外・未設定も含める
+INSURER_NUMBERS = ('12016010', '12016010', '12016010', '12012019', '12012019', '12010014', '01010016', '')
+ADDRESSES = ('北海道旭川市{n}条通{m}丁目', '北海道旭川市{n}条通{m}丁目', '北海道上川郡東神楽町{n}条{m}丁目',
+             '北海道札幌市中央区北{n}条西{m}丁目')
+PUBLIC_CODES = ('', '', '', '', '21', '15', '16', '54')
+
+
+class _Patient:
+    __slots__ = ('name', 'kana', 'birth', 'birth_digits', 'sex', 'recipient', 'insurer', 'address', 'publics')
+
+    def __init__(self, rng: random.Random, index: int):
+        surname, surname_kana = rng.choice(SURNAMES)
+        given, given_kana = rng.choice(GIVEN_NAMES)
+        self.kana = f'{surname_kana} {given_kana}'
+        # 一部の患者は氏名も半角カナで登録されている
+        self.name = self.kana if rng.random() < 0.05 else f'{surname} {given}'
+
+        era, offset, first_year, last_year = rng.choice(BIRTH_ERAS)
+        year = rng.randrange(first_year, last_year)
+        month, day = rng.randint(1, 12), rng.randint(1, 28)
+        self.birth = f'{era}{year - offset}年{month}月{day}日'
+        self.birth_digits = f'{year:04d}{month:02d}{day:02d}'
+        self.sex = rng.choice(('男', '女'))
+
+        # 受給者番号が未割当（初診など）の患者も含める
+        self.recipient = '' if rng.random() < 0.08 else f'{index % 10_000_000:07d}'
+        self.insurer = rng.choice(INSURER_NUMBERS)
+        self.address = rng.choice(ADDRESSES).format(n=rng.randint(1, 12), m=rng.randint(1, 20))
+        self.publics = (rng.choice(PUBLIC_CODES), rng.choice(PUBLIC_CODES))
+
+
+def _data_row(rng: random.Random, patient: _Patient, serial: int, year_month: str) -> List[str]:
+    """データ行（R1行）を作成（値の位置はサンプルCSVと同じ）"""
+    institution, department, medical_code = rng.choice(INSTITUTIONS)
+    day = rng.randint(1, 28)
+    treatment_date = f'{year_month}{day:02d}'
+    burden = rng.randrange(300, 5000, 50)
+
+    row = [''] * COLUMN_COUNT
+    row[0] = rng.choice(ERA_PREFIXES)
+    row[1:9] = ['1', '154848', '1', '1', str(serial), f'{serial:>6}', str(burden), f'{burden * 3:>10}']
+    row[9] = patient.name
+    row[10] = patient.kana
+    row[11] = patient.birth
+    row[12] = f'{rng.randint(0, 99):>3}'
+    row[13] = patient.sex
+    row[14:17] = ['本', 'なし', '公費単独']
+    row[19:21] = ['100', '  0']
+    row[21:24] = ['12', patient.insurer, '20230401']
+    if patient.publics[0]:
+        row[24:27] = [patient.publics[0], '01013456', '20240101']
+    if patient.publics[1]:
+        row[28:31] = [patient.publics[1], '01045678', '20230801']
+    row[33] = institution
+    row[37] = row[38] = patient.address
+    row[40:42] = ['070-0034', '0166-23-4567']
+    row[46:48] = [patient.birth_digits, f'{patient.insurer} ']
+    row[50] = f'{rng.randrange(10_000_000):07d}'
+    row[53:57] = [patient.insurer, treatment_date, f'{year_month[:4]}/{year_month[4:]}({day})', treatment_date]
+    row[57] = patient.recipient
+    row[60:62] = [str(rng.randint(1, 3)), department]
+    row[63] = '（なし） （なし） （なし）'
+    row[64] = medical_code
+    return row
+
+
+def generate_rows(count: int, seed: int = 0, year_month: str = '202502') -> Iterator[List[str]]:
+    """
+    count 件のデータ行を含むHR形式の行を返す（ヘッダー行・項目解析結果行を含む）
+
+    1人の患者が平均3回（複数医療機関・複数日）受診する分布にする。
+    """
+    rng = random.Random(seed)
+    patients = [_Patient(rng, i) for i in range(max(1, count // 3))]
+
+    yield HEADER_ROW
+    yield ANALYSIS_ROW
+    for serial in range(1, count + 1):
+        if serial % HEADER_INTERVAL == 0:
+            yield HEADER_ROW
+        yield _data_row(rng, rng.choice(patients), serial, year_month)
+
+
+def format_row(row: List[str]) -> str:
+    """1行をサンプルCSVと同じ形式（文字列列はシングルクォート）で出力"""
+    unquoted = HEADER_UNQUOTED_COLUMNS if row[0] == 'H' else UNQUOTED_COLUMNS
+    fields = []
+    for column, value in enumerate(row, 1):
+        if column in unquoted:
+            fields.append(value)
+        else:
+            fields.append("'" + value.replace("'", "''") + "'")
+    return ','.join(fields)
+
+
+def write_hr_csv(path, count: int, encoding: str = 'cp932', seed: int = 0, year_month: str = '202502') -> Path:
+    """
+    合成HR形式CSVを書き出す
+
+    encoding: cp932（Shift-JIS）/ utf-8（BOMなし）/ utf-8-sig（BOM付き）
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f'encoding は {", ".join(ENCODINGS)} のいずれかを指定してください: {encoding}')
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding=encoding, newline='\n', buffering=1024 * 1024) as f:
+        lines = []
+        for row in generate_rows(count, seed, year_month):
+            lines.append(format_row(row))
+            if len(lines) >= 10_000:
+                f.write('\n'.join(lines) + '\n')
+                lines.clear()
+        if lines:
+            f.write('\n'.join(lines) + '\n')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ベンチマーク用のHR形式CSVを生成')
+    parser.add_argument('--rows', type=int, default=10_000, help='データ行数（1万〜500万行）')
+    parser.add_argument('--encoding', choices=ENCODINGS, default='cp932', help='文字コード')
+    parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+    parser.add_argument('--year-month', default='202502', help='調剤年月（YYYYMM）')
+    parser.add_argument('--out', required=True, help='出力先CSV')
+    args = parser.parse_args()
+
+    path = write_hr_csv(args.out, args.rows, args.encoding, args.seed, args.year_month)
+    print(f'✅ {args.rows:,} 行を出力しました: {path} ({path.stat().st_size / 1024 / 1024:.1f} MB)')
+
+
+if __name__ == '__main__':
+    main()
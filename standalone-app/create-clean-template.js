@@ -8,6 +8,7 @@
  */
 
 const ExcelJS = require('exceljs');
+const crypto = require('crypto');
 const fs = require('fs');
 const path = require('path');
 
@@ -67,6 +68,22 @@ async function createCleanTemplate() {
     const jsContent = `// クリーンなテンプレートファイル (Base64エンコード済み)\nconst TEMPLATE_BASE64 = '${base64}';\n`;
     fs.writeFileSync(jsPath, jsContent, 'utf8');
 
+    // マニフェスト（index.htmlはこちらのみ読み込み、本体はloadTemplate()の初回呼び出し時に読み込む）
+    const manifest = JSON.stringify({
+        file: 'template-data.js',
+        sha256: crypto.createHash('sha256').update(buffer).digest('hex'),
+        size: buffer.length,
+        base64Length: base64.length
+    });
+    fs.writeFileSync(
+        path.join(__dirname, 'template-manifest.js'),
+        '// テンプレートマニフェスト（自動生成）\n' +
+        '// テンプレート本体は loadTemplate() の初回呼び出し時に読み込まれます\n' +
+        `const TEMPLATE_MANIFEST = ${manifest};\n`,
+        'utf8'
+    );
+    fs.writeFileSync(path.join(__dirname, 'template-manifest.json'), manifest + '\n', 'utf8');
+
     console.log('\n✅ 完了しました！');
     console.log(`クリーンなテンプレート: ${cleanTemplatePath}`);
     console.log(`Base64ファイル: ${base64Path}`);
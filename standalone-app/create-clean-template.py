@@ -5,63 +5,152 @@
 1. Pythonをインストール (3.7以上)
 2. pip install openpyxl
 3. python create-clean-template.py
+   （元のテンプレートとスクリプトが変わっていない場合は何もしません。強制的に再生成: --force）
 """
 
-import openpyxl
-from openpyxl.utils import get_column_letter
+import argparse
 import base64
+import hashlib
+import io
+import json
 import os
 
-def create_clean_template():
-    print('テンプレートファイルを読み込み中...')
+from template_artifact import MANIFEST_JS_FILE, MANIFEST_JSON_FILE, TEMPLATE_DATA_FILE, write_template_artifacts
+
+# 出力内容に影響する変更をした場合は上げる（ビルドキャッシュのキーに含まれる）
+SCRIPT_VERSION = '3'
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_PATH = os.path.join(BASE_DIR, 'tyouzai_excel_v2.xlsx')
+CLEAN_TEMPLATE_PATH = os.path.join(BASE_DIR, 'tyouzai_excel_v2_clean.xlsx')
+BASE64_PATH = os.path.join(BASE_DIR, 'template_base64.txt')
+JS_PATH = os.path.join(BASE_DIR, TEMPLATE_DATA_FILE)
+MANIFEST_JS_PATH = os.path.join(BASE_DIR, MANIFEST_JS_FILE)
+MANIFEST_JSON_PATH = os.path.join(BASE_DIR, MANIFEST_JSON_FILE)
+
+# ビルドキャッシュ（キー → クリーンなテンプレート）と前回の出力内容
+CACHE_DIR = os.path.join(BASE_DIR, '.template-cache')
+MANIFEST_PATH = os.path.join(CACHE_DIR, 'manifest.json')
+
+
+def sha256_file(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def build_cache_key(source_path):
+    """元のテンプレートの内容とスクリプトのバージョンからキャッシュキーを作成"""
+    with open(source_path, 'rb') as f:
+        source_hash = hashlib.sha256(f.read()).hexdigest()
+    return hashlib.sha256(f'{source_hash}:{SCRIPT_VERSION}'.encode('utf-8')).hexdigest()
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
 
-    template_path = os.path.join(os.path.dirname(__file__), 'tyouzai_excel_v2.xlsx')
-    workbook = openpyxl.load_workbook(template_path)
+def outputs_up_to_date(manifest, cache_key):
+    """前回と同じキーで生成した出力が変更されずに残っているか"""
+    if manifest.get('key') != cache_key:
+        return False
+    outputs = manifest.get('outputs', {})
+    return bool(outputs) and all(
+        sha256_file(os.path.join(BASE_DIR, name)) == digest for name, digest in outputs.items()
+    )
+
+
+def clean_workbook(source_path):
+    """共有数式をクリアしたテンプレートのバイト列を作成"""
+    # キャッシュ一致時は読み込まない（openpyxlの読み込みに時間がかかるため）
+    import openpyxl
+
+    print('テンプレートファイルを読み込み中...')
+    workbook = openpyxl.load_workbook(source_path)
     worksheet = workbook.active
 
-    print('共有数式をクリア中...')
+    print(f'共有数式をクリア中...（使用範囲: {worksheet.max_row}行 × {worksheet.max_column}列）')
 
-    # すべての行の数式をクリア（6行目から最大1000行まで）
-    for row_num in range(6, 1001):
-        for col_num in range(1, 21):  # A列からT列まで（20列）
-            cell = worksheet.cell(row=row_num, column=col_num)
+    # 6行目からシートの使用範囲までの数式をクリア
+    for row in worksheet.iter_rows(min_row=6, max_row=worksheet.max_row, max_col=worksheet.max_column):
+        for cell in row:
             # セルに数式があれば削除
             if cell.value and isinstance(cell.value, str) and cell.value.startswith('='):
                 cell.value = None
 
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def create_clean_template(force=False):
+    cache_key = build_cache_key(SOURCE_PATH)
+    manifest = load_manifest()
+
+    if not force and outputs_up_to_date(manifest, cache_key):
+        print('✅ テンプレートに変更はありません（ビルドキャッシュ一致）')
+        return False
+
+    cached_path = os.path.join(CACHE_DIR, f'{cache_key}.xlsx')
+    if not force and os.path.exists(cached_path):
+        print('♻️ ビルドキャッシュからクリーンなテンプレートを復元中...')
+        with open(cached_path, 'rb') as f:
+            file_data = f.read()
+    else:
+        file_data = clean_workbook(SOURCE_PATH)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(cached_path, 'wb') as f:
+            f.write(file_data)
+
     print('クリーンなテンプレートを保存中...')
-    clean_template_path = os.path.join(os.path.dirname(__file__), 'tyouzai_excel_v2_clean.xlsx')
-    workbook.save(clean_template_path)
+    with open(CLEAN_TEMPLATE_PATH, 'wb') as f:
+        f.write(file_data)
 
     print('Base64エンコード中...')
-    # ファイルを読み込んでBase64エンコード
-    with open(clean_template_path, 'rb') as f:
-        file_data = f.read()
-        base64_data = base64.b64encode(file_data).decode('utf-8')
+    base64_data = base64.b64encode(file_data).decode('utf-8')
 
     # Base64文字列をファイルに保存
-    base64_path = os.path.join(os.path.dirname(__file__), 'template_base64.txt')
-    with open(base64_path, 'w', encoding='utf-8') as f:
+    with open(BASE64_PATH, 'w', encoding='utf-8') as f:
         f.write(base64_data)
 
-    # JavaScriptファイルとして保存
-    js_path = os.path.join(os.path.dirname(__file__), 'template-data.js')
-    with open(js_path, 'w', encoding='utf-8') as f:
-        f.write('// クリーンなテンプレートファイル (Base64エンコード済み)\n')
-        f.write('const TEMPLATE_BASE64 = \'')
-        f.write(base64_data)
-        f.write('\';\n')
+    # JavaScriptファイル（テンプレート本体 + マニフェスト）として保存
+    manifest = write_template_artifacts(file_data, BASE_DIR)
+
+    save_manifest({
+        'key': cache_key,
+        'script_version': SCRIPT_VERSION,
+        'outputs': {
+            os.path.basename(path): sha256_file(path)
+            for path in (CLEAN_TEMPLATE_PATH, BASE64_PATH, JS_PATH, MANIFEST_JS_PATH, MANIFEST_JSON_PATH)
+        },
+    })
 
     print('\n完了しました！')
-    print(f'クリーンなテンプレート: {clean_template_path}')
-    print(f'Base64ファイル: {base64_path}')
-    print(f'JavaScriptファイル: {js_path}')
+    print(f'クリーンなテンプレート: {CLEAN_TEMPLATE_PATH}')
+    print(f'Base64ファイル: {BASE64_PATH}')
+    print(f'JavaScriptファイル: {JS_PATH}')
+    print(f'マニフェスト: {MANIFEST_JS_PATH} (sha256: {manifest["sha256"][:12]}...)')
     print(f'Base64サイズ: {len(base64_data)} 文字')
     print(f'元のファイルサイズ: {len(file_data)} バイト')
+    return True
+
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='クリーンなテンプレートとBase64ファイルを作成')
+    parser.add_argument('--force', action='store_true', help='ビルドキャッシュを使わずに再生成')
+    args = parser.parse_args()
     try:
-        create_clean_template()
+        create_clean_template(force=args.force)
     except Exception as e:
         print(f'❌ エラーが発生しました: {e}')
         import traceback
@@ -1,34 +1,30 @@
 """
-元のテンプレートファイルをBase64エンコードしてtemplate-data.jsを作成
+元のテンプレートファイルをBase64エンコードしてtemplate-data.js（+ template-manifest.js）を作成
 
 使い方:
 python create-original-template.py
 """
 
-import base64
 import os
 
+from template_artifact import write_template_artifacts
+
 def create_original_template():
     print('元のテンプレートファイルを読み込み中...')
 
     template_path = os.path.join(os.path.dirname(__file__), 'tyouzai_excel_v2.xlsx')
 
-    # ファイルを読み込んでBase64エンコード
+    # ファイルを読み込み
     with open(template_path, 'rb') as f:
         file_data = f.read()
-        base64_data = base64.b64encode(file_data).decode('utf-8')
 
-    # JavaScriptファイルとして保存
-    js_path = os.path.join(os.path.dirname(__file__), 'template-data.js')
-    with open(js_path, 'w', encoding='utf-8') as f:
-        f.write('// 元のテンプレートファイル (Base64エンコード済み)\n')
-        f.write('const TEMPLATE_BASE64 = \'')
-        f.write(base64_data)
-        f.write('\';\n')
+    # JavaScriptファイル（テンプレート本体 + マニフェスト）として保存
+    out_dir = os.path.dirname(os.path.abspath(__file__))
+    manifest = write_template_artifacts(file_data, out_dir, '元のテンプレートファイル (Base64エンコード済み)')
 
     print('\n完了しました！')
-    print(f'JavaScriptファイル: {js_path}')
-    print(f'Base64サイズ: {len(base64_data)} 文字')
+    print(f'JavaScriptファイル: {os.path.join(out_dir, manifest["file"])}')
+    print(f'Base64サイズ: {manifest["base64Length"]} 文字')
     print(f'元のファイルサイズ: {len(file_data)} バイト')
 
 if __name__ == '__main__':
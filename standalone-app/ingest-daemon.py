@@ -0,0 +1,18 @@
+"""
+受付フォルダに置かれたCSVから調剤券請求書を作成し続ける常駐スクリプト
+
+使い方:
+1. Pythonをインストール (3.8以上)
+2. pip install -r requirements.txt
+3. python ingest-daemon.py 受付フォルダ -o 出力フォルダ --stores stores.json
+
+受付フォルダに置かれたCSVは書き込みが終わってから処理し、processed / failed に移す。
+処理状況は 出力フォルダ/manifest.json に書き出す（Ctrl+C で停止）。
+"""
+
+import sys
+
+from invoice_batch.ingest import main
+
+if __name__ == '__main__':
+    sys.exit(main())
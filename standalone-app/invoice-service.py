@@ -0,0 +1,20 @@
+"""
+調剤券請求書をブラウザ・スクリプトから作成するローカルHTTPサービス
+
+使い方:
+1. Pythonをインストール (3.8以上)
+2. pip install -r requirements.txt
+3. python invoice-service.py --processed-keys processed-keys.db
+4. ブラウザで http://127.0.0.1:8765/ を開き、CSVをアップロード
+
+スクリプトから送信する場合:
+curl -F file=@店舗.csv -F batch=1 -F pharmacy_name=○○薬局 -F medical_code=0141234567 \
+     -o 請求書.xlsx http://127.0.0.1:8765/invoice
+"""
+
+import sys
+
+from invoice_batch.service import main
+
+if __name__ == '__main__':
+    sys.exit(main())
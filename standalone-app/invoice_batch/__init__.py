@@ -0,0 +1,29 @@
+"""
+調剤券請求書 一括作成エンジン（Python版）
+
+standalone-app/app.js の
+parseCSVFile → filterPatients → groupPatientsByRecipient → generateExcel
+と同じ処理をコマンドラインから複数CSVに対して実行する。
+"""
+
+from .batch import process_csv_file, run_batch
+from .column_reader import stream_csv_columns
+from .csv_reader import decode_csv_bytes, parse_csv_text, read_csv_file, stream_csv_file
+from .date_parser import DateParser, date_cache_stats, parse_japanese_date, parse_yyyymmdd
+from .encoding_detect import EncodingDetection, detect_encoding, detect_file_encoding
+from .excel_writer import generate_excel, generate_file_name, load_template_bytes
+from .fingerprint import FINGERPRINT_KEY_FORMAT, LEGACY_KEY_FORMAT, patient_fingerprint
+from .grouping import group_patients_by_recipient
+from .incremental import MonthState
+from .ingest import DropFolderWatcher, IngestDaemon
+from .parse_cache import ParseCache
+from .pdf_writer import generate_pdf, write_pdf
+from .patient_filter import (create_patient_data, filter_patients, filter_previous_month_patients,
+                             fix_kana_and_trim, make_fingerprint_key, simple_hash)
+from .processed_keys import ProcessedKeyStore, reconcile_keys
+from .profiling import Profiler
+from .records import PatientRecord, StringPool
+from .service import InvoiceServer, InvoiceService
+from .xlsx_stream import TemplateForm, generate_excel_stream, load_template_form, write_excel_stream
+
+__version__ = '1.0.0'
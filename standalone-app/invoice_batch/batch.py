@@ -0,0 +1,420 @@
+"""
+複数店舗CSVの一括処理（プロセスプール）
+
+CSVフォルダ内の各ファイルについて
+CSV解析 → 旭川市フィルタ → グループ化 → Excel生成 を並列に実行する。
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .column_reader import stream_csv_columns
+from .csv_reader import stream_csv_file
+from .encoding_detect import DEFAULT_ENCODING_MODE, ENCODING_MODES
+from .excel_writer import generate_file_name, load_template_bytes
+from .grouping import group_patients_by_recipient
+from .incremental import MonthState
+from .fingerprint import KEY_FORMATS, LEGACY_KEY_FORMAT
+from .parse_cache import DEFAULT_MAX_BYTES, ParseCache, ParsedCSV
+from .pdf_writer import generate_pdf_file_name, write_pdf
+from .patient_filter import (classify_previous_month_patients, filter_parsed_patients, filter_patients,
+                             filter_previous_month_patients, make_claim_keys)
+from .processed_keys import ProcessedKeyStore, is_sqlite_path
+from .profiling import Profiler, build_report, stage_timer
+from .xlsx_stream import write_excel_stream
+
+# ワーカープロセスごとに保持するテンプレート
+_worker_template = None
+
+
+def _init_worker(template_bytes: bytes):
+    """ワーカー初期化（テンプレートをプロセス内に保持）"""
+    global _worker_template
+    _worker_template = template_bytes
+
+
+def find_csv_files(csv_dir) -> List[Path]:
+    """フォルダ内のCSVファイル一覧（ファイル名順）"""
+    return sorted(p for p in Path(csv_dir).iterdir() if p.is_file() and p.suffix.lower() == '.csv')
+
+
+def load_store_settings(stores_path) -> Dict[str, Dict]:
+    """
+    店舗設定ファイル読み込み
+
+    形式: {"CSVファイル名": {"pharmacy_name": "...", "medical_code": "..."}, ...}
+    """
+    if not stores_path:
+        return {}
+    with open(stores_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_processed_keys(keys_path):
+    """
+    処理済みキー読み込み
+
+    拡張子が .db / .sqlite / .sqlite3 の場合は ProcessedKeyStore（SQLite、全件読み込みなし）、
+    それ以外は localStorage['processed-keys'] と同じJSON配列を set として返す。
+    """
+    if keys_path and is_sqlite_path(keys_path):
+        return ProcessedKeyStore(keys_path)
+    if not keys_path or not Path(keys_path).exists():
+        return set()
+    with open(keys_path, 'r', encoding='utf-8') as f:
+        return set(json.load(f))
+
+
+def save_processed_keys(keys_path, keys: List[str]):
+    """処理済みキー保存（既存キーとマージ、出現順を維持。SQLiteの場合は追加分のみ書き込み）"""
+    if is_sqlite_path(keys_path):
+        with ProcessedKeyStore(keys_path) as store:
+            store.add_keys(keys)
+        return
+
+    existing = []
+    if Path(keys_path).exists():
+        with open(keys_path, 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+    merged = list(dict.fromkeys(existing + keys))
+    with open(keys_path, 'w', encoding='utf-8') as f:
+        json.dump(merged, f, ensure_ascii=False)
+
+
+def process_csv_file(csv_path, output_dir, batch_number: int = 1, pharmacy_name: str = '',
+                     medical_code: str = '', processed_keys=None,
+                     encoding_mode: str = DEFAULT_ENCODING_MODE,
+                     template_bytes: Optional[bytes] = None, state_dir=None,
+                     previous_dir=None, key_format: str = LEGACY_KEY_FORMAT, profile: bool = False,
+                     pdf: bool = False, font_path=None, selective_read: bool = False,
+                     parse_cache: Optional[ParseCache] = None) -> Dict:
+    """
+    CSVファイル1件を処理して請求書Excelを出力
+
+    state_dir を指定した場合は増分処理（前回以降に追加された行のみ処理し、
+    請求書は状態ファイルに保存済みの対象患者から作成する）。
+    previous_dir に同じファイル名の前月分CSVがある場合は、処理済みキーと照合して
+    請求漏れ・要確認の患者を月遅れ請求として追加する。
+    key_format が FINGERPRINT_KEY_FORMAT の場合は識別ハッシュ形式のキーで照合・保存する
+    （照合は旧形式のキーも対象）。
+    profile=True の場合は段階ごとの時間・件数・メモリ使用量（profiling.Profiler）を 'profile' に追加する。
+    pdf=True の場合は同じ内容の請求書PDF（pdf_writer、font_path は日本語フォント）もExcelと同じフォルダに出力する。
+    selective_read=True の場合は必要な列のみデコードする column_reader で読み込む（列数の多いCSV向け）。
+    parse_cache を指定した場合は内容が同じCSV（前月分CSVを含む）の解析結果を再利用する
+    （増分処理では使わない）。
+
+    Returns:
+        処理結果（件数・出力先・処理済みキー）
+    """
+    csv_path = Path(csv_path)
+    profiler = Profiler() if profile else None
+    read_csv = stream_csv_columns if selective_read else stream_csv_file
+    stage = stage_timer(profiler)
+    incremental = None
+    if state_dir:
+        with MonthState(Path(state_dir) / f'{csv_path.stem}.sqlite3') as state:
+            # 増分処理は追加分の読み込み・解析・判定を parse としてまとめて計測
+            with stage('parse'):
+                incremental = state.update(csv_path, encoding_mode)
+            with stage('filter'):
+                filter_result = state.patients(batch_number, processed_keys, key_format)
+        used_encoding = incremental['encoding']
+    else:
+        cache_key = None
+        parsed = None
+        if parse_cache is not None:
+            with stage('parse'):
+                cache_key = parse_cache.key(csv_path, encoding_mode)
+                parsed = parse_cache.load(cache_key)
+        if parsed is not None:
+            used_encoding = parsed.encoding
+            with stage('filter'):
+                filter_result = filter_parsed_patients(parsed.patients, parsed.total, batch_number, processed_keys,
+                                                       key_format=key_format, profiler=profiler)
+        else:
+            # ストリーム読み込み: 旭川市の対象患者のみ保持する
+            records, used_encoding = read_csv(csv_path, encoding_mode, profiler=profiler)
+            with stage('filter'):
+                filter_result = filter_patients(records, batch_number, processed_keys, keep_all=False,
+                                                key_format=key_format, profiler=profiler)
+            if cache_key is not None:
+                with stage('parse'):
+                    parse_cache.store(csv_path, cache_key, ParsedCSV(used_encoding, filter_result['total'],
+                                                                     filter_result['asahikawa']))
+    if profiler is not None:
+        profiler.sample_memory('filter')
+
+    # チェックONの患者のみ出力
+    included = [p for p in filter_result['target'] if p.is_included]
+
+    previous = None
+    previous_path = Path(previous_dir) / csv_path.name if previous_dir else None
+    if previous_path is not None and previous_path.exists():
+        previous = _filter_previous(previous_path, processed_keys, encoding_mode, key_format, read_csv,
+                                    parse_cache, profiler)
+        # 月遅れ分を末尾に追加（app.js の handleExcelDownload() と同じ順。ファイル名は当月分の調剤年月日になる）
+        included = included + [p for p in previous['asahikawa'] if p.is_included]
+
+    result = {
+        'csv': csv_path.name,
+        'encoding': used_encoding,
+        'total': filter_result['total'],
+        'target': len(filter_result['target']),
+        'duplicate': len(filter_result['duplicate']),
+        'included': len(included),
+        'rows': 0,
+        'output': None,
+        'pdf': None,
+        'processed_keys': [],
+    }
+    if parse_cache is not None and incremental is None:
+        result['parse_cache'] = 'hit' if parsed is not None else 'miss'
+    if incremental is not None:
+        result['incremental'] = {k: incremental[k] for k in ('mode', 'new_rows', 'new_targets', 'removed_rows')}
+    if previous is not None:
+        result['previous'] = {k: len(previous[k]) for k in ('asahikawa', 'duplicate', 'unbilled', 'ambiguous')}
+    if not included:
+        return _finish_profile(profiler, result, csv_path)
+
+    with stage('group'):
+        grouped = group_patients_by_recipient(included)
+    if profiler is not None:
+        profiler.sample_memory('group')
+    template_bytes = template_bytes or _worker_template or load_template_bytes()
+
+    # 店舗間のファイル名衝突を避けるためCSVごとにフォルダを分ける
+    output_path = Path(output_dir) / csv_path.stem / generate_file_name(included, batch_number, pharmacy_name)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # シートXMLを1行ずつ書き込む（行数に関わらずメモリ使用量は一定）
+    with stage('write'):
+        write_excel_stream(grouped, template_bytes, output_path, pharmacy_name, medical_code)
+
+    result['rows'] = len(grouped)
+    result['output'] = str(output_path)
+    if pdf:
+        # Excelを経由せず、グループ化済みデータから直接描画する
+        pdf_path = output_path.parent / generate_pdf_file_name(included, batch_number, pharmacy_name)
+        with stage('pdf'):
+            write_pdf(grouped, pdf_path, pharmacy_name, medical_code, template_bytes, font_path)
+        result['pdf'] = str(pdf_path)
+    # 処理済みキー保存（1回目のみ）
+    if batch_number == 1:
+        with stage('fingerprint'):
+            result['processed_keys'] = [make_claim_keys(p, key_format)[0] for p in included]
+    return _finish_profile(profiler, result, csv_path)
+
+
+def _filter_previous(previous_path: Path, processed_keys, encoding_mode: str, key_format: str, read_csv,
+                     parse_cache: Optional[ParseCache], profiler: Optional[Profiler]) -> Dict:
+    """前月分CSVの月遅れ請求の分類（解析結果のキャッシュがあれば再利用）"""
+    stage = stage_timer(profiler)
+    cache_key = None
+    if parse_cache is not None:
+        with stage('parse'):
+            cache_key = parse_cache.key(previous_path, encoding_mode)
+            parsed = parse_cache.load(cache_key)
+        if parsed is not None:
+            with stage('filter'):
+                return classify_previous_month_patients(parsed.patients, parsed.total, processed_keys, key_format)
+
+    previous_records, used_encoding = read_csv(previous_path, encoding_mode, profiler=profiler)
+    with stage('filter'):
+        previous = filter_previous_month_patients(previous_records, processed_keys, key_format)
+    if cache_key is not None:
+        with stage('parse'):
+            parse_cache.store(previous_path, cache_key, ParsedCSV(used_encoding, previous['total'],
+                                                                  previous['asahikawa']))
+    return previous
+
+
+def _finish_profile(profiler: Optional[Profiler], result: Dict, csv_path: Path) -> Dict:
+    """計測結果（件数・バイト数・メモリ使用量）を処理結果に追加"""
+    if profiler is None:
+        return result
+    profiler.count('input_bytes', csv_path.stat().st_size)
+    profiler.count('rows_total', result['total'])
+    profiler.count('rows_target', result['target'])
+    profiler.count('rows_included', result['included'])
+    profiler.count('rows_written', result['rows'])
+    if result['output']:
+        profiler.count('output_bytes', Path(result['output']).stat().st_size)
+    profiler.sample_memory('end')
+    result['profile'] = profiler.report()
+    return result
+
+
+def run_batch(csv_dir, output_dir, batch_number: int = 1, stores: Optional[Dict[str, Dict]] = None,
+              default_pharmacy_name: str = '', default_medical_code: str = '',
+              processed_keys=None, encoding_mode: str = DEFAULT_ENCODING_MODE,
+              template_path=None, workers: Optional[int] = None, state_dir=None,
+              previous_dir=None, key_format: str = LEGACY_KEY_FORMAT, profile: bool = False,
+              pdf: bool = False, font_path=None, selective_read: bool = False,
+              parse_cache: Optional[ParseCache] = None) -> List[Dict]:
+    """
+    フォルダ内の全CSVをプロセスプールで処理
+
+    profile=True の場合は各結果に段階ごとの計測結果（'profile'）を含める。
+    pdf=True の場合は各ワーカープロセスで請求書PDFも出力する（フォント・レイアウトはプロセスごとに1回だけ準備）。
+    selective_read=True の場合は各CSVを必要な列のみデコードして読み込む（column_reader）。
+    parse_cache（parse_cache.ParseCache）を指定した場合はCSVの解析結果をフォルダに保存し、内容が同じCSVで再利用する。
+
+    Returns:
+        CSVファイルごとの処理結果（ファイル名順）。失敗したファイルは 'error' を含む。
+    """
+    csv_files = find_csv_files(csv_dir)
+    stores = stores or {}
+    template_bytes = load_template_bytes(template_path)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(template_bytes,)) as executor:
+        futures = {}
+        for csv_path in csv_files:
+            store = stores.get(csv_path.name, {})
+            future = executor.submit(
+                process_csv_file, csv_path, output_dir, batch_number,
+                store.get('pharmacy_name', default_pharmacy_name),
+                store.get('medical_code', default_medical_code),
+                processed_keys, encoding_mode, None, state_dir, previous_dir, key_format, profile,
+                pdf, font_path, selective_read, parse_cache,
+            )
+            futures[future] = csv_path
+
+        for future in as_completed(futures):
+            csv_path = futures[future]
+            try:
+                results[csv_path.name] = future.result()
+            except Exception as e:
+                # 1ファイルの失敗で全体を止めない
+                results[csv_path.name] = {'csv': csv_path.name, 'error': f'{type(e).__name__}: {e}'}
+
+    return [results[p.name] for p in csv_files]
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='調剤券請求書 一括作成（複数店舗CSV対応）')
+    parser.add_argument('csv_dir', help='CSVファイルを格納したフォルダ')
+    parser.add_argument('-o', '--output-dir', default='output', help='出力フォルダ（既定: output）')
+    parser.add_argument('--batch', type=int, choices=(1, 2), default=1, help='請求回数（1回目/2回目）')
+    parser.add_argument('--stores', help='店舗設定JSON（CSVファイル名 → 薬局名・医療機関コード）')
+    parser.add_argument('--pharmacy-name', default='', help='薬局名（店舗設定が無い場合）')
+    parser.add_argument('--medical-code', default='', help='医療機関コード（店舗設定が無い場合）')
+    parser.add_argument('--processed-keys',
+                        help='処理済みキー（.json または .db/.sqlite。2回目請求の重複判定に使用、1回目で更新）')
+    parser.add_argument('--import-keys', help='旧形式の処理済みキーJSONを --processed-keys のSQLiteへ取り込む')
+    parser.add_argument('--retention-months', type=int,
+                        help='処理済みキーを直近Nか月の請求年月分のみ保持（SQLiteのみ）')
+    parser.add_argument('--key-format', choices=KEY_FORMATS, default=LEGACY_KEY_FORMAT,
+                        help='処理済みキーの形式（legacy: ブラウザ版と共通 / fingerprint: 氏名・生年月日・受給者番号の'
+                             '識別ハッシュ、旧形式のキーも照合）')
+    parser.add_argument('--encoding-mode', choices=ENCODING_MODES, default=DEFAULT_ENCODING_MODE)
+    parser.add_argument('--template', help='テンプレートxlsx（既定: tyouzai_excel_v2_clean.xlsx）')
+    parser.add_argument('--state-dir',
+                        help='増分処理の状態フォルダ（請求月ごとに指定。前回以降に追加された行のみ処理）')
+    parser.add_argument('--previous-dir',
+                        help='前月分CSVのフォルダ（同じファイル名のCSVの請求漏れを月遅れ請求として追加）')
+    parser.add_argument('--pdf', action='store_true', help='請求書PDFも出力する（Excelと同じフォルダ・ファイル名）')
+    parser.add_argument('--font', help='PDFの日本語フォント（TTF/TTC。既定: reportlab組み込みのHeiseiKakuGo-W5）')
+    parser.add_argument('--selective-read', action='store_true',
+                        help='必要な列のみデコードして読み込む（65列目より後ろに列の多いCSV向け）')
+    parser.add_argument('--parse-cache',
+                        help='CSV解析結果のキャッシュフォルダ（内容が同じCSVは1回目・2回目請求・前月分で解析を省略）')
+    parser.add_argument('--parse-cache-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help='キャッシュフォルダの上限（MB。超えた場合は最後に使用した日時の古いものから削除）')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='ワーカープロセス数')
+    parser.add_argument('--profile', metavar='JSON',
+                        help='段階ごとの処理時間・件数・メモリ使用量のレポートをJSONで書き出す')
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_arg_parser().parse_args(argv)
+
+    processed_keys = load_processed_keys(args.processed_keys)
+    if args.import_keys:
+        if not isinstance(processed_keys, ProcessedKeyStore):
+            print('❌ --import-keys には --processed-keys にSQLiteファイル（.db/.sqlite）を指定してください')
+            return 1
+        imported = processed_keys.import_json(args.import_keys)
+        print(f'📥 処理済みキー取り込み: {imported} 件 ← {args.import_keys}')
+    csv_count = len(find_csv_files(args.csv_dir))
+    print(f'📄 CSVファイル: {csv_count} 件 ({args.csv_dir})')
+    print(f'📋 {args.batch}回目請求 / ワーカー数: {args.workers}')
+
+    started = time.perf_counter()
+    results = run_batch(
+        args.csv_dir, args.output_dir, args.batch,
+        stores=load_store_settings(args.stores),
+        default_pharmacy_name=args.pharmacy_name,
+        default_medical_code=args.medical_code,
+        processed_keys=processed_keys,
+        encoding_mode=args.encoding_mode,
+        template_path=args.template,
+        workers=args.workers,
+        state_dir=args.state_dir,
+        previous_dir=args.previous_dir,
+        key_format=args.key_format,
+        profile=bool(args.profile),
+        pdf=args.pdf,
+        font_path=args.font,
+        selective_read=args.selective_read,
+        parse_cache=ParseCache(args.parse_cache, args.parse_cache_mb * 1024 * 1024) if args.parse_cache else None,
+    )
+    seconds = time.perf_counter() - started
+
+    new_keys = []
+    error_count = 0
+    for result in results:
+        if 'error' in result:
+            error_count += 1
+            print(f"❌ {result['csv']}: {result['error']}")
+            continue
+        new_keys.extend(result['processed_keys'])
+        print(f"✅ {result['csv']} ({result['encoding']}): 全{result['total']}件 / "
+              f"旭川市{result['target']}件 / 重複{result['duplicate']}件 → {result['rows']}行")
+        if result.get('parse_cache') == 'hit':
+            print('   ⚡ 解析結果キャッシュを使用')
+        if result['pdf']:
+            print(f"   🖨️ PDF: {Path(result['pdf']).name}")
+        if 'incremental' in result:
+            incremental = result['incremental']
+            print(f"   ➕ 増分処理（{incremental['mode']}）: 追加{incremental['new_rows']}件 / "
+                  f"うち旭川市{incremental['new_targets']}件 / 削除{incremental['removed_rows']}件")
+        if 'previous' in result:
+            previous = result['previous']
+            print(f"   📅 前月分（月遅れ）: 旭川市{previous['asahikawa']}件 / 請求済み{previous['duplicate']}件 / "
+                  f"請求漏れ{previous['unbilled']}件 / 要確認{previous['ambiguous']}件")
+
+    if args.processed_keys and new_keys:
+        save_processed_keys(args.processed_keys, new_keys)
+        print(f'💾 処理済みキー保存: {len(new_keys)} 件 → {args.processed_keys}')
+
+    if isinstance(processed_keys, ProcessedKeyStore):
+        if args.retention_months:
+            removed = processed_keys.prune(args.retention_months)
+            print(f'🧹 処理済みキー整理: 直近{args.retention_months}か月より前の {removed} 件を削除')
+        processed_keys.close()
+
+    if args.profile:
+        report = build_report(results, seconds, args.workers, {
+            'batch': args.batch, 'encoding_mode': args.encoding_mode, 'key_format': args.key_format,
+            'incremental': bool(args.state_dir), 'previous_month': bool(args.previous_dir),
+            'selective_read': args.selective_read, 'parse_cache': bool(args.parse_cache),
+        })
+        Path(args.profile).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.profile, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'📊 プロファイル: {args.profile}（{seconds:.2f} 秒）')
+
+    print(f'\n完了: {len(results) - error_count}/{len(results)} ファイル')
+    return 1 if error_count else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+必要な列のみのCSV読み込み（メモリマップ + バイト単位の列分割）
+
+パイプラインが参照する列（データ行判定の1列目と records.PIPELINE_COLUMNS）だけを
+デコードし、その列については csv_reader.stream_csv_file() と同じ値を返す。
+- ファイルをメモリマップし、1行ずつバイト列のまま ',' で分割する
+- 最後の参照列（65列目）より後ろは分割せず、1つのバイト列のまま読み飛ばす
+- 参照列のバイト列だけを連結して1回でデコードし、クォートを外す
+- 対応するコーデック（cp932 / UTF-8）は ',' "'" 改行のバイトを2バイト文字の途中に含まないため、
+  デコード前に区切り位置を決められる
+- クォート内に ',' や改行を含む行、値の途中にクォートを含む行など、バイト単位の分割で
+  判定できない行だけを csv モジュールで解析する
+
+65列目までは bytes.split() で列ごとのバイト列を作る（参照しない列を作らずに読み飛ばす
+正規表現・find() の繰り返しは、Pythonではこの分割より遅い）。デコード・文字列の作成は参照列のみで、
+65列目より後ろは分割しないため、列数の多いCSV（備考などの列が続く出力）でのみ stream_csv_file() より速い。
+約70列のHR形式では csv モジュール（C実装）の方が速いため、batch の --selective-read を指定した場合のみ使う。
+"""
+
+import csv
+import io
+import mmap
+import operator
+import os
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+from .csv_reader import DEFAULT_ENCODING_MODE, sniff_stream_encoding
+from .encoding_detect import BOM_CODEC, UTF8_BOM
+from .records import PIPELINE_COLUMNS
+
+# 読み込む列（1始まり）
+READ_COLUMNS = (1,) + PIPELINE_COLUMNS
+
+# 連結デコード時の値の区切り（NULを含む行は csv モジュールで解析する）
+_SEPARATOR = b'\x00'
+
+
+def stream_csv_columns(path, mode: str = DEFAULT_ENCODING_MODE, profiler=None) -> Tuple[Iterator[List[str]], str]:
+    """
+    CSVファイルの必要な列のみをデコードしながら1行ずつ返す（stream_csv_file() の代替）
+
+    行は READ_COLUMNS の最大列数（65列）のリストで、READ_COLUMNS 以外の列は空文字になる
+    （csv モジュールで解析した行はすべての列を含む）。
+    profiler（profiling.Profiler）を渡した場合は解析時間を parse として計測し、読み込みバイト数を数える。
+
+    Returns:
+        (CSV行のイテレータ, 使用エンコーディング表示名)
+    """
+    with open(path, 'rb') as f:
+        codec, used_encoding = sniff_stream_encoding(f, mode)
+
+    records = _iter_selected_rows(path, codec)
+    if profiler is not None:
+        profiler.count('bytes_read', Path(path).stat().st_size)
+        return profiler.iterate('parse', records), used_encoding
+    return records, used_encoding
+
+
+def _iter_selected_rows(path, codec: str) -> Iterator[List[str]]:
+    """メモリマップしたファイルから READ_COLUMNS の値を1行ずつ返す"""
+    width = max(READ_COLUMNS)
+    indexes = [column - 1 for column in READ_COLUMNS]
+    pick = operator.itemgetter(*indexes)
+    # 分割した値は先頭・末尾が空文字のため、参照しない列は先頭（0番目）の空文字にする
+    positions = {index: position for position, index in enumerate(indexes, 1)}
+    expand = operator.itemgetter(*[positions.get(index, 0) for index in range(width)])
+    padding = [b''] * width
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if codec == BOM_CODEC[0] and mapped[:len(UTF8_BOM)] == UTF8_BOM:
+                # BOMはファイル先頭のみ（以降は行ごとにデコードするため utf-8 として扱う）
+                mapped.seek(len(UTF8_BOM))
+                codec = 'utf-8'
+            lines = iter(mapped.readline, b'')
+            for line in lines:
+                record = line.rstrip(b'\r\n')
+                if not record:
+                    continue
+                fields = record.split(b',', width)
+                joined = None
+                if len(fields) > 1 and _is_plain(record, fields, width):
+                    if len(fields) <= width:
+                        fields += padding
+                    joined = _unquote(_SEPARATOR + _SEPARATOR.join(pick(fields)) + _SEPARATOR)
+                if joined is None:
+                    yield from _parse_rows(line, lines, codec)
+                    continue
+                yield list(expand(joined.decode(codec, errors='replace').split('\x00')))
+
+
+def _is_plain(record: bytes, fields: List[bytes], width: int) -> bool:
+    """
+    ',' での分割が csv モジュールの解析と一致する行か
+
+    クォートの数を先頭から数え、クォート内（奇数番目の区間）に ',' を含まないことを確認する。
+    読み飛ばす列（width 列目より後ろ）はクォートの数が偶数（次の行に続かない）であることのみ確認する。
+    """
+    if b'\r' in record or _SEPARATOR in record:
+        return False
+    head = record
+    if len(fields) > width:
+        tail = fields[-1]
+        if tail.count(b"'") % 2:
+            return False
+        head = record[:len(record) - len(tail) - 1]
+    if b"'" not in head:
+        return True
+    parts = head.split(b"'")
+    return len(parts) % 2 == 1 and b',' not in b''.join(parts[1::2])
+
+
+def _unquote(joined: bytes):
+    """
+    区切り文字で連結した値のクォートを外す
+
+    値の前後以外にクォートを含む（'' のエスケープなど）場合は None（csv モジュールで解析する）。
+    """
+    if b"'" not in joined:
+        return joined
+    if joined.count(_SEPARATOR + b"'") != joined.count(b"'" + _SEPARATOR):
+        return None
+    joined = joined.replace(_SEPARATOR + b"'", _SEPARATOR).replace(b"'" + _SEPARATOR, _SEPARATOR)
+    return None if b"'" in joined else joined
+
+
+def _parse_rows(line: bytes, lines: Iterator[bytes], codec: str) -> Iterator[List[str]]:
+    """
+    1行を csv モジュールで解析する（クォート内の改行は次の行以降を読み進める）
+
+    行の区切りは open(newline='') と同じ（\\n・\\r・\\r\\n）。
+    """
+    pending = []
+
+    def split_lines(data: bytes):
+        pending.extend(reversed(io.StringIO(data.decode(codec, errors='replace'), newline='').readlines()))
+
+    def text_lines():
+        while True:
+            if not pending:
+                data = next(lines, None)
+                if data is None:
+                    return
+                split_lines(data)
+                continue
+            yield pending.pop()
+
+    split_lines(line)
+    for row in csv.reader(text_lines(), delimiter=',', quotechar="'", doublequote=True):
+        if row and row != ['']:
+            yield row
+        # 読み込んだ行をすべて解析したら分割による読み込みに戻る
+        if not pending:
+            return
@@ -0,0 +1,130 @@
+"""
+CSV読み込み（エンコーディング自動判定 + シングルクォートCSV解析）
+
+standalone-app/app.js の parseCSVFile() と同じ判定順序でデコードし（判定は encoding_detect）、
+Papa Parse（quoteChar/escapeChar = "'"）と同じ規則で行を分割する。
+"""
+
+import codecs
+import csv
+import io
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
+from .encoding_detect import DEFAULT_ENCODING_MODE, DEFAULT_SAMPLE_SIZE, detect_encoding, detect_stream_encoding
+
+# ストリーム読み込みの既定チャンクサイズと、エンコーディング判定に使う先頭サンプルサイズ
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+SNIFF_SIZE = DEFAULT_SAMPLE_SIZE
+
+
+def decode_csv_bytes(data: bytes, mode: str = DEFAULT_ENCODING_MODE) -> Tuple[str, str]:
+    """
+    バイト列をテキストに変換する
+
+    エンコーディングは先頭サンプルで判定し、全体のデコードは1回のみ行う
+    （判定後の不正バイトは置換文字として扱う）。
+
+    Returns:
+        (テキスト, 使用エンコーディング表示名)
+    """
+    detection = detect_encoding(data, mode, SNIFF_SIZE)
+    return data.decode(detection.codec, errors='replace'), detection.label
+
+
+def sniff_stream_encoding(f, mode: str = DEFAULT_ENCODING_MODE) -> Tuple[str, str]:
+    """
+    ファイル先頭のサンプルからストリーム用のコーデックを決定する
+
+    先頭のASCIIのみの部分はどのコーデックでも同じため読み飛ばし、
+    最初の非ASCIIバイトから SNIFF_SIZE バイトで判定する（ファイル全体は読まない）。
+    判定後、ファイル位置は先頭に戻す。
+
+    Returns:
+        (Pythonコーデック名, 使用エンコーディング表示名)
+    """
+    detection = detect_stream_encoding(f, mode, SNIFF_SIZE)
+    return detection.codec, detection.label
+
+
+def parse_csv_text(text: str) -> List[List[str]]:
+    """
+    CSVテキストを行（列のリスト）に分割する
+
+    シングルクォートをクォート文字とし、'' をエスケープとして扱う。
+    Papa Parse の skipEmptyLines: true と同様に空行は除外する。
+    """
+    return list(iter_csv_rows(io.StringIO(text, newline='')))
+
+
+def iter_csv_rows(lines: Iterable[str]) -> Iterator[List[str]]:
+    """行テキストのイテラブルから空行を除いたCSV行を1件ずつ返す"""
+    for row in csv.reader(lines, delimiter=',', quotechar="'", doublequote=True):
+        if row and row != ['']:
+            yield row
+
+
+def read_csv_file(path, mode: str = DEFAULT_ENCODING_MODE) -> Tuple[List[List[str]], str]:
+    """
+    CSVファイルを読み込んで行リストを返す
+
+    Returns:
+        (行リスト, 使用エンコーディング表示名)
+    """
+    data = Path(path).read_bytes()
+    text, used_encoding = decode_csv_bytes(data, mode)
+    return parse_csv_text(text), used_encoding
+
+
+def stream_csv_file(path, mode: str = DEFAULT_ENCODING_MODE,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE, profiler=None) -> Tuple[Iterator[List[str]], str]:
+    """
+    CSVファイルをチャンク単位でデコードしながら1行ずつ返す
+
+    ファイル全体を読み込まないため、メモリ使用量はファイルサイズではなくチャンクサイズで決まる。
+    エンコーディングは先頭サンプルで判定し、以降の不正バイトは置換文字として扱う。
+    profiler（profiling.Profiler）を渡した場合は decode / parse の時間と読み込みバイト数を計測する。
+
+    Returns:
+        (CSV行のイテレータ, 使用エンコーディング表示名)
+    """
+    with open(path, 'rb') as f:
+        codec, used_encoding = sniff_stream_encoding(f, mode)
+
+    def records():
+        with open(path, 'r', encoding=codec, errors='replace', newline='', buffering=chunk_size) as text_stream:
+            yield from iter_csv_rows(text_stream)
+
+    if profiler is not None:
+        return profiler.iterate('parse', iter_csv_rows(_profiled_lines(path, codec, chunk_size, profiler))), used_encoding
+    return records(), used_encoding
+
+
+def _profiled_lines(path, codec: str, chunk_size: int, profiler) -> Iterator[str]:
+    """
+    チャンクごとのデコード時間を計測しながら行テキストを返す（計測時のみ使用）
+
+    行の区切りは open(newline='') と同じ（\n・\r・\r\n、区切り文字は行に含める）。
+    """
+    decoder = codecs.getincrementaldecoder(codec)(errors='replace')
+    pending = ''
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            profiler.enter('decode')
+            text = pending + decoder.decode(data, final=not data)
+            profiler.exit()
+            profiler.count('bytes_read', len(data))
+            if not data:
+                break
+            lines = io.StringIO(text, newline='').readlines()
+            # チャンク末尾の行（\r の直後に \n が続く可能性を含む）は次のチャンクとつなげる
+            pending = lines.pop() if lines and not lines[-1].endswith('\n') else ''
+            yield from lines
+    if text:
+        yield from io.StringIO(text, newline='').readlines()
+
+
+def get_column(row: List[str], column: int) -> str:
+    """1始まりの列番号で値を取得（列が足りない場合は空文字）"""
+    return row[column - 1] if column <= len(row) else ''
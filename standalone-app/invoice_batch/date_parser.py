@@ -0,0 +1,180 @@
+"""
+日付解析（和暦・西暦・YYYYMMDD）
+
+standalone-app/app.js の parseJapaneseDate() / parseYYYYMMDD() と同じ結果を返す。
+生年月日・調剤年月日は同じ月のCSV内で同じ文字列が繰り返し現れるため、
+解析結果を上限付きのLRUキャッシュ（DateParser）に保持してヒット率を記録する。
+"""
+
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Mapping, NamedTuple, Optional, Union
+
+# 生年月日の種類は100年分でも約3.7万のため、全件が収まる大きさにする（最大で十数MB）
+DEFAULT_CACHE_SIZE = 65536
+
+_WESTERN_PATTERN = re.compile(r'^(\d{4})/(\d{1,2})/(\d{1,2})$', re.ASCII)
+_ERA_ALPHA_PATTERN = re.compile(r'^([RH])(\d{1,2})/(\d{1,2})/(\d{1,2})$', re.ASCII)
+_ERA_KANJI_PATTERN = re.compile(r'^(明治|大正|昭和|平成|令和)(\d{1,2})年(\d{1,2})月(\d{1,2})日$', re.ASCII)
+_YYYYMMDD_PATTERN = re.compile(r'^(\d{4})(\d{2})(\d{2})$', re.ASCII)
+_QUOTES_PATTERN = re.compile('[\'"`]')
+
+
+class Era(NamedTuple):
+    """元号（元年 = offset + 1 年）"""
+    name: str      # 漢字表記
+    alpha: str     # アルファベット略号
+    offset: int    # 西暦 = 元号年 + offset
+
+
+# 元号表（明治〜令和）
+ERAS = (
+    Era('明治', 'M', 1867),
+    Era('大正', 'T', 1911),
+    Era('昭和', 'S', 1925),
+    Era('平成', 'H', 1988),
+    Era('令和', 'R', 2018),
+)
+ERA_KANJI_OFFSETS = {era.name: era.offset for era in ERAS}
+# アルファベット形式（R7/2/15）は app.js と同じく令和・平成のみ
+ERA_ALPHA_OFFSETS = {era.alpha: era.offset for era in ERAS if era.alpha in ('R', 'H')}
+
+
+def remove_all_quotes(value) -> str:
+    """すべてのシングルクォート・ダブルクォート・バッククォートを削除"""
+    if not value:
+        return ''
+    return _QUOTES_PATTERN.sub('', str(value))
+
+
+def make_date(year: int, month: int, day: int) -> datetime:
+    """
+    年月日からdatetimeを作成
+
+    JavaScriptの new Date(year, month - 1, day) と同様に、範囲外の月日は繰り上げ・繰り下げる。
+    """
+    year += (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return datetime(year, month, 1) + timedelta(days=day - 1)
+
+
+def _parse_japanese_text(value: str) -> Union[datetime, str]:
+    text = value.strip()
+
+    try:
+        match = _WESTERN_PATTERN.match(text)
+        if match:
+            year, month, day = match.groups()
+            return make_date(int(year), int(month), int(day))
+
+        # 令和（R）・平成（H）形式（例: R7/2/15, H31/4/30）
+        match = _ERA_ALPHA_PATTERN.match(text)
+        if match:
+            era, era_year, month, day = match.groups()
+            return make_date(int(era_year) + ERA_ALPHA_OFFSETS[era], int(month), int(day))
+
+        # 漢字和暦形式（例: 昭和35年5月10日）
+        match = _ERA_KANJI_PATTERN.match(text)
+        if match:
+            era, era_year, month, day = match.groups()
+            return make_date(int(era_year) + ERA_KANJI_OFFSETS[era], int(month), int(day))
+    except (ValueError, OverflowError):
+        # datetimeで表現できない年（0年など）はパース不可として扱う
+        pass
+
+    return text
+
+
+def _parse_yyyymmdd_text(value: str) -> Union[datetime, str]:
+    cleaned = remove_all_quotes(value.strip())
+    match = _YYYYMMDD_PATTERN.match(cleaned)
+    if match:
+        year, month, day = match.groups()
+        try:
+            return make_date(int(year), int(month), int(day))
+        except (ValueError, OverflowError):
+            pass
+    return cleaned
+
+
+class DateParser:
+    """
+    解析結果をキャッシュする日付パーサー
+
+    datetime は変更不可のため、同じ文字列には同じオブジェクトを返す。
+    キャッシュはプロセスごと（プロセスプールのワーカーごと）に持つ。
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._japanese = lru_cache(maxsize=maxsize)(_parse_japanese_text)
+        self._yyyymmdd = lru_cache(maxsize=maxsize)(_parse_yyyymmdd_text)
+        # preload() で登録した解析済みの日付（文字列 → datetime）
+        self._preloaded_japanese: Dict[str, datetime] = {}
+        self._preloaded_yyyymmdd: Dict[str, datetime] = {}
+
+    def parse_japanese_date(self, value) -> Union[datetime, str]:
+        """日本の日付文字列をdatetimeに変換（パースできない場合は元の文字列）"""
+        if not value:
+            return ''
+        if isinstance(value, datetime):
+            return value
+        text = value if isinstance(value, str) else str(value)
+        return self._preloaded_japanese.get(text) or self._japanese(text)
+
+    def parse_yyyymmdd(self, value) -> Union[datetime, str]:
+        """YYYYMMDD形式の日付文字列をdatetimeに変換（パースできない場合はクリーニング済み文字列）"""
+        if not value:
+            return ''
+        if isinstance(value, datetime):
+            return value
+        text = value if isinstance(value, str) else str(value)
+        return self._preloaded_yyyymmdd.get(text) or self._yyyymmdd(text)
+
+    def preload(self, japanese: Optional[Mapping[str, datetime]] = None,
+                yyyymmdd: Optional[Mapping[str, datetime]] = None):
+        """
+        解析済みの日付を登録し、以降は同じ文字列を解析しない（CSV解析結果キャッシュから読み込んだ日付など）
+
+        登録数が maxsize を超える場合は、それまでの登録を消してから登録する。
+        """
+        for preloaded, dates in ((self._preloaded_japanese, japanese), (self._preloaded_yyyymmdd, yyyymmdd)):
+            if not dates:
+                continue
+            if len(preloaded) + len(dates) > self.maxsize:
+                preloaded.clear()
+            preloaded.update(dates)
+
+    def stats(self) -> Dict[str, Dict]:
+        """キャッシュのヒット数・ミス数・件数・ヒット率"""
+        result = {}
+        for name, cached in (('japanese', self._japanese), ('yyyymmdd', self._yyyymmdd)):
+            info = cached.cache_info()
+            calls = info.hits + info.misses
+            result[name] = {
+                'hits': info.hits,
+                'misses': info.misses,
+                'size': info.currsize,
+                'maxsize': info.maxsize,
+                'hit_rate': info.hits / calls if calls else 0.0,
+            }
+        return result
+
+    def clear(self):
+        """キャッシュと統計をクリア"""
+        self._japanese.cache_clear()
+        self._yyyymmdd.cache_clear()
+        self._preloaded_japanese.clear()
+        self._preloaded_yyyymmdd.clear()
+
+
+# パイプライン共通のパーサー
+default_parser = DateParser()
+parse_japanese_date = default_parser.parse_japanese_date
+parse_yyyymmdd = default_parser.parse_yyyymmdd
+
+
+def date_cache_stats() -> Dict[str, Dict]:
+    """パイプライン共通パーサーのキャッシュ統計"""
+    return default_parser.stats()
@@ -0,0 +1,171 @@
+"""
+エンコーディング判定（先頭サンプル + BOM + 不正バイト統計）
+
+ファイル全体を候補コーデックごとにデコードし直すのではなく、
+先頭の限られたバイト数だけで判定し、本体のデコードは1回で済ませる。
+CSV読み込み（csv_reader）と VBAインポートツール（tool/vba_import_gui_v2.py）で共通に使う。
+"""
+
+import codecs
+import re
+from typing import BinaryIO, NamedTuple, Tuple
+
+ENCODING_MODES = ('auto', 'ansi-first', 'utf8-first')
+DEFAULT_ENCODING_MODE = 'ansi-first'
+
+UTF8_BOM = b'\xef\xbb\xbf'
+
+# 判定に使う先頭サンプルサイズ（最初の非ASCIIバイトから数える）
+DEFAULT_SAMPLE_SIZE = 64 * 1024
+
+# 判定の確からしさを最大とみなす非ASCIIバイト数
+EVIDENCE_BYTES = 64
+
+_ASCII_BYTES = bytes(range(0x80))
+_NON_ASCII_PATTERN = re.compile(rb'[\x80-\xff]')
+
+# □（U+25A1）、�（U+FFFD）、連続する?（エンコーディングエラー）
+_GARBLED_PATTERN = re.compile(r'[□�]|(\?{3,})')
+
+# モードごとのデコード試行順序（コーデック, 表示名）
+_MODE_CODECS = {
+    'ansi-first': (('cp932', 'ANSI'), ('utf-8', 'UTF-8 (BOMなし)')),
+    'utf8-first': (('utf-8', 'UTF-8 (BOMなし)'), ('cp932', 'Shift-JIS (フォールバック)')),
+    'auto': (('utf-8', 'UTF-8 (自動検出)'), ('cp932', 'SJIS (自動検出)')),
+}
+BOM_CODEC = ('utf-8-sig', 'UTF-8 (BOM付き)')
+FALLBACK_CODEC = ('cp932', 'Shift-JIS (強制変換)')
+
+
+class EncodingDetection(NamedTuple):
+    """判定結果"""
+    codec: str          # Pythonコーデック名
+    label: str          # 表示名（app.js の usedEncoding と同じ文字列）
+    confidence: float   # 確からしさ（0.0〜1.0）
+    invalid_bytes: int  # 採用コーデックでの不正バイト数（サンプル内）
+
+
+def has_garbled_text(text: str) -> bool:
+    """文字化けチェック（先頭1000文字のみ）"""
+    if not text:
+        return True
+    return _GARBLED_PATTERN.search(text[:1000]) is not None
+
+
+def check_mode(mode: str):
+    if mode not in ENCODING_MODES:
+        raise ValueError(f'不明なエンコーディングモード: {mode}')
+
+
+def _decode_stats(sample: bytes, codec: str, final: bool) -> Tuple[int, bool]:
+    """サンプルをデコードして (不正バイト数, 文字化けの有無) を返す"""
+    text = codecs.getincrementaldecoder(codec)(errors='replace').decode(sample, final)
+    invalid = text.count('�')
+    return invalid, invalid > 0 or has_garbled_text(text)
+
+
+def detect_sample_encoding(sample: bytes, final: bool = True,
+                           mode: str = DEFAULT_ENCODING_MODE) -> EncodingDetection:
+    """
+    先頭サンプルからエンコーディングを判定する
+
+    候補コーデックをモードの順に試し、不正バイト・文字化けの無い最初のコーデックを採用する
+    （app.js の parseCSVFile() と同じ優先順位）。confidence は
+    - BOM付き / ASCIIのみ: 1.0
+    - 採用コーデックのみ正常にデコードできた: 0.75〜0.99（非ASCIIバイトが多いほど高い）
+    - 他の候補も正常にデコードできた（モードの順序で決定）: 0.5〜0.7
+    - どの候補も失敗（強制変換）: 0.5未満（不正バイトが多いほど低い）
+
+    Args:
+        sample: ファイル先頭のバイト列（BOMを含む）
+        final: サンプルがファイル末尾まで含むか（Falseの場合は末尾で途切れたマルチバイト文字を許容）
+    """
+    check_mode(mode)
+
+    if sample.startswith(UTF8_BOM):
+        return EncodingDetection(*BOM_CODEC, 1.0, 0)
+
+    # 先頭のASCIIのみの部分はどのコーデックでも同じため判定に使わない
+    body = sample.lstrip(_ASCII_BYTES)
+    if not body:
+        codec, label = _MODE_CODECS[mode][0]
+        return EncodingDetection(codec, label, 1.0, 0)
+
+    non_ascii = len(body) - len(body.translate(None, _ASCII_BYTES))
+    evidence = min(1.0, non_ascii / EVIDENCE_BYTES)
+
+    stats = [(codec, label) + _decode_stats(body, codec, final) for codec, label in _MODE_CODECS[mode]]
+    for i, (codec, label, invalid, garbled) in enumerate(stats):
+        if garbled:
+            continue
+        ambiguous = any(not other[3] for other in stats[i + 1:])
+        confidence = 0.5 + 0.2 * evidence if ambiguous else 0.75 + 0.24 * evidence
+        return EncodingDetection(codec, label, round(confidence, 3), 0)
+
+    codec, label = FALLBACK_CODEC
+    invalid = next(s[2] for s in stats if s[0] == codec)
+    confidence = 0.5 * max(0.0, 1.0 - invalid / non_ascii)
+    return EncodingDetection(codec, label, round(confidence, 3), invalid)
+
+
+def read_sample(f: BinaryIO, sample_size: int = DEFAULT_SAMPLE_SIZE) -> Tuple[bytes, bool]:
+    """
+    ファイル先頭から判定用サンプルを読む（読み込み後、ファイル位置は先頭に戻す）
+
+    先頭のASCIIのみの部分は読み飛ばし、最初の非ASCIIバイトから sample_size バイトを返す。
+    BOM付きの場合はBOMのみを返す。
+
+    Returns:
+        (サンプル, ファイル末尾まで読んだか)
+    """
+    head = f.read(len(UTF8_BOM))
+    if head == UTF8_BOM:
+        f.seek(0)
+        return head, False
+
+    sample = b''
+    pending = head
+    while True:
+        if not sample:
+            sample = pending.lstrip(_ASCII_BYTES)
+        else:
+            sample += pending
+        if len(sample) >= sample_size:
+            sample = sample[:sample_size]
+            final = False
+            break
+        pending = f.read(sample_size)
+        if not pending:
+            final = True
+            break
+    f.seek(0)
+    return sample, final
+
+
+def detect_stream_encoding(f: BinaryIO, mode: str = DEFAULT_ENCODING_MODE,
+                           sample_size: int = DEFAULT_SAMPLE_SIZE) -> EncodingDetection:
+    """バイナリファイルの先頭サンプルからエンコーディングを判定（ファイル全体は読まない）"""
+    check_mode(mode)
+    sample, final = read_sample(f, sample_size)
+    return detect_sample_encoding(sample, final, mode)
+
+
+def detect_file_encoding(path, mode: str = DEFAULT_ENCODING_MODE,
+                         sample_size: int = DEFAULT_SAMPLE_SIZE) -> EncodingDetection:
+    """ファイルパスから判定"""
+    with open(path, 'rb') as f:
+        return detect_stream_encoding(f, mode, sample_size)
+
+
+def detect_encoding(data: bytes, mode: str = DEFAULT_ENCODING_MODE,
+                    sample_size: int = DEFAULT_SAMPLE_SIZE) -> EncodingDetection:
+    """メモリ上のバイト列の先頭サンプルから判定"""
+    check_mode(mode)
+    if data.startswith(UTF8_BOM):
+        return detect_sample_encoding(UTF8_BOM, False, mode)
+    match = _NON_ASCII_PATTERN.search(data)
+    if match is None:
+        return detect_sample_encoding(b'', True, mode)
+    start = match.start()
+    end = start + sample_size
+    return detect_sample_encoding(data[start:end], end >= len(data), mode)
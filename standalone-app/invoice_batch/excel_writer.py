@@ -0,0 +1,159 @@
+"""
+請求書Excel生成（テンプレート使用）
+
+standalone-app/app.js の generateExcel() / generateFileName() と同じ内容を
+openpyxlで書き込む。データは11行目から、テーブル範囲は A10:M(最終行)。
+"""
+
+import io
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import openpyxl
+from openpyxl.cell.rich_text import CellRichText, TextBlock
+from openpyxl.cell.text import InlineFont
+from openpyxl.worksheet.table import Table, TableStyleInfo
+
+from .date_parser import parse_japanese_date, parse_yyyymmdd, remove_all_quotes
+from .grouping import detect_kohi_flags
+from .records import PatientRecord
+
+DEFAULT_TEMPLATE_PATH = Path(__file__).resolve().parent.parent / 'tyouzai_excel_v2_clean.xlsx'
+
+TABLE_NAME = '調剤請求'
+TABLE_HEADER_ROW = 10
+TABLE_DATA_START_ROW = 11
+TABLE_STYLE = 'TableStyleMedium6'
+
+PHARMACY_CODE_FORMAT = '00000000'  # 8桁固定
+MEDICAL_CODE_FORMAT = '00000000'   # 8桁固定
+RECIPIENT_FORMAT = '0000000'       # 7桁固定
+DATE_FORMAT = '[$-411]gee.mm.dd;@'  # 和暦ドット区切り
+
+# 列番号 → 数値書式
+COLUMN_FORMATS = {
+    3: PHARMACY_CODE_FORMAT,
+    5: MEDICAL_CODE_FORMAT,
+    6: RECIPIENT_FORMAT,
+    9: DATE_FORMAT,
+    10: DATE_FORMAT,
+}
+
+CHECK_MARK = '◯'
+
+_JS_INT_PATTERN = re.compile(r'^\s*([+-]?\d+)', re.ASCII)
+
+
+def load_template_bytes(template_path=None) -> bytes:
+    """テンプレートファイル読み込み"""
+    return Path(template_path or DEFAULT_TEMPLATE_PATH).read_bytes()
+
+
+def js_parse_int(value) -> int:
+    """JavaScriptの parseInt(value, 10) || 0 と同じ変換"""
+    match = _JS_INT_PATTERN.match(str(value or ''))
+    return int(match.group(1)) if match else 0
+
+
+def format_medical_code(code) -> str:
+    """医療機関コードをフォーマット（先頭01を削除し下8桁を取得）"""
+    if not code:
+        return ''
+
+    cleaned = remove_all_quotes(str(code).strip())
+    while cleaned.startswith('01') and len(cleaned) > 2:
+        cleaned = cleaned[2:]
+
+    if len(cleaned) > 8:
+        cleaned = cleaned[-8:]
+    return cleaned
+
+
+def build_row_values(index: int, group: Dict, pharmacy_name: str, medical_code: str) -> List:
+    """グループ化済み患者データ1件分のA〜M列の値を作成"""
+    # 代表データ（最初のレコード）
+    patient = group['records'][0]
+    kohi_flags = detect_kohi_flags(patient.public_codes)
+    # 主保険判定（「公費単独」でなければ主保険あり）
+    has_main_insurance = patient.insurance_type != '公費単独'
+
+    return [
+        index + 1,                                                       # A: 番号
+        pharmacy_name or '',                                             # B: 薬局名
+        js_parse_int(format_medical_code(medical_code)),                 # C: コード1
+        remove_all_quotes(patient.medical_institution),              # D: 診療医療機関名
+        js_parse_int(format_medical_code(patient.medical_code)),     # E: コード2
+        js_parse_int(remove_all_quotes(patient.recipient_number)),   # F: 受給者番号
+        remove_all_quotes(patient.patient_name),                     # G: 氏名
+        remove_all_quotes(patient.patient_kana),                     # H: 氏名カナ
+        parse_japanese_date(patient.birth_date),                     # I: 生年月日
+        group['first_treatment_date'] or parse_yyyymmdd(group['treatment_dates'][0]),  # J: 調剤年月日
+        CHECK_MARK if has_main_insurance else '',                        # K: 社保
+        CHECK_MARK if kohi_flags['has_jiritsu_shien'] else '',           # L: 自立支援
+        CHECK_MARK if kohi_flags['has_jusho'] else '',                   # M: 難病
+    ]
+
+
+def code_header(color: str, digit: str) -> CellRichText:
+    """テーブルヘッダーのコード列（数字部分に色付け）"""
+    return CellRichText('コード', TextBlock(InlineFont(sz=16, color=color, rFont='メイリオ'), digit))
+
+
+def generate_excel(grouped_patients: List[Dict], template_bytes: bytes,
+                   pharmacy_name: str = '', medical_code: str = '') -> bytes:
+    """
+    グループ化済み患者データから請求書Excelを生成
+
+    Returns:
+        xlsxファイルのバイト列
+    """
+    workbook = openpyxl.load_workbook(io.BytesIO(template_bytes))
+    worksheet = workbook.worksheets[0]
+
+    for index, group in enumerate(grouped_patients):
+        row_num = TABLE_DATA_START_ROW + index
+        for col, value in enumerate(build_row_values(index, group, pharmacy_name, medical_code), start=1):
+            cell = worksheet.cell(row=row_num, column=col, value=value)
+            if col in COLUMN_FORMATS:
+                cell.number_format = COLUMN_FORMATS[col]
+
+    # データが1件以上ある場合のみテーブル範囲を設定
+    if grouped_patients:
+        last_row = TABLE_DATA_START_ROW + len(grouped_patients) - 1
+        apply_table(worksheet, f'A{TABLE_HEADER_ROW}:M{last_row}')
+
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def apply_table(worksheet, ref: str):
+    """テーブル「調剤請求」の範囲を設定（テンプレートに無ければ作成）"""
+    table = worksheet.tables.get(TABLE_NAME)
+    if table is None:
+        table = Table(displayName=TABLE_NAME, ref=ref,
+                      tableStyleInfo=TableStyleInfo(name=TABLE_STYLE, showRowStripes=True))
+        worksheet.add_table(table)
+    else:
+        table.ref = ref
+        if table.autoFilter is not None:
+            table.autoFilter.ref = ref
+
+    worksheet.cell(row=TABLE_HEADER_ROW, column=3).value = code_header('FF002060', '1')
+    worksheet.cell(row=TABLE_HEADER_ROW, column=5).value = code_header('FFC00000', '2')
+
+
+def generate_file_name(patients: List[PatientRecord], batch_number: int, pharmacy_name: str = '', now=None) -> str:
+    """ファイル名生成（app.js の generateFileName() と同じ形式）"""
+    treatment_date = patients[0].treatment_date if patients else ''
+
+    if treatment_date:
+        year_month = treatment_date[:7].replace('/', '', 1).replace('-', '', 1)
+    else:
+        now = now or datetime.now()
+        year_month = f'{now.year}{now.month:02d}'
+
+    batch_label = '1回目' if batch_number == 1 else '2回目'
+    return f"調剤券_旭川市_{year_month}_{pharmacy_name or '薬局'}_{batch_label}.xlsx"
@@ -0,0 +1,77 @@
+"""
+患者の識別ハッシュ（請求の重複・月遅れ判定用）
+
+app.js の simpleHash()（患者氏名のみ、31倍加算の32bit）は店舗・月をまたいで件数が増えると
+別の患者同士で同じ値になり、別の患者が請求済みと判定されることがある。
+ここでは正規化した 氏名・生年月日・受給者番号 を blake2b（64bit）でハッシュし、
+処理済みキー（年月_患者ハッシュ_医療機関コード）の患者ハッシュ部分に使う。
+
+- 正規化: NFKC（半角カナ→全角、全角英数字→半角）+ 空白の削除、生年月日は YYYYMMDD に統一
+- 値は Python・ブラウザのバージョンやプロセスに依存しない（hash() のようなランダム化なし）
+- 旧形式のキー（simpleHash、16進8桁以下）と桁数で区別できる（16進16桁）
+
+列単位の計算は vector_filter.fingerprint_frame() を使う（同じ値を返す）。
+"""
+
+import hashlib
+import unicodedata
+from datetime import datetime
+
+from .date_parser import parse_japanese_date
+
+# 処理済みキーの形式
+LEGACY_KEY_FORMAT = 'legacy'            # 年月_simpleHash(氏名)_医療機関コード（ブラウザ版と共通）
+FINGERPRINT_KEY_FORMAT = 'fingerprint'  # 年月_識別ハッシュ_医療機関コード（旧形式のキーも照合）
+KEY_FORMATS = (LEGACY_KEY_FORMAT, FINGERPRINT_KEY_FORMAT)
+
+FINGERPRINT_BYTES = 8
+# ハッシュの用途・形式の版（変更すると全キーが変わる）
+FINGERPRINT_PERSON = b'claim-fp-v1'
+FIELD_SEPARATOR = '\x1f'
+
+
+def normalize_text(value) -> str:
+    """NFKC正規化 + 空白（全角スペースを含む）の削除"""
+    if not value:
+        return ''
+    text = str(value)
+    if text.isascii():
+        # ASCII（受給者番号など）はNFKCで変わらない
+        return ''.join(text.split())
+    return ''.join(unicodedata.normalize('NFKC', text).split())
+
+
+def normalize_birth_date(value) -> str:
+    """生年月日を YYYYMMDD に統一（解析できない場合は正規化した文字列）"""
+    text = normalize_text(value)
+    parsed = parse_japanese_date(text)
+    if isinstance(parsed, datetime):
+        return parsed.strftime('%Y%m%d')
+    return text
+
+
+def fingerprint_text(text: str) -> int:
+    """正規化済みの識別文字列のハッシュ（64bit 符号なし整数）"""
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=FINGERPRINT_BYTES,
+                             person=FINGERPRINT_PERSON).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def patient_fingerprint(patient_name, birth_date, recipient_number) -> int:
+    """氏名・生年月日・受給者番号の識別ハッシュ（64bit 符号なし整数）"""
+    return fingerprint_text(FIELD_SEPARATOR.join((
+        normalize_text(patient_name),
+        normalize_birth_date(birth_date),
+        normalize_text(recipient_number),
+    )))
+
+
+def format_fingerprint(value: int) -> str:
+    """処理済みキーの患者ハッシュ部分（16進16桁）"""
+    return format(value, '016x')
+
+
+def is_fingerprint_key(key: str) -> bool:
+    """識別ハッシュ形式の処理済みキーか（旧形式の simpleHash は16進8桁以下）"""
+    parts = key.split('_', 2)
+    return len(parts) == 3 and len(parts[1]) == FINGERPRINT_BYTES * 2
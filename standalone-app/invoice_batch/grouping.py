@@ -0,0 +1,100 @@
+"""
+患者グループ化
+
+standalone-app/app.js の groupPatientsByRecipient() / detectKohiFlags() と同じ結果を返す。
+日付解析（parseJapaneseDate() / parseYYYYMMDD() 相当）は date_parser を使用する。
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+# 日付解析は従来どおり grouping からも import できるよう再エクスポートする
+from .date_parser import (  # noqa: F401
+    ERA_ALPHA_OFFSETS, ERA_KANJI_OFFSETS, make_date, parse_japanese_date, parse_yyyymmdd, remove_all_quotes,
+)
+from .records import PatientRecord
+
+# 調剤年月日がこの件数を超えたグループのみ重複判定用の集合を作る
+# （大半のグループは数件のため、グループごとに集合を作るとメモリ確保・GCの負荷の方が大きい）
+DATE_SET_THRESHOLD = 8
+
+
+def group_patients_by_recipient(patients: Iterable[PatientRecord]) -> List[Dict]:
+    """
+    患者データを受給者番号＋患者名＋年月＋医療機関コードでグループ化
+
+    月を跨ぐ場合は複数行に分割し、新しい月が先になるように並べる。
+    調剤年月日の重複判定は件数の多いグループのみ集合、初回調剤日は追加時の最小値で管理し、
+    並べ替えは整数の年月キーごとの一覧を連結するため、件数に対してほぼ線形
+    （施設調剤などで1人の受診回数が多くても2乗にならない）。
+
+    Returns:
+        [{'records', 'treatment_dates', 'year_month', 'first_treatment_date'}, ...]
+    """
+    groups = {}
+    # 調剤年月日が DATE_SET_THRESHOLD 件を超えたグループの重複判定用集合
+    date_sets = {}
+    # 年月キー（年 * 12 + 月 - 1）→ グループ一覧（出現順）
+    months = {}
+
+    for patient in patients:
+        # 受給者番号は未割当の場合があるためスキップ対象外
+        if not patient.patient_name:
+            continue
+
+        treatment_date = patient.treatment_date
+        if not treatment_date:
+            continue
+
+        parsed = parse_yyyymmdd(treatment_date)
+        if not isinstance(parsed, datetime):
+            continue
+
+        month_key = parsed.year * 12 + parsed.month - 1
+        key = (patient.recipient_number, patient.patient_name, month_key, patient.medical_code)
+
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                'records': [],
+                'treatment_dates': [],
+                'year_month': f'{parsed.year}-{parsed.month:02d}',
+                'first_treatment_date': None,
+            }
+            months.setdefault(month_key, []).append(group)
+
+        group['records'].append(patient)
+        dates = group['treatment_dates']
+        if len(dates) < DATE_SET_THRESHOLD:
+            is_new_date = treatment_date not in dates
+        else:
+            seen_dates = date_sets.get(key)
+            if seen_dates is None:
+                seen_dates = date_sets[key] = set(dates)
+            is_new_date = treatment_date not in seen_dates
+            if is_new_date:
+                seen_dates.add(treatment_date)
+
+        if is_new_date:
+            dates.append(treatment_date)
+            first = group['first_treatment_date']
+            if first is None or parsed < first:
+                group['first_treatment_date'] = parsed
+
+    # 今月分が先、前月分が後（年月の降順、同一年月は出現順）
+    result = []
+    for month_key in sorted(months, reverse=True):
+        result.extend(months[month_key])
+    return result
+
+
+def detect_kohi_flags(public_codes: Iterable[str]) -> Dict[str, bool]:
+    """公費コードから自立支援（21/15/16）・重障（54）フラグを判定"""
+    flags = {'has_jiritsu_shien': False, 'has_jusho': False}
+    for code in public_codes or ():
+        cleaned = str(code).strip()
+        if cleaned in ('21', '15', '16'):
+            flags['has_jiritsu_shien'] = True
+        if cleaned == '54':
+            flags['has_jusho'] = True
+    return flags
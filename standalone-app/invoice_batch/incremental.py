@@ -0,0 +1,303 @@
+"""
+増分処理（日次のCSV追記分のみ処理し、月末の請求書は保存済みの状態から作成）
+
+CSVごとに SQLite の状態ファイルを持ち、次の内容を保存する。
+- 読み込み済みのバイト位置と、その直前・ファイル先頭の内容のハッシュ
+  （ファイルが追記されただけなら、前回の位置から続きを読む）
+- 読み込み済みデータ行のハッシュごとの行数
+  （ファイルが作り直された場合は全行を解析し、増えた行のみフィルタ・無くなった行の患者は削除する）
+- 旭川市の対象患者（読み込み順、元の行のハッシュ付き）
+
+ファイルは読み込み済みの位置の前後のみ読み、追記分は前回の位置からストリームで読む。
+
+グループ化・Excel書き込みは対象患者のみを使うため、月末はCSV全体を再処理しなくてよい。
+"""
+
+import hashlib
+import io
+import os
+import sqlite3
+from collections import Counter
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional
+
+from .csv_reader import DEFAULT_CHUNK_SIZE, get_column, iter_csv_rows, sniff_stream_encoding
+from .encoding_detect import DEFAULT_ENCODING_MODE
+from .fingerprint import LEGACY_KEY_FORMAT
+from .patient_filter import create_patient_data, is_asahikawa_patient, is_data_row, is_processed
+from .records import PIPELINE_COLUMNS, PatientRecord, StringPool
+
+# 追記判定に使うファイル先頭・読み込み済み位置の直前のバイト数
+FINGERPRINT_SIZE = 64 * 1024
+
+# 状態ファイルの形式（古い形式の状態ファイルは作り直し、次回はCSV全体を解析する）
+SCHEMA_VERSION = 2
+
+_PATIENT_FIELDS = (
+    'recipient_number', 'patient_name', 'patient_kana', 'birth_date', 'treatment_date',
+    'medical_institution', 'medical_code', 'insurance_type', 'address', 'insurer_number',
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS source (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    offset INTEGER NOT NULL,
+    head_sha256 TEXT NOT NULL,
+    tail_sha256 TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    encoding_label TEXT NOT NULL,
+    total INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS row_counts (
+    row_hash BLOB PRIMARY KEY,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS patients (
+    seq INTEGER PRIMARY KEY,
+    recipient_number TEXT NOT NULL,
+    patient_name TEXT NOT NULL,
+    patient_kana TEXT NOT NULL,
+    birth_date TEXT NOT NULL,
+    treatment_date TEXT NOT NULL,
+    medical_institution TEXT NOT NULL,
+    medical_code TEXT NOT NULL,
+    insurance_type TEXT NOT NULL,
+    address TEXT NOT NULL,
+    insurer_number TEXT NOT NULL,
+    public_code1 TEXT NOT NULL,
+    public_code2 TEXT NOT NULL,
+    public_code3 TEXT NOT NULL,
+    row_hash BLOB NOT NULL
+);
+"""
+
+_PATIENT_COLUMNS = f"{', '.join(_PATIENT_FIELDS)}, public_code1, public_code2, public_code3"
+
+
+def row_hash(row: List[str]) -> bytes:
+    """
+    データ行のハッシュ（パイプラインが参照する列のみ）
+
+    作り直されたCSVでは連番などが振り直されるため、参照する列が同じ行は同じ行として扱う
+    （同じハッシュの行が複数ある場合は行数で照合する）。
+    """
+    text = '\x1f'.join(get_column(row, column) for column in PIPELINE_COLUMNS)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _read_range(f: BinaryIO, start: int, end: int) -> bytes:
+    f.seek(start)
+    return f.read(end - start)
+
+
+def _target_values(row: List[str], pool: StringPool) -> Optional[tuple]:
+    """旭川市の対象患者の場合は保存する列の値（対象外は None）"""
+    patient = create_patient_data(row, pool)
+    if not is_asahikawa_patient(patient):
+        return None
+    return tuple(getattr(patient, name) for name in _PATIENT_FIELDS) + tuple(patient.public_codes)
+
+
+class MonthState:
+    """
+    CSV1件分の増分処理の状態（SQLite）
+
+    請求月ごとに別の状態フォルダを使う（月が変わったら新しいフォルダを指定する）。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path))
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            if self._conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                self._conn.executescript(
+                    'DROP TABLE IF EXISTS source; DROP TABLE IF EXISTS consumed_rows; '
+                    'DROP TABLE IF EXISTS row_counts; DROP TABLE IF EXISTS patients;')
+                self._conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def source(self) -> Optional[Dict]:
+        """前回までの読み込み位置（未処理の場合は None）"""
+        row = self.conn.execute(
+            'SELECT offset, head_sha256, tail_sha256, codec, encoding_label, total FROM source').fetchone()
+        if row is None:
+            return None
+        return dict(zip(('offset', 'head_sha256', 'tail_sha256', 'codec', 'encoding_label', 'total'), row))
+
+    def update(self, csv_path, encoding_mode: str = DEFAULT_ENCODING_MODE) -> Dict:
+        """
+        CSVの未処理分を読み込んで状態を更新
+
+        Returns:
+            {'mode': 'append' | 'rescan' | 'unchanged', 'new_rows', 'new_targets', 'removed_rows',
+             'total', 'encoding'}
+        """
+        source = self.source()
+        with open(csv_path, 'rb', buffering=DEFAULT_CHUNK_SIZE) as f:
+            size = os.fstat(f.fileno()).st_size
+            if source is not None and self._is_appended(f, size, source):
+                # 追記のみ: 前回の位置から続きを読む
+                start = source['offset']
+                codec, label = source['codec'], source['encoding_label']
+                if start == size:
+                    return self._result('unchanged', 0, 0, 0, source['total'], label)
+                mode = 'append'
+            else:
+                # 初回・作り直されたCSV: 全行を解析し、行のハッシュごとの行数で保存済みの患者と照合
+                start = 0
+                codec, label = sniff_stream_encoding(f, encoding_mode)
+                mode = 'rescan'
+
+            f.seek(start)
+            text_stream = io.TextIOWrapper(f, encoding=codec, errors='replace', newline='')
+            rows = iter_csv_rows(text_stream)
+            if mode == 'append':
+                new_rows, new_targets = self._append(rows)
+                removed_rows = 0
+                total = source['total'] + new_rows
+            else:
+                new_rows, new_targets, removed_rows, total = self._rescan(rows)
+            text_stream.detach()
+            offset = f.tell()
+            head = _read_range(f, 0, min(FINGERPRINT_SIZE, offset))
+            tail = _read_range(f, max(0, offset - FINGERPRINT_SIZE), offset)
+
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO source (id, offset, head_sha256, tail_sha256, codec, encoding_label, total) '
+                'VALUES (1, ?, ?, ?, ?, ?, ?)',
+                (offset, _sha256(head), _sha256(tail), codec, label, total),
+            )
+        return self._result(mode, new_rows, new_targets, removed_rows, total, label)
+
+    @staticmethod
+    def _is_appended(f: BinaryIO, size: int, source: Dict) -> bool:
+        """前回読み込んだ内容の後ろに行が追加されただけか（最終行が改行で終わっていた場合のみ）"""
+        offset = source['offset']
+        if size < offset or (offset and _read_range(f, offset - 1, offset) != b'\n'):
+            return False
+        return (_sha256(_read_range(f, 0, min(FINGERPRINT_SIZE, offset))) == source['head_sha256']
+                and _sha256(_read_range(f, max(0, offset - FINGERPRINT_SIZE), offset)) == source['tail_sha256'])
+
+    @staticmethod
+    def _result(mode: str, new_rows: int, new_targets: int, removed_rows: int, total: int, encoding: str) -> Dict:
+        return {'mode': mode, 'new_rows': new_rows, 'new_targets': new_targets, 'removed_rows': removed_rows,
+                'total': total, 'encoding': encoding}
+
+    def _append(self, rows: Iterable[List[str]]):
+        """追記されたデータ行をフィルタし、旭川市の対象患者を追加"""
+        pool = StringPool()
+        counts = Counter()
+        targets = []
+        for row in rows:
+            if not is_data_row(row):
+                continue
+            digest = row_hash(row)
+            counts[digest] += 1
+            values = _target_values(row, pool)
+            if values is not None:
+                targets.append(values + (digest,))
+
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO row_counts (row_hash, count) VALUES (?, ?) '
+                'ON CONFLICT (row_hash) DO UPDATE SET count = count + excluded.count',
+                counts.items(),
+            )
+            self._insert_patients(targets)
+        return sum(counts.values()), len(targets)
+
+    def _rescan(self, rows: Iterable[List[str]]):
+        """
+        作り直されたCSVの全行と保存済みの状態を照合
+
+        保存済みの行数より多いハッシュの行のみフィルタし（患者データは保存済みのものを再利用）、
+        CSVから無くなった行の患者は削除する。患者はCSVの出現順に保存し直す。
+        """
+        stored = dict(self.conn.execute('SELECT row_hash, count FROM row_counts'))
+        known = {}
+        for values in self.conn.execute(f'SELECT {_PATIENT_COLUMNS}, row_hash FROM patients'):
+            known.setdefault(values[-1], values[:-1])
+
+        pool = StringPool()
+        counts = Counter()
+        targets = []
+        new_rows = new_targets = 0
+        for row in rows:
+            if not is_data_row(row):
+                continue
+            digest = row_hash(row)
+            counts[digest] += 1
+            if counts[digest] > stored.get(digest, 0):
+                new_rows += 1
+                if digest not in known:
+                    known[digest] = _target_values(row, pool)
+                if known[digest] is not None:
+                    new_targets += 1
+            values = known.get(digest)
+            if values is not None:
+                targets.append(values + (digest,))
+        removed_rows = sum(max(0, count - counts[digest]) for digest, count in stored.items())
+
+        with self.conn:
+            self.conn.execute('DELETE FROM row_counts')
+            self.conn.execute('DELETE FROM patients')
+            self.conn.executemany('INSERT INTO row_counts (row_hash, count) VALUES (?, ?)', counts.items())
+            self._insert_patients(targets)
+        return new_rows, new_targets, removed_rows, sum(counts.values())
+
+    def _insert_patients(self, targets: List[tuple]):
+        self.conn.executemany(
+            f"INSERT INTO patients ({_PATIENT_COLUMNS}, row_hash) "
+            f"VALUES ({', '.join('?' * (len(_PATIENT_FIELDS) + 4))})",
+            targets,
+        )
+
+    def patients(self, batch_number: int = 1, processed_keys=None, key_format: str = LEGACY_KEY_FORMAT) -> Dict:
+        """
+        保存済みの対象患者（読み込み順）
+
+        filter_patients() と同じく、2回目請求の場合は処理済みキーで重複フラグを設定する。
+
+        Returns:
+            {'total', 'target', 'duplicate'}
+        """
+        processed_keys = processed_keys or set()
+        pool = StringPool()
+        target = []
+        duplicate = []
+        cursor = self.conn.execute(f'SELECT {_PATIENT_COLUMNS} FROM patients ORDER BY seq')
+        for values in cursor:
+            patient = PatientRecord(*(pool(v) for v in values[:8]), pool(values[10:13]), pool(values[8]),
+                                    pool(values[9]))
+            patient.is_asahikawa = True
+            if batch_number == 2 and is_processed(patient, processed_keys, key_format):
+                patient.is_duplicate = True
+                patient.is_included = False
+                duplicate.append(patient)
+            target.append(patient)
+
+        source = self.source()
+        return {'total': source['total'] if source else 0, 'target': target, 'duplicate': duplicate}
@@ -0,0 +1,398 @@
+"""
+受付フォルダの常駐処理（asyncio）
+
+各店舗が共有フォルダにHR形式CSVを書き出すと、書き込みの完了を待ってから
+CSV解析 → 旭川市フィルタ → グループ化 → Excel生成（batch.process_csv_file）を
+プロセスプールで実行し、請求書と処理状況（manifest.json）を出力する。
+
+- 書き込み完了の判定: サイズ・更新日時が settle 秒間変わらず、読み込み用に開けること
+- 受付済みのCSVは <受付フォルダ>/.processing に移し、終了後は processed / failed に移す
+  （再起動時は .processing に残ったCSVから再開する）
+- 同時に処理するCSVはワーカー数まで、待ち行列は queue_size 件まで。
+  待ち行列が一杯の間は新しいCSVを受け付けない（CSVは受付フォルダに残る）
+- 1件が遅い・壊れている場合も他のCSVの処理は止めない
+  （例外・タイムアウト・ワーカープロセスの異常終了はそのCSVのみ失敗として記録する）
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .batch import (_init_worker, load_processed_keys, load_store_settings, process_csv_file,
+                    save_processed_keys)
+from .encoding_detect import DEFAULT_ENCODING_MODE, ENCODING_MODES
+from .excel_writer import load_template_bytes
+from .fingerprint import KEY_FORMATS, LEGACY_KEY_FORMAT
+from .processed_keys import ProcessedKeyStore
+
+PROCESSING_DIR = '.processing'
+PROCESSED_DIR = 'processed'
+FAILED_DIR = 'failed'
+MANIFEST_FILE = 'manifest.json'
+
+DEFAULT_SETTLE_SECONDS = 5.0
+DEFAULT_POLL_SECONDS = 1.0
+DEFAULT_TIMEOUT_SECONDS = 600.0
+
+# 処理状況
+QUEUED = 'queued'
+PROCESSING = 'processing'
+DONE = 'done'
+FAILED = 'failed'
+TIMEOUT = 'timeout'
+
+
+def is_candidate(path: Path) -> bool:
+    """受付対象のCSVか（書き込み途中の一時ファイル・隠しファイルは除く）"""
+    name = path.name
+    return path.suffix.lower() == '.csv' and not name.startswith(('.', '~$'))
+
+
+def can_open(path: Path) -> bool:
+    """読み込み用に開けるか（Windowsでは書き込み中のファイルは開けない）"""
+    try:
+        with open(path, 'rb'):
+            return True
+    except OSError:
+        return False
+
+
+class DropFolderWatcher:
+    """
+    受付フォルダの監視（ポーリング）
+
+    scan() はサイズ・更新日時が settle_seconds 以上変わっていないCSVを返す。
+    同じファイルは受付フォルダから移動されるまで1回だけ返す。
+    """
+
+    def __init__(self, drop_dir, settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.drop_dir = Path(drop_dir)
+        self.settle_seconds = settle_seconds
+        self.clock = clock
+        # ファイル名 → ((サイズ, 更新日時), 最後に変化を確認した時刻)
+        self.pending: Dict[str, tuple] = {}
+        self.reported = set()
+
+    def scan(self) -> List[Path]:
+        now = self.clock()
+        ready = []
+        seen = set()
+        with os.scandir(self.drop_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not is_candidate(Path(entry.name)):
+                    continue
+                seen.add(entry.name)
+                if entry.name in self.reported:
+                    continue
+                stat = entry.stat()
+                signature = (stat.st_size, stat.st_mtime_ns)
+                previous = self.pending.get(entry.name)
+                if previous is None or previous[0] != signature:
+                    self.pending[entry.name] = (signature, now)
+                    if self.settle_seconds > 0:
+                        continue
+                elif now - previous[1] < self.settle_seconds:
+                    continue
+                path = Path(entry.path)
+                if not can_open(path):
+                    continue
+                del self.pending[entry.name]
+                self.reported.add(entry.name)
+                ready.append(path)
+        # 移動・削除されたファイルは忘れる（同じ名前で再度置かれた場合は新しいCSVとして受け付ける）
+        for name in list(self.pending):
+            if name not in seen:
+                del self.pending[name]
+        self.reported &= seen
+        return sorted(ready)
+
+
+class IngestDaemon:
+    """受付フォルダのCSVをプロセスプールで処理し、処理状況を manifest.json に記録する"""
+
+    def __init__(self, drop_dir, output_dir, batch_number: int = 1, stores: Optional[Dict[str, Dict]] = None,
+                 default_pharmacy_name: str = '', default_medical_code: str = '', processed_keys_path=None,
+                 encoding_mode: str = DEFAULT_ENCODING_MODE, key_format: str = LEGACY_KEY_FORMAT,
+                 template_path=None, workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 settle_seconds: float = DEFAULT_SETTLE_SECONDS, poll_seconds: float = DEFAULT_POLL_SECONDS,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT_SECONDS, pdf: bool = False, font_path=None,
+                 manifest_path=None, processor: Callable = process_csv_file, log: Callable = print):
+        self.drop_dir = Path(drop_dir)
+        self.output_dir = Path(output_dir)
+        self.batch_number = batch_number
+        self.stores = stores or {}
+        self.default_pharmacy_name = default_pharmacy_name
+        self.default_medical_code = default_medical_code
+        self.processed_keys_path = processed_keys_path
+        self.processed_keys = load_processed_keys(processed_keys_path)
+        self.encoding_mode = encoding_mode
+        self.key_format = key_format
+        self.template_bytes = load_template_bytes(template_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or self.workers * 2
+        self.poll_seconds = poll_seconds
+        self.timeout = timeout
+        self.pdf = pdf
+        self.font_path = font_path
+        self.manifest_path = Path(manifest_path) if manifest_path else self.output_dir / MANIFEST_FILE
+        self.processor = processor
+        self.log = log
+        self.watcher = DropFolderWatcher(self.drop_dir, settle_seconds)
+        self.jobs: List[Dict] = []
+        self._executor = None
+        self._active = 0
+
+    # ========================================
+    # 処理状況（manifest.json）
+    # ========================================
+    def _counts(self) -> Dict[str, int]:
+        counts = {status: 0 for status in (QUEUED, PROCESSING, DONE, FAILED, TIMEOUT)}
+        for job in self.jobs:
+            counts[job['status']] += 1
+        return counts
+
+    def write_manifest(self):
+        """処理状況を書き出す（一時ファイルに書いてから置き換え、読み手が途中の内容を読まない）"""
+        manifest = {
+            'updated': datetime.now().isoformat(timespec='seconds'),
+            'drop_dir': str(self.drop_dir),
+            'batch': self.batch_number,
+            'counts': self._counts(),
+            'files': self.jobs,
+        }
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _update(self, job: Dict, **values):
+        job.update(values)
+        self.write_manifest()
+
+    # ========================================
+    # 受付・移動
+    # ========================================
+    def _claim(self, path: Path) -> Dict:
+        """受付フォルダから .processing に移して処理待ちにする"""
+        processing = self.drop_dir / PROCESSING_DIR / path.name
+        processing.parent.mkdir(exist_ok=True)
+        os.replace(path, processing)
+        job = {
+            'csv': path.name,
+            'status': QUEUED,
+            'bytes': processing.stat().st_size,
+            'queued_at': datetime.now().isoformat(timespec='seconds'),
+            'path': str(processing),
+        }
+        self.jobs.append(job)
+        self.write_manifest()
+        return job
+
+    def _archive(self, job: Dict, folder: str):
+        """処理後のCSVを processed / failed に移す（同じ名前が再度置かれても上書きしない）"""
+        source = Path(job['path'])
+        target = self.drop_dir / folder / f"{datetime.now():%Y%m%d-%H%M%S}_{source.name}"
+        target.parent.mkdir(exist_ok=True)
+        if source.exists():
+            shutil.move(str(source), str(target))
+        job['path'] = str(target)
+
+    def _recover(self) -> List[Path]:
+        """前回の実行で .processing に残ったCSV（処理途中で終了したもの）"""
+        processing_dir = self.drop_dir / PROCESSING_DIR
+        if not processing_dir.is_dir():
+            return []
+        return sorted(p for p in processing_dir.iterdir() if p.is_file() and is_candidate(p))
+
+    # ========================================
+    # 処理
+    # ========================================
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self.template_bytes,))
+
+    def _submit(self, executor: ProcessPoolExecutor, job: Dict):
+        store = self.stores.get(job['csv'], {})
+        return executor.submit(
+            self.processor, job['path'], self.output_dir, self.batch_number,
+            store.get('pharmacy_name', self.default_pharmacy_name),
+            store.get('medical_code', self.default_medical_code),
+            self.processed_keys, self.encoding_mode, None, None, None, self.key_format, False,
+            self.pdf, self.font_path,
+        )
+
+    async def _run_job(self, job: Dict):
+        """
+        CSV1件を処理して処理状況を更新する
+
+        Returns:
+            タイムアウトした場合は実行中のままの処理（concurrent.futures.Future）、それ以外は None
+        """
+        started = time.perf_counter()
+        self._update(job, status=PROCESSING, started_at=datetime.now().isoformat(timespec='seconds'))
+        executor = self._executor
+        future = None
+        abandoned = None
+        try:
+            future = self._submit(executor, job)
+            result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            # 実行中のワーカーは止められないため、結果を待たずに失敗とする
+            abandoned = future
+            status, values = TIMEOUT, {'error': f'{self.timeout:g} 秒以内に終わりませんでした'}
+        except BrokenProcessPool as e:
+            # ワーカープロセスが異常終了した場合はプールを作り直す（同時に失敗した他のCSVでは作り直さない）
+            if executor is self._executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+            status, values = FAILED, {'error': f'{type(e).__name__}: {e}'}
+        except Exception as e:
+            status, values = FAILED, {'error': f'{type(e).__name__}: {e}'}
+        else:
+            status = DONE
+            values = {key: result[key] for key in ('encoding', 'total', 'target', 'duplicate', 'rows', 'output', 'pdf')
+                      if key in result}
+            if self.processed_keys_path and result['processed_keys']:
+                save_processed_keys(self.processed_keys_path, result['processed_keys'])
+            values['processed_keys'] = len(result['processed_keys'])
+
+        if abandoned is None:
+            self._archive(job, PROCESSED_DIR if status == DONE else FAILED_DIR)
+        seconds = time.perf_counter() - started
+        self._update(job, status=status, seconds=round(seconds, 3),
+                     finished_at=datetime.now().isoformat(timespec='seconds'), **values)
+        if status == DONE:
+            self.log(f"✅ {job['csv']}: 旭川市{job['target']}件 → {job['rows']}行（{seconds:.1f} 秒）")
+        else:
+            self.log(f"❌ {job['csv']}: {job['error']}")
+        return abandoned
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            job = await queue.get()
+            self._active += 1
+            try:
+                abandoned = await self._run_job(job)
+                if abandoned is not None:
+                    # タイムアウトした処理がワーカーを使い終わるまで次のCSVを渡さない
+                    # （プールの待ち行列で待つ時間をタイムアウトに含めないため）。
+                    # CSVはワーカーが開いている間は移動できない（Windows）ため、終わってから failed に移す
+                    await asyncio.gather(asyncio.wrap_future(abandoned), return_exceptions=True)
+                    self._archive(job, FAILED_DIR)
+                    self.write_manifest()
+            finally:
+                self._active -= 1
+                queue.task_done()
+
+    async def run(self, once: bool = False):
+        """
+        受付フォルダの監視と処理を開始する
+
+        once=True の場合は、受付フォルダのCSVをすべて処理した時点で終了する。
+        """
+        self.drop_dir.mkdir(parents=True, exist_ok=True)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._executor = self._new_executor()
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.workers)]
+        self.write_manifest()
+        try:
+            for path in self._recover():
+                self.log(f'♻️ 再開: {path.name}')
+                job = {'csv': path.name, 'status': QUEUED, 'bytes': path.stat().st_size,
+                       'queued_at': datetime.now().isoformat(timespec='seconds'), 'path': str(path)}
+                self.jobs.append(job)
+                await queue.put(job)
+
+            while True:
+                for path in self.watcher.scan():
+                    # 待ち行列が一杯の間はここで待つ（受付フォルダのCSVは移動しない）
+                    while queue.full():
+                        await asyncio.sleep(self.poll_seconds)
+                    await queue.put(self._claim(path))
+                    self.log(f'📥 受付: {path.name}')
+                if once and not self.watcher.pending and queue.empty() and self._active == 0:
+                    break
+                await asyncio.sleep(self.poll_seconds)
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            if isinstance(self.processed_keys, ProcessedKeyStore):
+                self.processed_keys.close()
+            self.write_manifest()
+        return self._counts()
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='調剤券請求書 受付フォルダの常駐処理')
+    parser.add_argument('drop_dir', help='各店舗がCSVを書き出す受付フォルダ')
+    parser.add_argument('-o', '--output-dir', default='output', help='出力フォルダ（既定: output）')
+    parser.add_argument('--batch', type=int, choices=(1, 2), default=1, help='請求回数（1回目/2回目）')
+    parser.add_argument('--stores', help='店舗設定JSON（CSVファイル名 → 薬局名・医療機関コード）')
+    parser.add_argument('--pharmacy-name', default='', help='薬局名（店舗設定が無い場合）')
+    parser.add_argument('--medical-code', default='', help='医療機関コード（店舗設定が無い場合）')
+    parser.add_argument('--processed-keys', help='処理済みキー（.json または .db/.sqlite）')
+    parser.add_argument('--key-format', choices=KEY_FORMATS, default=LEGACY_KEY_FORMAT)
+    parser.add_argument('--encoding-mode', choices=ENCODING_MODES, default=DEFAULT_ENCODING_MODE)
+    parser.add_argument('--template', help='テンプレートxlsx（既定: tyouzai_excel_v2_clean.xlsx）')
+    parser.add_argument('--pdf', action='store_true', help='請求書PDFも出力する')
+    parser.add_argument('--font', help='PDFの日本語フォント（TTF/TTC）')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='ワーカープロセス数')
+    parser.add_argument('--queue-size', type=int, help='処理待ちの上限（既定: ワーカー数の2倍）')
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help=f'書き込み完了とみなすまでの秒数（既定: {DEFAULT_SETTLE_SECONDS:g}）')
+    parser.add_argument('--poll', type=float, default=DEFAULT_POLL_SECONDS,
+                        help=f'受付フォルダの確認間隔（秒、既定: {DEFAULT_POLL_SECONDS:g}）')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_SECONDS,
+                        help=f'1ファイルの処理時間の上限（秒、既定: {DEFAULT_TIMEOUT_SECONDS:g}）')
+    parser.add_argument('--manifest', help=f'処理状況の出力先（既定: 出力フォルダ/{MANIFEST_FILE}）')
+    parser.add_argument('--once', action='store_true', help='受付フォルダのCSVをすべて処理したら終了する')
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    daemon = IngestDaemon(
+        args.drop_dir, args.output_dir, args.batch,
+        stores=load_store_settings(args.stores),
+        default_pharmacy_name=args.pharmacy_name,
+        default_medical_code=args.medical_code,
+        processed_keys_path=args.processed_keys,
+        encoding_mode=args.encoding_mode,
+        key_format=args.key_format,
+        template_path=args.template,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        settle_seconds=args.settle,
+        poll_seconds=args.poll,
+        timeout=args.timeout,
+        pdf=args.pdf,
+        font_path=args.font,
+        manifest_path=args.manifest,
+    )
+    print(f'👀 受付フォルダ: {args.drop_dir} / ワーカー数: {daemon.workers} / 処理待ちの上限: {daemon.queue_size}')
+    try:
+        counts = asyncio.run(daemon.run(once=args.once))
+    except KeyboardInterrupt:
+        print('\n⏹️ 停止しました（処理中のCSVは次回の起動時に再開します）')
+        return 0
+    print(f"\n完了: {counts[DONE]} 件 / 失敗 {counts[FAILED] + counts[TIMEOUT]} 件 → {daemon.manifest_path}")
+    return 1 if counts[FAILED] + counts[TIMEOUT] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
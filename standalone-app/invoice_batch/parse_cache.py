@@ -0,0 +1,290 @@
+"""
+CSV解析結果のキャッシュ（ファイル内容のハッシュ + 解析処理の版数ごと）
+
+同じ月のCSVは1回目請求・2回目請求、翌月は前月分CSV（月遅れ請求）として繰り返し処理される。
+旭川市の患者（create_patient_data() で半角カナ変換・トリム・空白除去済みの列）とデータ行数を
+列ごとのバイナリ形式で保存し、内容が同じCSVはデコード・行の解析・カナ変換を行わずに読み込む。
+生年月日・調剤年月日は値の種類ごとに解析済みの日付も保存し、読み込み時に date_parser の
+共通パーサーへ登録する（グループ化・Excel作成で日付を解析し直さない）。
+重複・請求済みの判定は処理済みキーによって変わるため保存せず、読み込み後に毎回行う。
+
+ファイル形式（数値はリトルエンディアン）:
+- ヘッダー: MAGIC・形式の版数・PARSER_VERSION・患者数・データ行数・列数
+- 使用エンコーディング表示名（長さ + UTF-8）
+- 列ごとに値の辞書（種類数・各値の文字数の配列・値を連結したUTF-8）と、
+  患者ごとの辞書番号の配列（種類数に応じて1/2/4バイト）
+- 日付の列（DATE_COLUMNS）は続けて、辞書の値ごとの解析済みの日付（datetime の通日、日付でなければ0）の配列
+
+キャッシュフォルダの合計サイズが上限を超えた場合は、最後に使用した日時の古いファイルから削除する。
+"""
+
+import hashlib
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+from itertools import accumulate
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Optional
+
+from .date_parser import default_parser, parse_japanese_date, parse_yyyymmdd
+from .records import PatientRecord, StringPool
+
+# create_patient_data() / fix_kana_and_trim() / is_asahikawa_patient() / データ行判定の
+# 結果が変わる変更をした場合は更新する（古いキャッシュは使われなくなり、容量の上限で削除される）
+PARSER_VERSION = 1
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+CACHE_SUFFIX = '.parsed'
+
+MAGIC = b'IBPC'
+FORMAT_VERSION = 2
+_HEADER = struct.Struct('<4sHHIII')
+_COLUMN_HEADER = struct.Struct('<IcI')
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# 保存する列（PatientRecord() の引数順。public_codes は末尾に3列に分けて保存する）
+RECORD_COLUMNS = (
+    'recipient_number', 'patient_name', 'patient_kana', 'birth_date', 'treatment_date',
+    'medical_institution', 'medical_code', 'insurance_type', 'address', 'insurer_number',
+)
+PUBLIC_CODE_COUNT = 3
+_PUBLIC_CODES_ARG = RECORD_COLUMNS.index('address')
+# 解析済みの日付も保存する列（列名 → グループ化・Excel作成で使う解析関数）
+DATE_COLUMNS = {
+    'birth_date': parse_japanese_date,
+    'treatment_date': parse_yyyymmdd,
+}
+
+
+class ParsedCSV(NamedTuple):
+    """CSV1件の解析結果"""
+    encoding: str
+    total: int
+    patients: List[PatientRecord]  # 旭川市の患者（CSVの出現順）
+    # 解析済みの日付（列名 → {値: datetime}、キャッシュから読み込んだ場合のみ）
+    dates: Mapping[str, Mapping[str, datetime]] = MappingProxyType({})
+
+
+class CacheKey(NamedTuple):
+    """キャッシュのキー（ハッシュ計算時のファイルサイズ・更新日時も保持し、解析中の変更を検出する）"""
+    digest: str
+    size: int
+    mtime_ns: int
+
+
+class ParseCache:
+    """
+    解析結果のキャッシュフォルダ
+
+    フォルダとサイズの上限のみを保持するため、ワーカープロセスにそのまま渡せる。
+    """
+
+    def __init__(self, cache_dir, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def key(self, csv_path, encoding_mode: str) -> CacheKey:
+        """ファイル内容・エンコーディング判定モード・PARSER_VERSION のハッシュ"""
+        stat = os.stat(csv_path)
+        digest = hashlib.sha256(f'{FORMAT_VERSION}\0{PARSER_VERSION}\0{encoding_mode}\0'.encode('utf-8'))
+        with open(csv_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return CacheKey(digest.hexdigest(), stat.st_size, stat.st_mtime_ns)
+
+    def path(self, key: CacheKey) -> Path:
+        return self.cache_dir / f'{key.digest}{CACHE_SUFFIX}'
+
+    def load(self, key: CacheKey) -> Optional[ParsedCSV]:
+        """保存済みの解析結果（無い・壊れている場合は None、壊れたファイルは削除）"""
+        path = self.path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            parsed = decode_parsed(data)
+        except (ValueError, struct.error, UnicodeDecodeError, IndexError):
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            # 最後に使用した日時（削除の順序に使う）
+            os.utime(path)
+        except OSError:
+            pass
+        default_parser.preload(parsed.dates.get('birth_date'), parsed.dates.get('treatment_date'))
+        return parsed
+
+    def store(self, csv_path, key: CacheKey, parsed: ParsedCSV) -> bool:
+        """
+        解析結果を保存し、上限を超えた分を削除する
+
+        解析中にCSVが変更された場合・上限より大きい場合は保存しない。
+        """
+        stat = os.stat(csv_path)
+        if (stat.st_size, stat.st_mtime_ns) != (key.size, key.mtime_ns):
+            return False
+        data = encode_parsed(parsed)
+        if len(data) > self.max_bytes:
+            return False
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.path(key)
+        temp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+        self.evict()
+        return True
+
+    def evict(self) -> int:
+        """合計サイズが上限以下になるまで最後に使用した日時の古いファイルから削除（削除件数を返す）"""
+        entries = []
+        for path in self.cache_dir.glob(f'*{CACHE_SUFFIX}'):
+            try:
+                stat = path.stat()
+            except OSError:
+                # 他のプロセスが削除した
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+def encode_parsed(parsed: ParsedCSV) -> bytes:
+    """解析結果を列ごとのバイナリ形式にする"""
+    patients = parsed.patients
+    columns = [[getattr(patient, name) for patient in patients] for name in RECORD_COLUMNS]
+    for index in range(PUBLIC_CODE_COUNT):
+        columns.append([patient.public_codes[index] for patient in patients])
+
+    encoding = parsed.encoding.encode('utf-8')
+    parts = [
+        _HEADER.pack(MAGIC, FORMAT_VERSION, PARSER_VERSION, len(patients), parsed.total, len(columns)),
+        struct.pack('<I', len(encoding)), encoding,
+    ]
+    for name, values in zip(RECORD_COLUMNS + (None,) * PUBLIC_CODE_COUNT, columns):
+        parts.extend(_encode_column(values, DATE_COLUMNS.get(name)))
+    return b''.join(parts)
+
+
+def decode_parsed(data: bytes) -> ParsedCSV:
+    """encode_parsed() の逆変換（患者は is_asahikawa=True、StringPool で値を共有）"""
+    view = memoryview(data)
+    magic, format_version, parser_version, count, total, column_count = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC or format_version != FORMAT_VERSION or parser_version != PARSER_VERSION:
+        raise ValueError('解析結果キャッシュの形式が異なります')
+    if column_count != len(RECORD_COLUMNS) + PUBLIC_CODE_COUNT:
+        raise ValueError('解析結果キャッシュの列数が異なります')
+    offset = _HEADER.size
+    (length,) = struct.unpack_from('<I', view, offset)
+    offset += 4
+    encoding = bytes(view[offset:offset + length]).decode('utf-8')
+    offset += length
+
+    columns = []
+    dates = {}
+    for name in RECORD_COLUMNS + (None,) * PUBLIC_CODE_COUNT:
+        values, offset, column_dates = _decode_column(view, offset, count, name in DATE_COLUMNS)
+        columns.append(values)
+        if column_dates is not None:
+            dates[name] = column_dates
+    if offset != len(data):
+        raise ValueError('解析結果キャッシュの長さが異なります')
+
+    pool = StringPool()
+    public_codes = [pool(codes) for codes in zip(*columns[len(RECORD_COLUMNS):])]
+    patients = []
+    for values, codes in zip(zip(*columns[:len(RECORD_COLUMNS)]), public_codes):
+        patient = PatientRecord(*values[:_PUBLIC_CODES_ARG], codes, *values[_PUBLIC_CODES_ARG:])
+        patient.is_asahikawa = True
+        patients.append(patient)
+    return ParsedCSV(encoding, total, patients, MappingProxyType(dates))
+
+
+def _code_type(size: int) -> str:
+    if size <= 0x100:
+        return 'B'
+    if size <= 0x10000:
+        return 'H'
+    return 'I'
+
+
+def _to_little_endian(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(typecode: str, data) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _encode_column(values: List[str], parse=None):
+    """値の辞書（種類数・文字数・連結したUTF-8）と辞書番号の配列（parse を指定した場合は値ごとの日付の通日も）"""
+    index = {}
+    codes = [index.setdefault(value, len(index)) for value in values]
+    uniques = list(index)
+    typecode = _code_type(len(uniques))
+    text = ''.join(uniques).encode('utf-8', errors='surrogatepass')
+    parts = (
+        _COLUMN_HEADER.pack(len(uniques), typecode.encode('ascii'), len(text)),
+        _to_little_endian(array('I', map(len, uniques))),
+        text,
+        _to_little_endian(array(typecode, codes)),
+    )
+    if parse is None:
+        return parts
+    ordinals = []
+    for value in uniques:
+        parsed = parse(value)
+        ordinals.append(parsed.toordinal() if isinstance(parsed, datetime) else 0)
+    return parts + (_to_little_endian(array('I', ordinals)),)
+
+
+def _decode_column(view: memoryview, offset: int, count: int, dated: bool = False):
+    unique_count, typecode, text_size = _COLUMN_HEADER.unpack_from(view, offset)
+    typecode = typecode.decode('ascii')
+    if typecode not in ('B', 'H', 'I'):
+        raise ValueError(f'解析結果キャッシュの辞書番号の型が不正です: {typecode}')
+    offset += _COLUMN_HEADER.size
+
+    lengths_size = unique_count * 4
+    lengths = _from_little_endian('I', view[offset:offset + lengths_size])
+    offset += lengths_size
+    text = bytes(view[offset:offset + text_size]).decode('utf-8', errors='surrogatepass')
+    offset += text_size
+
+    code_size = count * array(typecode).itemsize
+    codes = _from_little_endian(typecode, view[offset:offset + code_size])
+    offset += code_size
+    if len(lengths) != unique_count or len(codes) != count:
+        raise ValueError('解析結果キャッシュが途中で切れています')
+
+    ends = list(accumulate(lengths))
+    uniques = [text[start:end] for start, end in zip([0] + ends, ends)]
+
+    dates: Optional[Dict[str, datetime]] = None
+    if dated:
+        ordinals = _from_little_endian('I', view[offset:offset + lengths_size])
+        offset += lengths_size
+        if len(ordinals) != unique_count:
+            raise ValueError('解析結果キャッシュが途中で切れています')
+        dates = {value: datetime.fromordinal(ordinal) for value, ordinal in zip(uniques, ordinals) if ordinal}
+    return list(map(uniques.__getitem__, codes)), offset, dates
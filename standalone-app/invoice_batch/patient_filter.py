@@ -0,0 +1,322 @@
+"""
+患者データ作成・旭川市フィルタリング
+
+standalone-app/app.js の filterPatients() / createPatientData() /
+fixKanaAndTrim() / simpleHash() と同じ判定を行う。
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .csv_reader import get_column
+from .fingerprint import FINGERPRINT_KEY_FORMAT, LEGACY_KEY_FORMAT, format_fingerprint, patient_fingerprint
+from .processed_keys import AMBIGUOUS, BILLED, UNBILLED, reconcile_keys
+from .records import PatientRecord, StringPool
+
+ASAHIKAWA_INSURER_NUMBERS = ('12016010', '12012019')
+
+# 半角カナ→全角カナ変換マップ（濁点・半濁点付きの2文字パターンを含む）
+KANA_MAP = {
+    'ｶﾞ': 'ガ', 'ｷﾞ': 'ギ', 'ｸﾞ': 'グ', 'ｹﾞ': 'ゲ', 'ｺﾞ': 'ゴ',
+    'ｻﾞ': 'ザ', 'ｼﾞ': 'ジ', 'ｽﾞ': 'ズ', 'ｾﾞ': 'ゼ', 'ｿﾞ': 'ゾ',
+    'ﾀﾞ': 'ダ', 'ﾁﾞ': 'ヂ', 'ﾂﾞ': 'ヅ', 'ﾃﾞ': 'デ', 'ﾄﾞ': 'ド',
+    'ﾊﾞ': 'バ', 'ﾋﾞ': 'ビ', 'ﾌﾞ': 'ブ', 'ﾍﾞ': 'ベ', 'ﾎﾞ': 'ボ',
+    'ﾊﾟ': 'パ', 'ﾋﾟ': 'ピ', 'ﾌﾟ': 'プ', 'ﾍﾟ': 'ペ', 'ﾎﾟ': 'ポ',
+    'ｳﾞ': 'ヴ', 'ﾜﾞ': 'ヷ', 'ｦﾞ': 'ヺ',
+    'ｱ': 'ア', 'ｲ': 'イ', 'ｳ': 'ウ', 'ｴ': 'エ', 'ｵ': 'オ',
+    'ｶ': 'カ', 'ｷ': 'キ', 'ｸ': 'ク', 'ｹ': 'ケ', 'ｺ': 'コ',
+    'ｻ': 'サ', 'ｼ': 'シ', 'ｽ': 'ス', 'ｾ': 'セ', 'ｿ': 'ソ',
+    'ﾀ': 'タ', 'ﾁ': 'チ', 'ﾂ': 'ツ', 'ﾃ': 'テ', 'ﾄ': 'ト',
+    'ﾅ': 'ナ', 'ﾆ': 'ニ', 'ﾇ': 'ヌ', 'ﾈ': 'ネ', 'ﾉ': 'ノ',
+    'ﾊ': 'ハ', 'ﾋ': 'ヒ', 'ﾌ': 'フ', 'ﾍ': 'ヘ', 'ﾎ': 'ホ',
+    'ﾏ': 'マ', 'ﾐ': 'ミ', 'ﾑ': 'ム', 'ﾒ': 'メ', 'ﾓ': 'モ',
+    'ﾔ': 'ヤ', 'ﾕ': 'ユ', 'ﾖ': 'ヨ',
+    'ﾗ': 'ラ', 'ﾘ': 'リ', 'ﾙ': 'ル', 'ﾚ': 'レ', 'ﾛ': 'ロ',
+    'ﾜ': 'ワ', 'ｦ': 'ヲ', 'ﾝ': 'ン',
+    'ｧ': 'ァ', 'ｨ': 'ィ', 'ｩ': 'ゥ', 'ｪ': 'ェ', 'ｫ': 'ォ',
+    'ｯ': 'ッ', 'ｬ': 'ャ', 'ｭ': 'ュ', 'ｮ': 'ョ',
+    'ｰ': 'ー', '｡': '。', '｢': '「', '｣': '」', '､': '、', '･': '・',
+}
+
+# 1文字の変換は str.translate の変換表で、濁点・半濁点の合成（2文字パターン）は
+# 濁点・半濁点を含む値のみ先に置換する（2文字パターンを優先する点は app.js と同じ）。
+# 2文字目は必ず濁点・半濁点のため2文字パターン同士は重ならず、置換の順序に依存しない。
+_KANA_TABLE = str.maketrans({k: v for k, v in KANA_MAP.items() if len(k) == 1})
+_KANA_VOICED = tuple((k, v) for k, v in KANA_MAP.items() if len(k) == 2)
+_KANA_VOICED_MARKS = ('\uff9e', '\uff9f')  # ﾞ ﾟ
+# 半角カナ・記号（U+FF61〜U+FF9F）を含まない値（大半の氏名・住所）は変換を省略する
+_HALFWIDTH_KANA_PATTERN = re.compile('[\uff61-\uff9f]')
+
+# データ行は元号形式（R1, H31, S64）または数字のみ（テスト用マスキングデータ）
+_ERA_ROW_PATTERN = re.compile(r'^[RHS]\d+', re.ASCII)
+_NUMERIC_ROW_PATTERN = re.compile(r'^\d+$', re.ASCII)
+_WHITESPACE_PATTERN = re.compile(r'\s')
+
+
+def fix_kana_and_trim(value) -> str:
+    """半角カナ→全角カナ変換・トリム"""
+    if not value:
+        return ''
+    result = str(value)
+    if not _HALFWIDTH_KANA_PATTERN.search(result):
+        return result.strip()
+    if _KANA_VOICED_MARKS[0] in result or _KANA_VOICED_MARKS[1] in result:
+        for pair, voiced in _KANA_VOICED:
+            if pair in result:
+                result = result.replace(pair, voiced)
+    return result.translate(_KANA_TABLE).strip()
+
+
+def remove_leading_01(code) -> str:
+    """医療機関コードの先頭「01」を削除"""
+    if not code:
+        return ''
+    value = str(code).strip()
+    return value[2:] if value.startswith('01') else value
+
+
+def simple_hash(value) -> str:
+    """
+    簡易ハッシュ関数（患者氏名用）
+
+    app.js の simpleHash() と同じ値を返す（UTF-16コード単位で31倍加算、32bit符号付き）。
+    """
+    if not value:
+        return ''
+    encoded = str(value).encode('utf-16-le')
+    h = 0
+    for i in range(0, len(encoded), 2):
+        h = (h * 31 + (encoded[i] | (encoded[i + 1] << 8))) & 0xFFFFFFFF
+    if h & 0x80000000:
+        h -= 0x100000000
+    return format(abs(h), 'x')
+
+
+def make_processed_key(patient: PatientRecord) -> str:
+    """重複チェックキー（年月_患者氏名ハッシュ_医療機関コード）"""
+    treatment_date = patient.treatment_date
+    year_month = treatment_date[:7] if treatment_date else ''
+    return f"{year_month}_{simple_hash(patient.patient_name)}_{patient.medical_code}"
+
+
+def make_fingerprint_key(patient: PatientRecord) -> str:
+    """重複チェックキー（年月_識別ハッシュ_医療機関コード、氏名・生年月日・受給者番号から作成）"""
+    treatment_date = patient.treatment_date
+    year_month = treatment_date[:7] if treatment_date else ''
+    fingerprint = patient_fingerprint(patient.patient_name, patient.birth_date, patient.recipient_number)
+    return f"{year_month}_{format_fingerprint(fingerprint)}_{patient.medical_code}"
+
+
+def make_claim_keys(patient: PatientRecord, key_format: str = LEGACY_KEY_FORMAT) -> Tuple[str, ...]:
+    """
+    照合に使う処理済みキー
+
+    先頭が保存するキー。識別ハッシュ形式の場合は、移行前に保存された旧形式のキーも照合する。
+    """
+    if key_format == FINGERPRINT_KEY_FORMAT:
+        return make_fingerprint_key(patient), make_processed_key(patient)
+    return (make_processed_key(patient),)
+
+
+def is_processed(patient: PatientRecord, processed_keys, key_format: str = LEGACY_KEY_FORMAT) -> bool:
+    """処理済みキー（どちらかの形式）に含まれるか"""
+    return any(key in processed_keys for key in make_claim_keys(patient, key_format))
+
+
+def is_data_row(row: List[str]) -> bool:
+    """HR形式のデータ行判定（ヘッダー行・項目解析結果行・空行を除外）"""
+    first_col = get_column(row, 1).strip()
+    if first_col == '項目解析結果' or first_col == '':
+        return False
+    return bool(_ERA_ROW_PATTERN.match(first_col) or _NUMERIC_ROW_PATTERN.match(first_col))
+
+
+def create_patient_data(row: List[str], pool: Optional[StringPool] = None) -> PatientRecord:
+    """
+    患者データ作成（CSV列番号は1始まり）
+
+    pool を渡すと繰り返し現れる値（医療機関名・住所・調剤年月日など）を共有する。
+    """
+    if pool is None:
+        pool = StringPool()
+    public_codes = pool((
+        get_column(row, 22),  # 第一公費種別番号
+        get_column(row, 26),  # 第二公費種別番号
+        get_column(row, 30),  # 第三公費種別番号
+    ))
+
+    return PatientRecord(
+        recipient_number=fix_kana_and_trim(get_column(row, 58)),
+        patient_name=fix_kana_and_trim(get_column(row, 10)),
+        patient_kana=fix_kana_and_trim(get_column(row, 11)),
+        birth_date=_WHITESPACE_PATTERN.sub('', get_column(row, 12)),
+        treatment_date=pool(_WHITESPACE_PATTERN.sub('', get_column(row, 55))),
+        medical_institution=pool(fix_kana_and_trim(get_column(row, 34))),
+        medical_code=pool(remove_leading_01(fix_kana_and_trim(get_column(row, 65)))),
+        insurance_type=pool(get_column(row, 17)),
+        public_codes=public_codes,
+        address=pool(fix_kana_and_trim(get_column(row, 38))),
+        insurer_number=pool(fix_kana_and_trim(get_column(row, 23))),
+    )
+
+
+def is_asahikawa_patient(patient: PatientRecord) -> bool:
+    """旭川市判定: 保険者番号チェック OR (受給者番号が空 AND 住所が旭川市)"""
+    if patient.insurer_number in ASAHIKAWA_INSURER_NUMBERS:
+        return True
+    return not patient.recipient_number and '旭川市' in patient.address
+
+
+def filter_patients(records: Iterable[List[str]], batch_number: int,
+                    processed_keys: Optional[Set[str]] = None, keep_all: bool = True,
+                    key_format: str = LEGACY_KEY_FORMAT, profiler=None) -> Dict:
+    """
+    患者データフィルタリング
+
+    records はリストでもイテレータでもよく、1行ずつ処理する。
+    keep_all=False の場合は旭川市以外の患者を保持せず件数のみ数える
+    （ストリーム読み込みと組み合わせるとメモリ使用量が対象患者数のみで決まる）。
+
+    Args:
+        records: CSV行のイテラブル
+        batch_number: 1（1回目請求）または 2（2回目請求、重複フラグ設定）
+        processed_keys: 処理済みキー（2回目請求時の重複判定に使用）
+        keep_all: 全患者データを 'all' に保持するか
+        key_format: 処理済みキーの形式（LEGACY_KEY_FORMAT / FINGERPRINT_KEY_FORMAT）
+        profiler: profiling.Profiler（処理済みキーの計算時間を fingerprint として計測）
+
+    Returns:
+        {'all', 'total', 'asahikawa', 'target', 'duplicate'}
+    """
+    processed_keys = processed_keys or set()
+    pool = StringPool()
+    # 計測しない場合はループ内の処理を変えない
+    check_processed = is_processed if profiler is None else profiler.wrap('fingerprint', is_processed)
+    patients = []
+    asahikawa = []
+    duplicate = []
+    total = 0
+
+    for row in records:
+        if not is_data_row(row):
+            continue
+        patient = create_patient_data(row, pool)
+        total += 1
+        if keep_all:
+            patients.append(patient)
+
+        patient.is_asahikawa = is_asahikawa_patient(patient)
+        if not patient.is_asahikawa:
+            continue
+        asahikawa.append(patient)
+
+        # 2回目請求の場合、重複フラグ設定（除外はしない）
+        if batch_number == 2 and check_processed(patient, processed_keys, key_format):
+            patient.is_duplicate = True
+            patient.is_included = False  # 重複データは初期状態でチェックオフ
+            duplicate.append(patient)
+
+    return {
+        'all': patients,
+        'total': total,
+        'asahikawa': asahikawa,
+        'target': asahikawa,  # 重複も含めた全データ
+        'duplicate': duplicate,
+    }
+
+
+def filter_parsed_patients(patients: List[PatientRecord], total: int, batch_number: int,
+                           processed_keys: Optional[Set[str]] = None,
+                           key_format: str = LEGACY_KEY_FORMAT, profiler=None) -> Dict:
+    """
+    読み込み済みの旭川市の患者（parse_cache の解析結果）に filter_patients(keep_all=False) と同じフラグを設定
+
+    Args:
+        patients: 旭川市の患者（is_asahikawa_patient() が真のもの、CSVの出現順）
+        total: CSVのデータ行数
+
+    Returns:
+        {'all', 'total', 'asahikawa', 'target', 'duplicate'}
+    """
+    processed_keys = processed_keys or set()
+    check_processed = is_processed if profiler is None else profiler.wrap('fingerprint', is_processed)
+    duplicate = []
+    for patient in patients:
+        if batch_number == 2 and check_processed(patient, processed_keys, key_format):
+            patient.is_duplicate = True
+            patient.is_included = False
+            duplicate.append(patient)
+
+    return {
+        'all': [],
+        'total': total,
+        'asahikawa': patients,
+        'target': patients,
+        'duplicate': duplicate,
+    }
+
+
+def filter_previous_month_patients(records: Iterable[List[str]], processed_keys=None,
+                                   key_format: str = LEGACY_KEY_FORMAT) -> Dict:
+    """
+    前月分患者データフィルタ（月遅れ請求用、app.js の filterPreviousMonthPatients() に相当）
+
+    旭川市の患者のキーを処理済みキーと1回で照合し、次のように分類する。
+    - 請求済み（同じキーがある）: チェックOFF
+    - 要確認（同じ請求年月・患者が別の医療機関コードで請求済み、または調剤年月日なし）: チェックON
+    - 請求漏れ: チェックON
+
+    識別ハッシュ形式の場合は旧形式のキーとも照合し、どちらかで請求済みなら請求済みとする。
+
+    Returns:
+        {'total', 'asahikawa', 'duplicate'（請求済み）, 'unbilled', 'ambiguous'}
+    """
+    pool = StringPool()
+    asahikawa = []
+    total = 0
+    for row in records:
+        if not is_data_row(row):
+            continue
+        total += 1
+        patient = create_patient_data(row, pool)
+        patient.is_asahikawa = is_asahikawa_patient(patient)
+        if patient.is_asahikawa:
+            asahikawa.append(patient)
+    return classify_previous_month_patients(asahikawa, total, processed_keys, key_format)
+
+
+def classify_previous_month_patients(asahikawa: List[PatientRecord], total: int, processed_keys=None,
+                                     key_format: str = LEGACY_KEY_FORMAT) -> Dict:
+    """
+    前月分の旭川市の患者を処理済みキーと照合して分類する（filter_previous_month_patients() の照合部分）
+
+    parse_cache から読み込んだ患者にもそのまま使う。
+    """
+    duplicate = []
+    unbilled = []
+    ambiguous = []
+    statuses = reconcile_keys([make_claim_keys(p, key_format)[0] for p in asahikawa], processed_keys)
+    if key_format == FINGERPRINT_KEY_FORMAT:
+        # 移行前の旧形式のキーとの照合（請求済み以外のみ）
+        pending = [i for i, status in enumerate(statuses) if status != BILLED]
+        legacy = reconcile_keys([make_processed_key(asahikawa[i]) for i in pending], processed_keys)
+        for i, status in zip(pending, legacy):
+            if status != UNBILLED:
+                statuses[i] = status
+    for patient, status in zip(asahikawa, statuses):
+        if status == BILLED:
+            patient.is_duplicate = True
+            patient.is_included = False
+            duplicate.append(patient)
+        elif status == AMBIGUOUS:
+            ambiguous.append(patient)
+        else:
+            unbilled.append(patient)
+
+    return {
+        'total': total,
+        'asahikawa': asahikawa,
+        'duplicate': duplicate,
+        'unbilled': unbilled,
+        'ambiguous': ambiguous,
+    }
@@ -0,0 +1,338 @@
+"""
+請求書PDF生成（reportlab、Excelを経由しない印刷・保管用）
+
+グループ化済み患者データから excel_writer.generate_excel() と同じA〜M列（13列）の表をPDFに描画する。
+- 行の値は excel_writer.build_row_values() を使い、セルの数値書式（8桁・7桁の0埋め、和暦ドット区切り）を文字列で再現
+- 表題・注意事項・列見出し・列幅の比率はテンプレートxlsxから読み込む（プロセスごとに1回）
+- 日本語フォントの登録はプロセスごとに1回（TTFを指定した場合は reportlab が文書ごとに使用文字のみ埋め込む）
+- 見出し部分はPDFのフォーム（XObject）として文書ごとに1回だけ描画し、各ページから参照する
+
+複数CSVの並列処理は batch.process_csv_file(pdf=True) をプロセスプールで実行する。
+"""
+
+import hashlib
+import io
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from .excel_writer import CHECK_MARK, TABLE_HEADER_ROW, build_row_values, generate_file_name, load_template_bytes
+
+# reportlab組み込みの日本語CIDフォント（埋め込みなし、閲覧側のフォントで表示）
+DEFAULT_FONT = 'HeiseiKakuGo-W5'
+
+DATA_COLUMNS = 13  # A〜M列
+# 列番号 → 0埋めの桁数（excel_writer.COLUMN_FORMATS の '00000000' / '0000000'）
+ZERO_PAD_COLUMNS = {3: 8, 5: 8, 6: 7}
+DATE_COLUMNS = (9, 10)
+CENTER_COLUMNS = (1, 3, 5, 6, 9, 10, 11, 12, 13)
+
+# 元号の開始日（Excelの [$-411]gee.mm.dd と同じ区切り）
+ERA_STARTS = (
+    (datetime(2019, 5, 1), 'R', 2018),
+    (datetime(1989, 1, 8), 'H', 1988),
+    (datetime(1926, 12, 25), 'S', 1925),
+    (datetime(1912, 7, 30), 'T', 1911),
+    (datetime(1868, 1, 1), 'M', 1867),
+)
+
+# ページ設定（A4横、単位ポイント）
+PAGE_SIZE = (841.89, 595.28)
+MARGIN = 24.0
+TITLE_SIZE = 14.0
+NOTE_SIZE = 7.0
+HEADER_SIZE = 8.0
+CELL_SIZE = 8.0
+MIN_CELL_SIZE = 5.0
+ROW_HEIGHT = 15.0
+HEADER_ROW_HEIGHT = 16.0
+FOOTER_SIZE = 7.0
+
+# テンプレートが読めない場合の見出し（tyouzai_excel_v2_clean.xlsx と同じ）
+DEFAULT_TITLE = '調剤券請求書（旭川市）'
+DEFAULT_HEADERS = ('番号', '調剤薬局名', 'コード1', '処方医療機関名', 'コード2', '受給者番号', '氏名', '氏名カナ',
+                   '生年月日', '調剤年月日', '社保', '自立支援', '難病')
+DEFAULT_WIDTHS = (12.0, 31.25, 15.625, 25.5, 15.625, 20.625, 15.875, 28.75, 17.625, 20.625, 12.0, 17.625, 12.0)
+
+# プロセス内のキャッシュ（登録済みフォント名、テンプレートのハッシュ → レイアウト）
+_registered_fonts: Dict[str, str] = {}
+_layouts: Dict[str, 'PdfLayout'] = {}
+
+
+class PdfLayout(NamedTuple):
+    """テンプレートから読み込んだ見出しと列の位置（プロセスごとに1回作成）"""
+    title: str
+    notes: Tuple[str, ...]
+    groups: Tuple[Tuple[int, str], ...]   # 9行目の見出し（列番号, 文字列）
+    headers: Tuple[str, ...]              # 10行目の列見出し
+    column_x: Tuple[float, ...]           # 各列の左端（14個目は表の右端）
+
+
+def register_font(font_path=None, subfont_index: int = 0) -> str:
+    """
+    日本語フォントを登録してフォント名を返す（同じフォントはプロセス内で1回のみ登録）
+
+    font_path を省略した場合は reportlab 組み込みの CIDフォント（HeiseiKakuGo-W5）を使う。
+    TTF/TTC（IPAexゴシック、MSゴシックなど）を指定した場合は、使用した文字のみPDFに埋め込まれる。
+    """
+    key = f'{font_path}#{subfont_index}' if font_path else DEFAULT_FONT
+    name = _registered_fonts.get(key)
+    if name is not None:
+        return name
+
+    from reportlab.pdfbase import pdfmetrics
+    if font_path:
+        from reportlab.pdfbase.ttfonts import TTFont
+        name = f'{Path(font_path).stem}-{subfont_index}'
+        pdfmetrics.registerFont(TTFont(name, str(font_path), subfontIndex=subfont_index))
+    else:
+        from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+        name = DEFAULT_FONT
+        pdfmetrics.registerFont(UnicodeCIDFont(name))
+    _registered_fonts[key] = name
+    return name
+
+
+def load_layout(template_bytes: Optional[bytes] = None) -> PdfLayout:
+    """テンプレートxlsxの表題・注意事項・列見出し・列幅からレイアウトを作成（同じテンプレートは1回のみ解析）"""
+    template_bytes = template_bytes or load_template_bytes()
+    digest = hashlib.sha1(template_bytes).hexdigest()
+    layout = _layouts.get(digest)
+    if layout is None:
+        layout = _layouts[digest] = _read_layout(template_bytes)
+    return layout
+
+
+def _read_layout(template_bytes: bytes) -> PdfLayout:
+    import openpyxl
+    from openpyxl.utils import get_column_letter
+
+    worksheet = openpyxl.load_workbook(io.BytesIO(template_bytes)).worksheets[0]
+
+    def text(row: int, col: int) -> str:
+        value = worksheet.cell(row=row, column=col).value
+        return str(value).strip() if value is not None else ''
+
+    title = text(1, 1) or DEFAULT_TITLE
+    # 注意事項（2〜7行目のB列）
+    notes = tuple(note for note in (text(row, 2) for row in range(2, TABLE_HEADER_ROW - 2)) if note)
+    groups = tuple((col, text(TABLE_HEADER_ROW - 1, col)) for col in range(1, DATA_COLUMNS + 1)
+                   if text(TABLE_HEADER_ROW - 1, col))
+    headers = tuple(text(TABLE_HEADER_ROW, col) or DEFAULT_HEADERS[col - 1] for col in range(1, DATA_COLUMNS + 1))
+
+    widths = []
+    for col in range(1, DATA_COLUMNS + 1):
+        dimension = worksheet.column_dimensions.get(get_column_letter(col))
+        widths.append(dimension.width if dimension is not None and dimension.width else DEFAULT_WIDTHS[col - 1])
+
+    # 列幅の比率を保ったまま用紙の幅に合わせる
+    scale = (PAGE_SIZE[0] - MARGIN * 2) / sum(widths)
+    column_x = [MARGIN]
+    for width in widths:
+        column_x.append(column_x[-1] + width * scale)
+    return PdfLayout(title, notes, groups, headers, tuple(column_x))
+
+
+def format_wareki(value) -> str:
+    """日付を和暦ドット区切り（Excelの [$-411]gee.mm.dd と同じ R07.02.15 形式）に変換"""
+    if not isinstance(value, datetime):
+        return str(value or '')
+    for start, alpha, offset in ERA_STARTS:
+        if value >= start:
+            return f'{alpha}{value.year - offset:02d}.{value.month:02d}.{value.day:02d}'
+    return value.strftime('%Y.%m.%d')
+
+
+def format_row_values(values: List) -> List[str]:
+    """build_row_values() の値をExcelのセル書式と同じ表示文字列に変換"""
+    cells = []
+    for col, value in enumerate(values, start=1):
+        if col in ZERO_PAD_COLUMNS:
+            cells.append(f'{value:0{ZERO_PAD_COLUMNS[col]}d}' if isinstance(value, int) else str(value))
+        elif col in DATE_COLUMNS:
+            cells.append(format_wareki(value))
+        else:
+            cells.append('' if value is None else str(value))
+    return cells
+
+
+def rows_per_page(layout: PdfLayout) -> Tuple[int, int]:
+    """(1ページ目, 2ページ目以降) のデータ行数"""
+    body = PAGE_SIZE[1] - MARGIN * 2 - FOOTER_SIZE * 2
+    first = body - _title_height(layout) - HEADER_ROW_HEIGHT * 2
+    rest = body - TITLE_SIZE * 1.6 - HEADER_ROW_HEIGHT * 2
+    return max(1, int(first // ROW_HEIGHT)), max(1, int(rest // ROW_HEIGHT))
+
+
+def _title_height(layout: PdfLayout) -> float:
+    return TITLE_SIZE * 1.6 + NOTE_SIZE * 1.5 * len(layout.notes)
+
+
+def _fit_text(text: str, font: str, size: float, width: float, string_width) -> Tuple[str, float, float]:
+    """
+    セル幅に収まるフォントサイズ（MIN_CELL_SIZE まで縮小し、それでも収まらなければ末尾を省略）
+
+    Returns:
+        (文字列, フォントサイズ, 描画幅)
+    """
+    measured = string_width(text, font, size)
+    if measured <= width:
+        return text, size, measured
+    fitted = max(MIN_CELL_SIZE, size * width / measured)
+    measured = string_width(text, font, fitted)
+    while text and measured > width:
+        text = text[:-1]
+        measured = string_width(text, font, fitted)
+    return text, fitted, measured
+
+
+class _PageForms:
+    """見出し（表題・注意事項・列見出し）を文書内のフォームとして1回だけ描画する"""
+
+    def __init__(self, canvas, layout: PdfLayout, font: str, pharmacy_name: str):
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+
+        self.string_width = stringWidth
+        self.canvas = canvas
+        self.layout = layout
+        self.font = font
+        top = PAGE_SIZE[1] - MARGIN
+
+        canvas.beginForm('first_page')
+        y = self._draw_title(top, pharmacy_name)
+        canvas.setFont(font, NOTE_SIZE)
+        for note in layout.notes:
+            y -= NOTE_SIZE * 1.5
+            canvas.drawString(MARGIN, y, note)
+        self.first_table_top = y - NOTE_SIZE * 0.5
+        self._draw_header(self.first_table_top)
+        canvas.endForm()
+
+        canvas.beginForm('next_page')
+        self.next_table_top = self._draw_title(top, pharmacy_name)
+        self._draw_header(self.next_table_top)
+        canvas.endForm()
+
+    def _draw_title(self, top: float, pharmacy_name: str) -> float:
+        canvas = self.canvas
+        y = top - TITLE_SIZE
+        canvas.setFont(self.font, TITLE_SIZE)
+        canvas.drawString(MARGIN, y, self.layout.title)
+        if pharmacy_name:
+            canvas.setFont(self.font, HEADER_SIZE)
+            canvas.drawRightString(PAGE_SIZE[0] - MARGIN, y, pharmacy_name)
+        return top - TITLE_SIZE * 1.6
+
+    def _draw_header(self, top: float):
+        """9行目（区分）と10行目（列見出し）"""
+        canvas = self.canvas
+        layout = self.layout
+        x = layout.column_x
+        canvas.setLineWidth(0.5)
+        canvas.setFillGray(0.85)
+        canvas.rect(x[0], top - HEADER_ROW_HEIGHT * 2, x[-1] - x[0], HEADER_ROW_HEIGHT * 2, stroke=1, fill=1)
+        canvas.setFillGray(0)
+        canvas.setFont(self.font, HEADER_SIZE)
+        for col, label in layout.groups:
+            canvas.drawString(x[col - 1] + 2, top - HEADER_ROW_HEIGHT + 4, label)
+        baseline = top - HEADER_ROW_HEIGHT * 2 + 4
+        for col, label in enumerate(layout.headers, start=1):
+            text, size, _ = _fit_text(label, self.font, HEADER_SIZE, x[col] - x[col - 1] - 4, self.string_width)
+            canvas.setFont(self.font, size)
+            canvas.drawCentredString((x[col - 1] + x[col]) / 2, baseline, text)
+        canvas.line(x[0], top - HEADER_ROW_HEIGHT, x[-1], top - HEADER_ROW_HEIGHT)
+        for position in x:
+            canvas.line(position, top - HEADER_ROW_HEIGHT * 2, position, top - HEADER_ROW_HEIGHT)
+
+
+def write_pdf(grouped_patients: Sequence[Dict], output: Union[str, Path, BinaryIO], pharmacy_name: str = '',
+              medical_code: str = '', template_bytes: Optional[bytes] = None, font_path=None) -> int:
+    """
+    グループ化済み患者データから請求書PDFを output（パスまたはバイナリファイル）に書き込む
+
+    Returns:
+        ページ数
+    """
+    from reportlab import rl_config
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.pdfgen.canvas import Canvas
+
+    font = register_font(font_path)
+    layout = load_layout(template_bytes)
+    first_rows, next_rows = rows_per_page(layout)
+    count = len(grouped_patients)
+    pages = 1 + max(0, -(-(count - first_rows) // next_rows))
+    x = layout.column_x
+    widths = [x[col] - x[col - 1] - 4 for col in range(1, DATA_COLUMNS + 1)]
+    centers = [(x[col - 1] + x[col]) / 2 for col in range(1, DATA_COLUMNS + 1)]
+    centered = [col in CENTER_COLUMNS for col in range(1, DATA_COLUMNS + 1)]
+
+    # 圧縮済みストリームのASCII85変換を省く（ファイルが小さくなり、純Python実装の変換時間も不要）
+    use_a85 = rl_config.useA85
+    rl_config.useA85 = 0
+    try:
+        target = str(output) if isinstance(output, (str, Path)) else output
+        canvas = Canvas(target, pagesize=PAGE_SIZE, pageCompression=1)
+        canvas.setTitle(layout.title)
+        forms = _PageForms(canvas, layout, font, pharmacy_name)
+
+        index = 0
+        for page in range(1, pages + 1):
+            if page == 1:
+                canvas.doForm('first_page')
+                top, capacity = forms.first_table_top - HEADER_ROW_HEIGHT * 2, first_rows
+            else:
+                canvas.doForm('next_page')
+                top, capacity = forms.next_table_top - HEADER_ROW_HEIGHT * 2, next_rows
+            page_groups = grouped_patients[index:index + capacity]
+
+            # 罫線はページごとにまとめて描画
+            bottom = top - ROW_HEIGHT * len(page_groups)
+            canvas.setLineWidth(0.5)
+            canvas.lines([(position, bottom, position, top) for position in x] +
+                         [(x[0], top - ROW_HEIGHT * (row + 1), x[-1], top - ROW_HEIGHT * (row + 1))
+                          for row in range(len(page_groups))])
+
+            # セルの文字はページごとに1つのテキストオブジェクトに書き込む
+            text_object = canvas.beginText()
+            current_size = CELL_SIZE
+            text_object.setFont(font, current_size)
+            for row, group in enumerate(page_groups):
+                y = top - ROW_HEIGHT * (row + 1) + 4
+                cells = format_row_values(build_row_values(index + row, group, pharmacy_name, medical_code))
+                for col, text in enumerate(cells):
+                    if not text:
+                        continue
+                    text, size, width = _fit_text(text, font, CELL_SIZE, widths[col], stringWidth)
+                    if size != current_size:
+                        text_object.setFont(font, size)
+                        current_size = size
+                    if centered[col] or text == CHECK_MARK:
+                        text_object.setTextOrigin(centers[col] - width / 2, y)
+                    else:
+                        text_object.setTextOrigin(x[col] + 2, y)
+                    text_object.textOut(text)
+            canvas.drawText(text_object)
+            index += len(page_groups)
+
+            canvas.setFont(font, FOOTER_SIZE)
+            canvas.drawCentredString(PAGE_SIZE[0] / 2, MARGIN / 2, f'{page} / {pages}')
+            canvas.showPage()
+
+        canvas.save()
+    finally:
+        rl_config.useA85 = use_a85
+    return pages
+
+
+def generate_pdf(grouped_patients: Sequence[Dict], pharmacy_name: str = '', medical_code: str = '',
+                 template_bytes: Optional[bytes] = None, font_path=None) -> bytes:
+    """write_pdf() の結果をバイト列で返す"""
+    output = io.BytesIO()
+    write_pdf(grouped_patients, output, pharmacy_name, medical_code, template_bytes, font_path)
+    return output.getvalue()
+
+
+def generate_pdf_file_name(patients, batch_number: int, pharmacy_name: str = '', now=None) -> str:
+    """PDFのファイル名（Excelと同じ名前で拡張子のみ .pdf）"""
+    return str(Path(generate_file_name(patients, batch_number, pharmacy_name, now)).with_suffix('.pdf'))
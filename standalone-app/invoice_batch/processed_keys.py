@@ -0,0 +1,259 @@
+"""
+処理済みキーの保存（SQLite）
+
+app.js の localStorage['processed-keys']（JSON配列を毎回全体で読み書き）の代わりに、
+キーを（請求年月, 医療機関コード）で区分したSQLiteテーブルに保存する。
+- 重複判定は主キー検索（全件読み込み不要）
+- 保存は追加分のみ INSERT（全体の書き直しなし）
+- 古いキーの削除は件数ではなく請求年月（直近Nか月を保持）で行う
+- 月遅れ請求の照合は（請求年月, 患者氏名ハッシュ）の索引との1回の結合で行う（reconcile）
+"""
+
+import json
+import re
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+_NON_DIGIT_PATTERN = re.compile(r'\D')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed_keys (
+    key TEXT PRIMARY KEY,
+    year_month TEXT NOT NULL,
+    medical_code TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    patient_hash TEXT NOT NULL DEFAULT ''
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_processed_keys_partition ON processed_keys (year_month, medical_code);
+"""
+
+_PATIENT_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_processed_keys_patient ON processed_keys (year_month, patient_hash);
+"""
+
+# 照合結果
+BILLED = 'billed'          # 同じキー（請求年月・患者・医療機関コード）が請求済み
+AMBIGUOUS = 'ambiguous'    # 同じ請求年月・患者が別の医療機関コードで請求済み、または調剤年月日なし
+UNBILLED = 'unbilled'      # 請求漏れ
+
+
+def parse_processed_key(key: str) -> Tuple[str, str, str]:
+    """
+    処理済みキー（年月_患者氏名ハッシュ_医療機関コード）から (請求年月YYYYMM, 患者氏名ハッシュ, 医療機関コード) を取り出す
+
+    キーの年月部分は調剤年月日の先頭7文字（例: "2025020" / "2025/02"）のため、数字のみ6桁に揃える。
+    """
+    parts = key.split('_', 2)
+    year_month = _NON_DIGIT_PATTERN.sub('', parts[0])[:6]
+    patient_hash = parts[1] if len(parts) >= 2 else ''
+    medical_code = parts[2] if len(parts) == 3 else ''
+    return year_month, patient_hash, medical_code
+
+
+def split_processed_key(key: str) -> Tuple[str, str]:
+    """処理済みキーから (請求年月YYYYMM, 医療機関コード) を取り出す"""
+    year_month, _, medical_code = parse_processed_key(key)
+    return year_month, medical_code
+
+
+def shift_year_month(year_month: str, months: int) -> str:
+    """YYYYMM を months か月ずらす"""
+    total = int(year_month[:4]) * 12 + int(year_month[4:6]) - 1 + months
+    return f'{total // 12:04d}{total % 12 + 1:02d}'
+
+
+class ProcessedKeyStore:
+    """
+    処理済みキーストア
+
+    `key in store` で重複判定できるため、filter_patients() の processed_keys にそのまま渡せる。
+    プロセスプールへはファイルパスのみ渡し、ワーカー側で接続し直す。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path))
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(_SCHEMA)
+            self._migrate()
+            self._conn.executescript(_PATIENT_INDEX)
+        return self._conn
+
+    def _migrate(self):
+        """患者氏名ハッシュ列の無い旧形式のテーブルに列を追加し、既存のキーから埋める"""
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(processed_keys)')}
+        if 'patient_hash' in columns:
+            return
+        with self._conn:
+            self._conn.execute("ALTER TABLE processed_keys ADD COLUMN patient_hash TEXT NOT NULL DEFAULT ''")
+            keys = [row[0] for row in self._conn.execute('SELECT key FROM processed_keys')]
+            self._conn.executemany('UPDATE processed_keys SET patient_hash = ? WHERE key = ?',
+                                   ((parse_processed_key(key)[1], key) for key in keys))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self._conn = None
+
+    def __contains__(self, key: str) -> bool:
+        row = self.conn.execute('SELECT 1 FROM processed_keys WHERE key = ?', (key,)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM processed_keys').fetchone()[0]
+
+    def add_keys(self, keys: Iterable[str], created_at: Optional[datetime] = None) -> int:
+        """
+        キーを追加（既存キーは無視）
+
+        Returns:
+            新規に追加した件数
+        """
+        created = (created_at or datetime.now()).isoformat(timespec='seconds')
+        rows = []
+        for key in keys:
+            year_month, patient_hash, medical_code = parse_processed_key(key)
+            rows.append((key, year_month, medical_code, created, patient_hash))
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO processed_keys (key, year_month, medical_code, created_at, patient_hash) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+            return self.conn.total_changes - before
+
+    def keys_for_month(self, year_month: str, medical_code: Optional[str] = None) -> Set[str]:
+        """請求年月（YYYYMM）・医療機関コードの区分のキー一覧"""
+        if medical_code is None:
+            cursor = self.conn.execute('SELECT key FROM processed_keys WHERE year_month = ?', (year_month,))
+        else:
+            cursor = self.conn.execute(
+                'SELECT key FROM processed_keys WHERE year_month = ? AND medical_code = ?',
+                (year_month, medical_code),
+            )
+        return {row[0] for row in cursor}
+
+    def months(self):
+        """保存済みの請求年月（昇順）"""
+        return [row[0] for row in self.conn.execute(
+            'SELECT DISTINCT year_month FROM processed_keys ORDER BY year_month')]
+
+    def prune(self, keep_months: int, latest_month: Optional[str] = None) -> int:
+        """
+        直近 keep_months か月分の請求年月のみ残して削除
+
+        latest_month（YYYYMM）を省略した場合は保存済みの最新年月を基準にする。
+
+        Returns:
+            削除した件数
+        """
+        if keep_months < 1:
+            raise ValueError('keep_months は1以上を指定してください')
+        if latest_month is None:
+            row = self.conn.execute("SELECT MAX(year_month) FROM processed_keys WHERE year_month != ''").fetchone()
+            latest_month = row[0]
+            if latest_month is None:
+                return 0
+        cutoff = shift_year_month(latest_month, -(keep_months - 1))
+        with self.conn:
+            # 調剤年月日の無いキーは年月で判断できないため残す
+            cursor = self.conn.execute(
+                "DELETE FROM processed_keys WHERE year_month != '' AND year_month < ?", (cutoff,))
+            return cursor.rowcount
+
+    def reconcile(self, keys: Iterable[str]) -> List[str]:
+        """
+        キーを請求済みキーと照合（一時テーブルとの1回の結合）
+
+        Returns:
+            キーと同じ順の照合結果（BILLED / AMBIGUOUS / UNBILLED）
+        """
+        # キー順に並べて結合すると、索引（B-tree）の同じページを続けて参照できる
+        rows = sorted(((seq, key, *parse_processed_key(key)) for seq, key in enumerate(keys)),
+                      key=lambda row: row[1])
+        result = [UNBILLED] * len(rows)
+        conn = self.conn
+        with conn:
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS reconcile_keys ('
+                         'seq INTEGER, key TEXT, year_month TEXT, patient_hash TEXT, medical_code TEXT)')
+            conn.execute('DELETE FROM reconcile_keys')
+            conn.executemany('INSERT INTO reconcile_keys VALUES (?, ?, ?, ?, ?)', rows)
+            cursor = conn.execute(
+                'SELECT r.seq, r.year_month, '
+                '  EXISTS (SELECT 1 FROM processed_keys p WHERE p.key = r.key), '
+                '  EXISTS (SELECT 1 FROM processed_keys p '
+                '          WHERE p.year_month = r.year_month AND p.patient_hash = r.patient_hash) '
+                'FROM reconcile_keys r')
+            for seq, year_month, billed, same_patient in cursor:
+                result[seq] = _reconcile_status(year_month, billed, same_patient)
+            conn.execute('DELETE FROM reconcile_keys')
+        return result
+
+    def import_json(self, json_path) -> int:
+        """localStorage['processed-keys'] 形式のJSON配列から移行"""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return self.add_keys(json.load(f))
+
+
+def is_sqlite_path(path) -> bool:
+    return Path(path).suffix.lower() in SQLITE_SUFFIXES
+
+
+def _reconcile_status(year_month: str, billed: bool, same_patient: bool) -> str:
+    if billed:
+        return BILLED
+    if same_patient or not year_month:
+        return AMBIGUOUS
+    return UNBILLED
+
+
+def reconcile_keys(keys: Iterable[str], processed_keys) -> List[str]:
+    """
+    キーを処理済みキー（ProcessedKeyStore または JSON から読み込んだ集合）と照合
+
+    Returns:
+        キーと同じ順の照合結果（BILLED / AMBIGUOUS / UNBILLED）
+    """
+    if isinstance(processed_keys, ProcessedKeyStore):
+        return processed_keys.reconcile(keys)
+
+    processed_keys = processed_keys or set()
+    # 集合の場合は（請求年月, 患者氏名ハッシュ）の索引を1回だけ作る
+    patients: Set[Tuple[str, str]] = {parse_processed_key(key)[:2] for key in processed_keys}
+    result = []
+    for key in keys:
+        year_month, patient_hash, _ = parse_processed_key(key)
+        result.append(_reconcile_status(year_month, key in processed_keys, (year_month, patient_hash) in patients))
+    return result
+
+
+def count_statuses(statuses: Iterable[str]) -> Dict[str, int]:
+    """照合結果の件数"""
+    counts = {BILLED: 0, AMBIGUOUS: 0, UNBILLED: 0}
+    for status in statuses:
+        counts[status] += 1
+    return counts
@@ -0,0 +1,225 @@
+"""
+処理段階ごとの計測（--profile の JSON レポート）
+
+CSV1件の処理を次の段階に分けて経過時間を計測し、件数・バイト数・メモリ使用量とあわせて返す。
+- decode:      バイト列 → テキスト（チャンク単位）
+- parse:       テキスト → CSV行
+- filter:      患者データ作成・旭川市判定・重複判定
+- fingerprint: 処理済みキー（患者の識別ハッシュ）の計算
+- group:       受給者番号・患者名・年月ごとのグループ化
+- write:       請求書Excelの書き込み
+（--pdf の場合は pdf: 請求書PDFの描画 も追加される）
+
+各段階の時間は入れ子の内側を除いた時間（filter の中で読み進める parse・decode の時間は filter に含めない）。
+計測しない場合は profiler=None を渡し、行ごとのループには何も追加しない
+（計測用のラッパーは profiler がある場合のみ作る）。
+"""
+
+import contextlib
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Callable, ContextManager, Dict, Iterable, Iterator, List, Optional
+
+STAGES = ('decode', 'parse', 'filter', 'fingerprint', 'group', 'write')
+REPORT_VERSION = 1
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def current_rss() -> Optional[int]:
+    """現在の常駐メモリ（バイト、Linux のみ。取得できない場合は None）"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def peak_rss() -> Optional[int]:
+    """プロセス開始以降の最大常駐メモリ（バイト。取得できない場合は None）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Profiler:
+    """
+    段階ごとの経過時間・件数・メモリ使用量の計測
+
+    段階は入れ子にでき、時間は最も内側の段階に加算する（段階の切り替えごとに perf_counter を1回呼ぶ）。
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self.memory: Dict[str, int] = {}
+        self._stack = []
+        self._mark = 0.0
+        self._started = time.perf_counter()
+
+    def enter(self, stage: str):
+        now = time.perf_counter()
+        if self._stack:
+            top = self._stack[-1]
+            self.seconds[top] = self.seconds.get(top, 0.0) + now - self._mark
+        self._stack.append(stage)
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+        self._mark = now
+
+    def exit(self):
+        now = time.perf_counter()
+        stage = self._stack.pop()
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + now - self._mark
+        self._mark = now
+
+    def stage(self, stage: str) -> '_Stage':
+        """with profiler.stage('group'): ... の形で段階を計測する"""
+        return _Stage(self, stage)
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        """関数呼び出しを段階として計測するラッパー"""
+        enter, exit_ = self.enter, self.exit
+
+        def timed(*args, **kwargs):
+            enter(stage)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                exit_()
+        return timed
+
+    def iterate(self, stage: str, iterable: Iterable) -> Iterator:
+        """
+        イテレータの next() にかかる時間を段階として計測する（ストリーム読み込み用）
+
+        1行ごとに呼ばれるため、時間はローカル変数に加算し、終了時にまとめて反映する。
+        """
+        iterator = iter(iterable)
+        timer = time.perf_counter
+        stack = self._stack
+        parent = stack[-1] if stack else None
+        parent_seconds = own_seconds = 0.0
+        calls = 0
+        try:
+            while True:
+                now = timer()
+                parent_seconds += now - self._mark
+                stack.append(stage)
+                self._mark = now
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    now = timer()
+                    own_seconds += now - self._mark
+                    stack.pop()
+                    self._mark = now
+                    calls += 1
+                yield item
+        finally:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + own_seconds
+            self.calls[stage] = self.calls.get(stage, 0) + calls
+            if parent is not None:
+                self.seconds[parent] = self.seconds.get(parent, 0.0) + parent_seconds
+
+    def count(self, name: str, value: int = 1):
+        """件数・バイト数を加算（段階の境界で呼ぶ）"""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def sample_memory(self, label: str):
+        """現在の常駐メモリを記録（段階の境界で呼ぶ）"""
+        rss = current_rss()
+        if rss is not None:
+            self.memory[label] = rss
+
+    def report(self) -> Dict:
+        """JSONに変換できる計測結果"""
+        stages = {stage: {'seconds': round(self.seconds.get(stage, 0.0), 6), 'calls': self.calls.get(stage, 0)}
+                  for stage in STAGES}
+        for stage in self.seconds:
+            if stage not in stages:
+                stages[stage] = {'seconds': round(self.seconds[stage], 6), 'calls': self.calls[stage]}
+        samples = list(self.memory.values())
+        return {
+            'seconds': round(time.perf_counter() - self._started, 6),
+            'stages': stages,
+            'counters': dict(self.counters),
+            'memory': {
+                'rss_bytes': dict(self.memory),
+                'peak_sampled_bytes': max(samples) if samples else None,
+                'peak_rss_bytes': peak_rss(),
+            },
+        }
+
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+def stage_timer(profiler: Optional[Profiler]) -> Callable[[str], ContextManager]:
+    """段階計測の with 文用の関数（profiler が None の場合は何もしない）"""
+    if profiler is None:
+        return lambda stage: _NULL_STAGE
+    return profiler.stage
+
+
+class _Stage:
+    __slots__ = ('profiler', 'name')
+
+    def __init__(self, profiler: Profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.enter(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.exit()
+        return False
+
+
+def merge_reports(file_reports: Iterable[Dict]) -> Dict:
+    """CSVごとの計測結果を合算（メモリは最大値）"""
+    stages: Dict[str, Dict] = {}
+    counters: Dict[str, int] = {}
+    peak = None
+    for report in file_reports:
+        for stage, values in report['stages'].items():
+            total = stages.setdefault(stage, {'seconds': 0.0, 'calls': 0})
+            total['seconds'] = round(total['seconds'] + values['seconds'], 6)
+            total['calls'] += values['calls']
+        for name, value in report['counters'].items():
+            counters[name] = counters.get(name, 0) + value
+        for value in (report['memory']['peak_sampled_bytes'], report['memory']['peak_rss_bytes']):
+            if value is not None and (peak is None or value > peak):
+                peak = value
+    return {'stages': stages, 'counters': counters, 'peak_rss_bytes': peak}
+
+
+def build_report(results: List[Dict], seconds: float, workers: Optional[int] = None, options: Optional[Dict] = None) -> Dict:
+    """
+    1回の実行の計測レポート（--profile で書き出すJSON）
+
+    results は process_csv_file(profile=True) の結果（'profile' を含む）。
+    """
+    files = [{'csv': result['csv'], **result['profile']} for result in results if 'profile' in result]
+    return {
+        'version': REPORT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'seconds': round(seconds, 6),
+        'workers': workers,
+        'options': options or {},
+        'files': files,
+        'errors': [{'csv': result['csv'], 'error': result['error']} for result in results if 'error' in result],
+        'totals': merge_reports(files),
+    }
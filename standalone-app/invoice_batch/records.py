@@ -0,0 +1,80 @@
+"""
+患者レコード（コンパクト表現）
+
+CSV1行（約70列）のうちパイプラインが参照する列だけを __slots__ 付きの
+レコードに保持する。医療機関名・住所・調剤年月日など同じ値が繰り返し
+現れる列は StringPool で同一オブジェクトを共有し、1件あたりのメモリを抑える。
+"""
+
+from typing import Dict, Tuple
+
+# パイプラインが参照するCSV列（1始まり）
+PIPELINE_COLUMNS = (10, 11, 12, 17, 22, 23, 26, 30, 34, 38, 55, 58, 65)
+
+# 他公費（公費種別番号 → 略称）
+KOHI_MAP = {
+    '21': '精',
+    '15': '更',
+    '16': '育',
+    '54': '難',
+}
+
+
+class StringPool:
+    """
+    文字列の共有プール
+
+    sys.intern と異なりプール単位で解放されるため、CSVファイルごとに作成して使う。
+    """
+
+    __slots__ = ('_strings',)
+
+    def __init__(self):
+        self._strings = {}
+
+    def __call__(self, value):
+        return self._strings.setdefault(value, value)
+
+    def __len__(self):
+        return len(self._strings)
+
+
+class PatientRecord:
+    """患者データ1件（app.js の createPatientData() の戻り値に相当）"""
+
+    __slots__ = (
+        'recipient_number', 'patient_name', 'patient_kana', 'birth_date', 'treatment_date',
+        'medical_institution', 'medical_code', 'insurance_type', 'public_codes', 'address',
+        'insurer_number', 'is_asahikawa', 'is_duplicate', 'is_included',
+    )
+
+    def __init__(self, recipient_number: str, patient_name: str, patient_kana: str, birth_date: str,
+                 treatment_date: str, medical_institution: str, medical_code: str, insurance_type: str,
+                 public_codes: Tuple[str, str, str], address: str, insurer_number: str):
+        self.recipient_number = recipient_number
+        self.patient_name = patient_name
+        self.patient_kana = patient_kana
+        self.birth_date = birth_date
+        self.treatment_date = treatment_date
+        self.medical_institution = medical_institution
+        self.medical_code = medical_code
+        self.insurance_type = insurance_type
+        self.public_codes = public_codes
+        self.address = address
+        self.insurer_number = insurer_number
+        self.is_asahikawa = False
+        self.is_duplicate = False
+        self.is_included = True
+
+    @property
+    def other_kohi_list(self):
+        """他公費（精/更/育/難）"""
+        return [KOHI_MAP[code] for code in self.public_codes if code in KOHI_MAP]
+
+    def as_dict(self) -> Dict:
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['public_codes'] = list(self.public_codes)
+        return data
+
+    def __repr__(self):
+        return f'PatientRecord({self.patient_name!r}, {self.treatment_date!r}, {self.medical_code!r})'
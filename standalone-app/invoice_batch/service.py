@@ -0,0 +1,399 @@
+"""
+請求書作成のローカルHTTPサービス
+
+CSVをアップロードすると、CSV解析 → 旭川市フィルタ → グループ化 → Excel生成 を
+プロセスプールで実行し、請求書Excel（.xlsx）と件数（フィルタ結果）を返す。
+テンプレートは起動時に1回だけ読み込み、各ワーカープロセスに保持する（リクエストごとに読み込まない）。
+
+- POST /invoice: multipart/form-data（file, batch, pharmacy_name, medical_code）
+  またはCSVのバイト列をそのまま送信（パラメータはクエリ文字列）
+  - 既定: 請求書Excelを返す（件数は X-Invoice-Stats ヘッダーにJSONで付ける）
+  - ?format=json: 件数とExcel（base64）をJSONで返す
+- GET /: アップロード用の画面
+- GET /health: ワーカー数・処理中の件数
+
+外部との通信は行わず、待ち受けはループバックアドレス（127.0.0.1 / ::1 / localhost）のみ。
+"""
+
+import argparse
+import base64
+import ipaddress
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from email.message import Message
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+from . import batch
+from .batch import _init_worker, load_processed_keys, save_processed_keys
+from .csv_reader import decode_csv_bytes, parse_csv_text
+from .encoding_detect import DEFAULT_ENCODING_MODE, ENCODING_MODES
+from .excel_writer import generate_file_name, load_template_bytes
+from .fingerprint import KEY_FORMATS, LEGACY_KEY_FORMAT
+from .grouping import group_patients_by_recipient
+from .patient_filter import filter_patients, make_claim_keys
+from .processed_keys import ProcessedKeyStore
+from .xlsx_stream import generate_excel_stream
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_MAX_UPLOAD_MB = 64
+DEFAULT_TIMEOUT_SECONDS = 120.0
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+UPLOAD_FORM = """<!DOCTYPE html>
+<html lang="ja">
+<head><meta charset="utf-8"><title>調剤券請求書作成</title></head>
+<body>
+<h1>調剤券請求書作成</h1>
+<form method="post" action="/invoice" enctype="multipart/form-data">
+<p><label>CSVファイル: <input type="file" name="file" accept=".csv" required></label></p>
+<p><label>請求回数: <select name="batch"><option value="1">1回目</option><option value="2">2回目</option></select></label></p>
+<p><label>薬局名: <input type="text" name="pharmacy_name"></label></p>
+<p><label>医療機関コード: <input type="text" name="medical_code"></label></p>
+<p><button type="submit">Excel作成</button></p>
+</form>
+</body>
+</html>
+"""
+
+
+class RequestError(Exception):
+    """リクエストの内容の誤り（HTTPステータスとメッセージ）"""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def is_loopback(host: str) -> bool:
+    """ループバックアドレスか"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def render_invoice(csv_bytes: bytes, batch_number: int = 1, pharmacy_name: str = '', medical_code: str = '',
+                   processed_keys=None, encoding_mode: str = DEFAULT_ENCODING_MODE,
+                   key_format: str = LEGACY_KEY_FORMAT) -> Tuple[Dict, Optional[bytes]]:
+    """
+    アップロードされたCSV1件から請求書Excelを作成（ワーカープロセス用）
+
+    テンプレートはワーカー初期化時に保持したもの（batch._init_worker）を使う。
+
+    Returns:
+        (件数・ファイル名・処理済みキー, 請求書Excelのバイト列。対象患者が0件の場合は None)
+    """
+    text, used_encoding = decode_csv_bytes(csv_bytes, encoding_mode)
+    filter_result = filter_patients(parse_csv_text(text), batch_number, processed_keys, keep_all=False,
+                                    key_format=key_format)
+    included = [p for p in filter_result['target'] if p.is_included]
+    stats = {
+        'encoding': used_encoding,
+        'total': filter_result['total'],
+        'target': len(filter_result['target']),
+        'duplicate': len(filter_result['duplicate']),
+        'included': len(included),
+        'rows': 0,
+        'file_name': None,
+        'processed_keys': [],
+    }
+    if not included:
+        return stats, None
+
+    grouped = group_patients_by_recipient(included)
+    template_bytes = batch._worker_template or load_template_bytes()
+    data = generate_excel_stream(grouped, template_bytes, pharmacy_name, medical_code)
+    stats['rows'] = len(grouped)
+    stats['file_name'] = generate_file_name(included, batch_number, pharmacy_name)
+    if batch_number == 1:
+        stats['processed_keys'] = [make_claim_keys(p, key_format)[0] for p in included]
+    return stats, data
+
+
+def parse_multipart(content_type: str, body: bytes) -> Dict[str, Tuple[Optional[str], bytes]]:
+    """
+    multipart/form-data を フィールド名 → (ファイル名, 値) に分解
+
+    本文は境界文字列でバイト列のまま分割する（email.parser は数MBのCSVで遅く、
+    リクエストスレッドが GIL を長く保持するため、ヘッダー部分のみ email.message で解析する）。
+    """
+    header = Message()
+    header['Content-Type'] = content_type
+    boundary = header.get_param('boundary')
+    if not boundary:
+        raise RequestError(HTTPStatus.BAD_REQUEST, 'multipart/form-data の形式が正しくありません')
+    fields = {}
+    for part in body.split(b'--' + boundary.encode('latin-1'))[1:]:
+        if part.startswith(b'--'):
+            break
+        header_end = part.find(b'\r\n\r\n')
+        if header_end < 0:
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'multipart/form-data の形式が正しくありません')
+        headers = Message()
+        for line in part[:header_end].decode('utf-8', errors='replace').strip().split('\r\n'):
+            name, _, value = line.partition(':')
+            headers[name.strip()] = value.strip()
+        name = headers.get_param('name', header='content-disposition')
+        value = part[header_end + 4:]
+        if value.endswith(b'\r\n'):
+            value = value[:-2]
+        if name:
+            fields[name] = (headers.get_param('filename', header='content-disposition'), value)
+    return fields
+
+
+class InvoiceService:
+    """
+    テンプレート・プロセスプール・処理済みキーを保持し、リクエストごとの請求書作成を受け付ける
+
+    同時に受け付ける件数（処理待ちを含む）は max_pending まで。超えた場合は 503 を返す。
+    タイムアウトした処理はワーカーで実行中のまま残るため、終わるまで処理中として数える。
+    """
+
+    def __init__(self, workers: Optional[int] = None, template_path=None, processed_keys_path=None,
+                 encoding_mode: str = DEFAULT_ENCODING_MODE, key_format: str = LEGACY_KEY_FORMAT,
+                 max_upload_bytes: int = DEFAULT_MAX_UPLOAD_MB * 1024 * 1024,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT_SECONDS, max_pending: Optional[int] = None,
+                 renderer: Callable = render_invoice):
+        self.workers = workers or os.cpu_count() or 1
+        self.template_bytes = load_template_bytes(template_path)
+        self.processed_keys_path = processed_keys_path
+        self.processed_keys = load_processed_keys(processed_keys_path)
+        self.encoding_mode = encoding_mode
+        self.key_format = key_format
+        self.max_upload_bytes = max_upload_bytes
+        self.timeout = timeout
+        self.max_pending = max_pending or self.workers * 4
+        self.renderer = renderer
+        self._pending = threading.BoundedSemaphore(self.max_pending)
+        self._keys_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self.active = 0
+        self.completed = 0
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(self.template_bytes,))
+
+    def create_invoice(self, csv_bytes: bytes, batch_number: int, pharmacy_name: str,
+                       medical_code: str) -> Tuple[Dict, Optional[bytes]]:
+        """CSV1件をプロセスプールで処理（1回目請求の処理済みキーはここで保存する）"""
+        if not self._pending.acquire(blocking=False):
+            raise RequestError(HTTPStatus.SERVICE_UNAVAILABLE, '処理待ちが上限に達しています。しばらくしてから再度送信してください')
+        with self._count_lock:
+            self.active += 1
+        started = time.perf_counter()
+        future = None
+        try:
+            with self._keys_lock:
+                processed_keys = self.processed_keys
+            future = self.executor.submit(self.renderer, csv_bytes, batch_number, pharmacy_name, medical_code,
+                                          processed_keys, self.encoding_mode, self.key_format)
+            try:
+                stats, data = future.result(self.timeout)
+            except FutureTimeoutError:
+                # 実行中のワーカーは止められない（取り消せるのは処理待ちのものだけ）
+                future.cancel()
+                raise RequestError(HTTPStatus.GATEWAY_TIMEOUT, f'{self.timeout:g} 秒以内に処理が終わりませんでした')
+        finally:
+            if future is None:
+                self._release()
+            else:
+                # 処理中の件数と受付枠は、ワーカーが実際に処理を終えてから戻す
+                # （終わっている場合はその場で呼ばれる）
+                future.add_done_callback(self._release)
+
+        new_keys = stats.pop('processed_keys')
+        if self.processed_keys_path and new_keys:
+            with self._keys_lock:
+                save_processed_keys(self.processed_keys_path, new_keys)
+                if isinstance(self.processed_keys, set):
+                    # 以降の2回目請求の照合に反映する（SQLiteはワーカーがファイルから読む）
+                    self.processed_keys = self.processed_keys | set(new_keys)
+        stats['processed_keys'] = len(new_keys)
+        stats['seconds'] = round(time.perf_counter() - started, 3)
+        with self._count_lock:
+            self.completed += 1
+        return stats, data
+
+    def _release(self, future=None):
+        with self._count_lock:
+            self.active -= 1
+        self._pending.release()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if isinstance(self.processed_keys, ProcessedKeyStore):
+            self.processed_keys.close()
+
+
+class InvoiceRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'InvoiceService/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def service(self) -> InvoiceService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.server.log is not None:
+            self.server.log(f'{self.address_string()} - {format % args}')
+
+    def _send(self, status: HTTPStatus, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: HTTPStatus, payload: Dict, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self._send(status, body, 'application/json; charset=utf-8', headers)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/':
+            self._send(HTTPStatus.OK, UPLOAD_FORM.encode('utf-8'), 'text/html; charset=utf-8')
+        elif path == '/health':
+            service = self.service
+            self._send_json(HTTPStatus.OK, {'status': 'ok', 'workers': service.workers, 'active': service.active,
+                                            'completed': service.completed, 'max_pending': service.max_pending})
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': 'Not Found'})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != '/invoice':
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': 'Not Found'})
+            return
+        try:
+            params, csv_bytes = self._read_upload(url.query)
+            batch_number = self._batch_number(params.get('batch', '1'))
+            stats, data = self.service.create_invoice(csv_bytes, batch_number, params.get('pharmacy_name', ''),
+                                                      params.get('medical_code', ''))
+        except RequestError as e:
+            self._send_json(e.status, {'error': str(e)}, {'Retry-After': '5'} if e.status == HTTPStatus.SERVICE_UNAVAILABLE else None)
+            return
+        except Exception as e:
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f'{type(e).__name__}: {e}'})
+            return
+
+        if data is None:
+            self._send_json(HTTPStatus.UNPROCESSABLE_ENTITY, {'error': '旭川市の対象患者がいません', **stats})
+        elif params.get('format') == 'json':
+            self._send_json(HTTPStatus.OK, {**stats, 'xlsx': base64.b64encode(data).decode('ascii')})
+        else:
+            self._send(HTTPStatus.OK, data, XLSX_CONTENT_TYPE, {
+                'Content-Disposition': f"attachment; filename=\"invoice.xlsx\"; filename*=UTF-8''{quote(stats['file_name'])}",
+                'X-Invoice-Stats': json.dumps(stats),
+            })
+
+    def _read_upload(self, query: str) -> Tuple[Dict[str, str], bytes]:
+        """パラメータ（クエリ文字列・フォーム）とCSVのバイト列"""
+        length = self.headers.get('Content-Length')
+        if length is None:
+            raise RequestError(HTTPStatus.LENGTH_REQUIRED, 'Content-Length がありません')
+        length = int(length)
+        if length > self.service.max_upload_bytes:
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                               f'CSVは {self.service.max_upload_bytes // 1024 // 1024} MB までです')
+        body = self.rfile.read(length)
+
+        params = {name: values[-1] for name, values in parse_qs(query).items()}
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/form-data'):
+            fields = parse_multipart(content_type, body)
+            if 'file' not in fields:
+                raise RequestError(HTTPStatus.BAD_REQUEST, 'CSVファイル（file）がありません')
+            for name, (_, value) in fields.items():
+                if name != 'file':
+                    params[name] = value.decode('utf-8', errors='replace')
+            body = fields['file'][1]
+        if not body:
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'CSVファイルが空です')
+        return params, body
+
+    @staticmethod
+    def _batch_number(value: str) -> int:
+        if value not in ('1', '2'):
+            raise RequestError(HTTPStatus.BAD_REQUEST, '請求回数（batch）は 1 または 2 を指定してください')
+        return int(value)
+
+
+class InvoiceServer(ThreadingHTTPServer):
+    """リクエストごとのスレッドで受け付け、処理は InvoiceService のプロセスプールで行う"""
+
+    daemon_threads = True
+
+    def __init__(self, service: InvoiceService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, log=print):
+        if not is_loopback(host):
+            raise ValueError(f'待ち受けはループバックアドレスのみです: {host}')
+        if ':' in host:
+            self.address_family = socket.AF_INET6
+        self.service = service
+        self.log = log
+        super().__init__((host, port), InvoiceRequestHandler)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='調剤券請求書作成 ローカルHTTPサービス')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'待ち受けアドレス（ループバックのみ、既定: {DEFAULT_HOST}）')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'ポート番号（既定: {DEFAULT_PORT}）')
+    parser.add_argument('--processed-keys',
+                        help='処理済みキー（.json または .db/.sqlite。2回目請求の重複判定に使用、1回目で更新）')
+    parser.add_argument('--key-format', choices=KEY_FORMATS, default=LEGACY_KEY_FORMAT)
+    parser.add_argument('--encoding-mode', choices=ENCODING_MODES, default=DEFAULT_ENCODING_MODE)
+    parser.add_argument('--template', help='テンプレートxlsx（既定: tyouzai_excel_v2_clean.xlsx）')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(), help='ワーカープロセス数')
+    parser.add_argument('--max-pending', type=int, help='同時に受け付ける件数（既定: ワーカー数の4倍）')
+    parser.add_argument('--max-upload-mb', type=int, default=DEFAULT_MAX_UPLOAD_MB,
+                        help=f'CSVの最大サイズ（MB、既定: {DEFAULT_MAX_UPLOAD_MB}）')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT_SECONDS,
+                        help=f'1件の処理時間の上限（秒、既定: {DEFAULT_TIMEOUT_SECONDS:g}）')
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    if not is_loopback(args.host):
+        print(f'❌ 待ち受けはループバックアドレス（127.0.0.1 / ::1 / localhost）のみです: {args.host}')
+        return 1
+
+    service = InvoiceService(
+        workers=args.workers,
+        template_path=args.template,
+        processed_keys_path=args.processed_keys,
+        encoding_mode=args.encoding_mode,
+        key_format=args.key_format,
+        max_upload_bytes=args.max_upload_mb * 1024 * 1024,
+        timeout=args.timeout,
+        max_pending=args.max_pending,
+    )
+    server = InvoiceServer(service, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f'🌐 http://{args.host}:{port}/ で待ち受け中（ワーカー数: {service.workers}、Ctrl+C で停止）')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('\n⏹️ 停止しました')
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+旭川市フィルタ・公費フラグ判定（pandas列演算版）
+
+patient_filter.filter_patients() と同じ判定を1行ずつではなく列単位で行う。
+- データ行判定（元号形式 / 数字のみ）
+- 保険者番号の旭川市判定、受給者番号未割当 + 住所「旭川市」の救済
+- 公費21/15/16（自立支援）・54（重障）フラグ、他公費（精/更/育/難）
+- 患者の識別ハッシュ・処理済みキー（fingerprint.patient_fingerprint() と同じ値）
+"""
+
+import hashlib
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from .column_reader import stream_csv_columns
+from .csv_reader import DEFAULT_ENCODING_MODE, sniff_stream_encoding
+from .fingerprint import (FIELD_SEPARATOR, FINGERPRINT_BYTES, FINGERPRINT_KEY_FORMAT, FINGERPRINT_PERSON,
+                          LEGACY_KEY_FORMAT, normalize_birth_date, normalize_text)
+from .patient_filter import (ASAHIKAWA_INSURER_NUMBERS, create_patient_data, fix_kana_and_trim,
+                             is_processed, make_processed_key, remove_leading_01)
+from .records import KOHI_MAP, PIPELINE_COLUMNS, StringPool
+
+# データ行判定の1列目を含めた読み込み対象列
+FRAME_COLUMNS = (1,) + PIPELINE_COLUMNS
+
+# pandasで読み込む列数（これより短い行は空文字で補完、長い行がある場合は stream_csv_columns() で読み込む）
+MAX_CSV_COLUMNS = 100
+READ_CHUNK_ROWS = 200_000
+
+PUBLIC_CODE_COLUMNS = (22, 26, 30)
+JIRITSU_SHIEN_CODES = ('21', '15', '16')
+JUSHO_CODES = ('54',)
+
+_DATA_ROW_PATTERN = r'(?:[RHS][0-9]|[0-9]+$)'
+
+
+def frame_from_records(records: Iterable[List[str]]) -> pd.DataFrame:
+    """CSV行リストから必要な列のみのDataFrameを作成（列名はCSV列番号）"""
+    records = records if isinstance(records, list) else list(records)
+    columns = {}
+    for column in FRAME_COLUMNS:
+        index = column - 1
+        columns[column] = [row[index] if index < len(row) else '' for row in records]
+    return pd.DataFrame(columns, dtype=object)
+
+
+def read_csv_frame(path, mode: str = DEFAULT_ENCODING_MODE, chunk_rows: int = READ_CHUNK_ROWS) -> pd.DataFrame:
+    """
+    CSVファイルを必要な列のみのDataFrameとして読み込む（pandasのCパーサーを使用）
+
+    列数の異なる行（ヘッダー行など）に対応するため列名を MAX_CSV_COLUMNS 列分指定し、
+    chunk_rows 行ずつ読み込んで必要な列だけを残す。
+    MAX_CSV_COLUMNS 列より多い行がある場合（備考列などを追加した出力）は、
+    必要な列のみを解析する stream_csv_columns() で読み込み直す。
+    """
+    with open(path, 'rb') as f:
+        codec, _ = sniff_stream_encoding(f, mode)
+
+    reader = pd.read_csv(
+        path, header=None, names=range(1, MAX_CSV_COLUMNS + 1), dtype=str, keep_default_na=False,
+        quotechar="'", doublequote=True, skip_blank_lines=True,
+        encoding=codec, encoding_errors='replace', engine='c', chunksize=chunk_rows,
+    )
+    try:
+        chunks = [chunk[list(FRAME_COLUMNS)] for chunk in reader]
+    except pd.errors.ParserError:
+        records, _ = stream_csv_columns(path, mode)
+        return frame_from_records(records)
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in FRAME_COLUMNS})
+    return pd.concat(chunks, ignore_index=True).fillna('')
+
+
+def compute_flags(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    判定結果の列を計算する
+
+    Returns:
+        is_data_row / is_asahikawa / has_jiritsu_shien / has_jusho / other_kohi の列を持つDataFrame
+    """
+    first_col = frame[1].str.strip()
+    is_data_row = (first_col != '項目解析結果') & first_col.str.match(_DATA_ROW_PATTERN)
+
+    # 半角カナ変換は数字・漢字に影響しないため、トリムのみで app.js と同じ判定になる
+    insurer = frame[23].str.strip()
+    recipient = frame[58].str.strip()
+    is_asahikawa = insurer.isin(ASAHIKAWA_INSURER_NUMBERS) | (
+        (recipient == '') & frame[38].str.contains('旭川市', regex=False)
+    )
+
+    # detectKohiFlags はトリムして判定、detectOtherKohi はそのままの値で判定
+    codes = frame[list(PUBLIC_CODE_COLUMNS)]
+    stripped = codes.apply(lambda col: col.str.strip())
+    has_jiritsu_shien = stripped.isin(JIRITSU_SHIEN_CODES).any(axis=1)
+    has_jusho = stripped.isin(JUSHO_CODES).any(axis=1)
+
+    other_kohi = pd.Series('', index=frame.index, dtype=object)
+    for column in PUBLIC_CODE_COLUMNS:
+        other_kohi = other_kohi + frame[column].map(KOHI_MAP).fillna('')
+
+    return pd.DataFrame({
+        'is_data_row': is_data_row.to_numpy(dtype=bool),
+        'is_asahikawa': (is_data_row & is_asahikawa).to_numpy(dtype=bool),
+        'has_jiritsu_shien': has_jiritsu_shien.to_numpy(dtype=bool),
+        'has_jusho': has_jusho.to_numpy(dtype=bool),
+        'other_kohi': other_kohi.to_numpy(),
+    }, index=frame.index)
+
+
+def _factorize(values: np.ndarray, func):
+    """列を値の種類ごとの番号にし、種類ごとに1回だけ変換する（生年月日などは種類が少ない）"""
+    codes, uniques = pd.factorize(values)
+    return codes, [func(value) for value in uniques]
+
+
+def _combine_codes(left: np.ndarray, right: np.ndarray, right_count: int) -> np.ndarray:
+    """2列の番号の組を1つの番号にする（組の種類数は行数以下のため int64 に収まる）"""
+    codes, _ = pd.factorize(left.astype(np.int64) * max(right_count, 1) + right)
+    return codes
+
+
+def fingerprint_frame(frame: pd.DataFrame) -> np.ndarray:
+    """
+    全行の患者の識別ハッシュ（64bit 符号なし整数の配列）
+
+    氏名・生年月日・受給者番号の列を値の種類ごとの番号にし、正規化は値の種類ごと、
+    ハッシュは（氏名, 生年月日, 受給者番号）の組の種類ごと（＝患者ごと）に1回だけ計算する。
+    前処理・正規化は create_patient_data() と fingerprint.patient_fingerprint() と同じ関数を使う。
+    """
+    if len(frame) == 0:
+        return np.zeros(0, dtype=np.uint64)
+
+    name_codes, names = _factorize(frame[10].to_numpy(), lambda value: normalize_text(fix_kana_and_trim(value)))
+    birth_codes, births = _factorize(frame[12].to_numpy(),
+                                     lambda value: normalize_birth_date(''.join(value.split())))
+    recipient_codes, recipients = _factorize(frame[58].to_numpy(),
+                                             lambda value: normalize_text(fix_kana_and_trim(value)))
+
+    pair_codes = _combine_codes(name_codes, birth_codes, len(births))
+    patient_codes = _combine_codes(pair_codes, recipient_codes, len(recipients))
+
+    # 患者ごとの最初の行
+    patient_count = int(patient_codes.max()) + 1
+    first_rows = np.empty(patient_count, dtype=np.int64)
+    first_rows[patient_codes[::-1]] = np.arange(len(patient_codes) - 1, -1, -1)
+
+    blake2b = hashlib.blake2b
+    digests = b''.join(
+        blake2b(FIELD_SEPARATOR.join((names[name], births[birth], recipients[recipient])).encode('utf-8'),
+                digest_size=FINGERPRINT_BYTES, person=FINGERPRINT_PERSON).digest()
+        for name, birth, recipient in zip(name_codes[first_rows].tolist(), birth_codes[first_rows].tolist(),
+                                          recipient_codes[first_rows].tolist())
+    )
+    return np.frombuffer(digests, dtype='<u8').astype(np.uint64)[patient_codes]
+
+
+def fingerprint_keys_frame(frame: pd.DataFrame) -> pd.Series:
+    """全行の処理済みキー（年月_識別ハッシュ_医療機関コード）"""
+    if len(frame) == 0:
+        return pd.Series(dtype=object)
+    codes, values = _factorize(frame[55].to_numpy(), lambda value: ''.join(value.split())[:7])
+    year_month = pd.Series(np.array(values, dtype=object)[codes], index=frame.index)
+    codes, values = _factorize(frame[65].to_numpy(), lambda value: remove_leading_01(fix_kana_and_trim(value)))
+    medical_code = pd.Series(np.array(values, dtype=object)[codes], index=frame.index)
+    hashes = pd.Series(np.char.zfill(np.char.mod('%x', fingerprint_frame(frame)), FINGERPRINT_BYTES * 2),
+                       index=frame.index, dtype=object)
+    return year_month + '_' + hashes + '_' + medical_code
+
+
+def _frame_rows(frame: pd.DataFrame, mask: np.ndarray):
+    """DataFrameの対象行を create_patient_data() が受け取れる行リストに戻す"""
+    width = max(FRAME_COLUMNS)
+    selected = frame.loc[mask, list(FRAME_COLUMNS)]
+    for values in selected.itertuples(index=False, name=None):
+        row = [''] * width
+        for column, value in zip(FRAME_COLUMNS, values):
+            row[column - 1] = value
+        yield row
+
+
+def filter_patients_frame(frame: pd.DataFrame, batch_number: int,
+                          processed_keys: Optional[Set[str]] = None,
+                          key_format: str = LEGACY_KEY_FORMAT) -> Dict:
+    """
+    filter_patients() の列演算版
+
+    判定は列単位で行い、PatientRecord は旭川市の対象行のみ作成する。
+    識別ハッシュ形式の処理済みキーも対象行の列から一括で計算する。
+
+    Returns:
+        {'total', 'asahikawa', 'target', 'duplicate', 'flags'}
+    """
+    flags = compute_flags(frame)
+    processed_keys = processed_keys or set()
+    pool = StringPool()
+
+    mask = flags['is_asahikawa'].to_numpy()
+    fingerprint_keys = None
+    if batch_number == 2 and key_format == FINGERPRINT_KEY_FORMAT:
+        fingerprint_keys = fingerprint_keys_frame(frame[mask]).to_numpy()
+
+    asahikawa = []
+    duplicate = []
+    for index, row in enumerate(_frame_rows(frame, mask)):
+        patient = create_patient_data(row, pool)
+        patient.is_asahikawa = True
+        asahikawa.append(patient)
+        if batch_number != 2:
+            continue
+        if fingerprint_keys is not None:
+            # 識別ハッシュ形式のキー、または移行前の旧形式のキー
+            billed = fingerprint_keys[index] in processed_keys or make_processed_key(patient) in processed_keys
+        else:
+            billed = is_processed(patient, processed_keys, key_format)
+        if billed:
+            patient.is_duplicate = True
+            patient.is_included = False
+            duplicate.append(patient)
+
+    return {
+        'total': int(flags['is_data_row'].sum()),
+        'asahikawa': asahikawa,
+        'target': asahikawa,
+        'duplicate': duplicate,
+        'flags': flags,
+    }
@@ -0,0 +1,446 @@
+"""
+請求書Excel生成（ストリーム書き込み版）
+
+テンプレートxlsx（zip）の各パートをそのままコピーし、シートXMLのみ
+SpreadsheetMLを直接出力して行を1行ずつ書き込む。openpyxlでブック全体を
+読み込まないため、メモリ使用量は行数に依存しない。
+
+- 11行目以降: A〜M列の値を書き込み、セルスタイルはテンプレートの同じ行（範囲外は11行目）を使用
+- 10行目: コード1/コード2 をリッチテキスト（インライン文字列）で出力
+- テーブル「調剤請求」の範囲と dimension をデータ行数に合わせて書き換え
+- テンプレートの解析結果（TemplateForm: 1〜10行目・行ごとの書式・styles.xml・列幅など）は
+  プロセス内で1回だけ作成し、以降の請求書はテンプレートを読み直さずに作成する
+excel_writer.generate_excel() と同じ値・書式になる（テンプレートの行数を超えた行は
+openpyxl版ではスタイル無し、こちらは11行目のスタイルを引き継ぐ点のみ異なる）。
+"""
+
+import posixpath
+import re
+import zipfile
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+from types import MappingProxyType
+from typing import BinaryIO, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+from xml.sax.saxutils import escape, quoteattr
+
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.utils.datetime import to_excel
+
+from .excel_writer import (
+    COLUMN_FORMATS, TABLE_DATA_START_ROW, TABLE_HEADER_ROW, TABLE_NAME, build_row_values, generate_excel,
+)
+
+DATA_COLUMNS = 13  # A〜M列
+
+# ヘッダーのコード列（列番号 → (色, 数字)）。excel_writer.apply_table() と同じ内容
+CODE_HEADERS = {
+    3: ('FF002060', '1'),
+    5: ('FFC00000', '2'),
+}
+
+_ROW_PATTERN = re.compile(r'<row r="(\d+)"([^>]*?)(?:/>|>(.*?)</row>)', re.S)
+_CELL_PATTERN = re.compile(r'<c r="([A-Z]+)(\d+)"([^>]*?)(?:/>|>.*?</c>)', re.S)
+_STYLE_ATTR_PATTERN = re.compile(r'\ss="(\d+)"')
+_XF_PATTERN = re.compile(r'<xf\b[^>]*?(?:/>|>.*?</xf>)', re.S)
+_NUMFMT_PATTERN = re.compile(r'<numFmt numFmtId="(\d+)" formatCode="([^"]*)"\s*/>')
+# dimension の最終列（ref="A1:N510" の N）
+_DIMENSION_PATTERN = re.compile(r'<dimension ref="[A-Z]*\d*(?::([A-Z]+)\d+)?"')
+_ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_ROW_PLACEHOLDER = '\x00'
+
+# Excel組み込みの数値書式（テンプレートのnumFmtsに無いID）
+_BUILTIN_FORMATS = {0: 'General', 1: '0', 14: 'mm-dd-yy'}
+
+
+class _Template:
+    """テンプレートxlsxの解析結果（シートXMLの分割・スタイル・テーブル）"""
+
+    def __init__(self, template_bytes: bytes):
+        self.zip = zipfile.ZipFile(BytesIO(template_bytes))
+        self.sheet_path = self._first_sheet_path()
+        self.table_path = self._table_path(self.sheet_path)
+
+        sheet_xml = self.zip.read(self.sheet_path).decode('utf-8')
+        start = sheet_xml.index('<sheetData')
+        body_start = sheet_xml.index('>', start) + 1
+        if sheet_xml[body_start - 2] == '/':
+            # <sheetData/>（行なし）
+            self.head = sheet_xml[:start] + '<sheetData>'
+            self.tail = '</sheetData>' + sheet_xml[body_start:]
+            body = ''
+        else:
+            end = sheet_xml.index('</sheetData>')
+            self.head = sheet_xml[:body_start]
+            self.tail = sheet_xml[end:]
+            body = sheet_xml[body_start:end]
+
+        # 行番号 → (属性, 行内容)
+        self.rows = {int(m.group(1)): (m.group(2), m.group(3) or '') for m in _ROW_PATTERN.finditer(body)}
+        self.last_row = max(self.rows) if self.rows else 0
+        self.last_column = self._last_column()
+
+    def _read_rels(self, part_path: str) -> Dict[str, str]:
+        """パートの .rels を読み込み（Id → 絶対パス）"""
+        folder, name = posixpath.split(part_path)
+        rels_path = posixpath.join(folder, '_rels', name + '.rels')
+        if rels_path not in self.zip.namelist():
+            return {}
+        rels = {}
+        for m in re.finditer(r'<Relationship\b([^>]*)/>', self.zip.read(rels_path).decode('utf-8')):
+            attrs = dict(re.findall(r'(\w+)="([^"]*)"', m.group(1)))
+            target = attrs['Target']
+            target = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(folder, target))
+            rels[attrs['Id']] = target
+        return rels
+
+    def _last_column(self) -> str:
+        """シートの最終列（テンプレートの dimension・セルのある列・A〜M列のうち最も右の列）"""
+        last = DATA_COLUMNS
+        match = _DIMENSION_PATTERN.search(self.head)
+        if match and match.group(1):
+            last = max(last, column_index_from_string(match.group(1)))
+        for _, content in self.rows.values():
+            for cell in _CELL_PATTERN.finditer(content):
+                last = max(last, column_index_from_string(cell.group(1)))
+        return get_column_letter(last)
+
+    def _first_sheet_path(self) -> str:
+        workbook_xml = self.zip.read('xl/workbook.xml').decode('utf-8')
+        sheet = re.search(r'<sheet\b[^>]*?\br:id="([^"]+)"', workbook_xml)
+        return self._read_rels('xl/workbook.xml')[sheet.group(1)]
+
+    def _table_path(self, sheet_path: str) -> Optional[str]:
+        for target in self._read_rels(sheet_path).values():
+            if '/tables/' in target:
+                table_xml = self.zip.read(target).decode('utf-8')
+                if re.search(r'\bdisplayName="%s"' % re.escape(TABLE_NAME), table_xml):
+                    return target
+        return None
+
+    def row_template(self, row_num: int) -> Tuple[str, str]:
+        """書き込み先の行に使うテンプレート行（範囲外は11行目）"""
+        return self.rows.get(row_num) or self.rows.get(TABLE_DATA_START_ROW, (' spans="1:13"', ''))
+
+
+def _cell_styles(row_content: str) -> Dict[str, Optional[str]]:
+    """行内のセル（列記号 → s属性）"""
+    styles = {}
+    for m in _CELL_PATTERN.finditer(row_content):
+        style = _STYLE_ATTR_PATTERN.search(m.group(3))
+        styles[m.group(1)] = style.group(1) if style else None
+    return styles
+
+
+def _other_cells(row_content: str, row_num: str, skip: set) -> str:
+    """A〜M列以外のセルをそのまま（行番号を置き換えて）出力"""
+    cells = []
+    for m in _CELL_PATTERN.finditer(row_content):
+        if m.group(1) in skip:
+            continue
+        cells.append(m.group(0).replace(f'r="{m.group(1)}{m.group(2)}"', f'r="{m.group(1)}{row_num}"', 1))
+    return ''.join(cells)
+
+
+class _StyleSheet:
+    """
+    styles.xml の数値書式調整
+
+    テンプレートのセルスタイルの数値書式が COLUMN_FORMATS と異なる場合のみ、
+    書式を差し替えたスタイルを追加する（同梱テンプレートでは追加なし）。
+    """
+
+    def __init__(self, styles_xml: str):
+        self.xml = styles_xml
+        self.num_formats = {int(i): code for i, code in _NUMFMT_PATTERN.findall(styles_xml)}
+        xfs_start = styles_xml.index('<cellXfs')
+        xfs_end = styles_xml.index('</cellXfs>')
+        self.xfs = _XF_PATTERN.findall(styles_xml[xfs_start:xfs_end])
+        self.added_formats = {}
+        self.added_xfs = []
+        self._cache = {}
+
+    def _format_code(self, xf: str) -> str:
+        num_fmt_id = int(re.search(r'numFmtId="(\d+)"', xf).group(1))
+        return self.num_formats.get(num_fmt_id, _BUILTIN_FORMATS.get(num_fmt_id, ''))
+
+    def style_for(self, style: Optional[str], format_code: str) -> str:
+        key = (style, format_code)
+        if key not in self._cache:
+            xf = self.xfs[int(style or 0)]
+            if self._format_code(xf) == format_code:
+                self._cache[key] = style or '0'
+            else:
+                self._cache[key] = self._add_xf(xf, format_code)
+        return self._cache[key]
+
+    def _add_xf(self, xf: str, format_code: str) -> str:
+        num_fmt_id = next((i for i, code in self.num_formats.items() if code == format_code), None)
+        if num_fmt_id is None:
+            num_fmt_id = max([163] + list(self.num_formats)) + 1
+            self.num_formats[num_fmt_id] = format_code
+            self.added_formats[num_fmt_id] = format_code
+        new_xf = re.sub(r'numFmtId="\d+"', f'numFmtId="{num_fmt_id}"', xf, count=1)
+        if 'applyNumberFormat=' not in new_xf:
+            new_xf = new_xf.replace('<xf ', '<xf applyNumberFormat="1" ', 1)
+        self.added_xfs.append(new_xf)
+        return str(len(self.xfs) + len(self.added_xfs) - 1)
+
+    def render(self) -> str:
+        xml = self.xml
+        if self.added_formats:
+            added = ''.join(f'<numFmt numFmtId="{i}" formatCode={quoteattr(code)}/>'
+                            for i, code in self.added_formats.items())
+            if '<numFmts' in xml:
+                xml = re.sub(r'<numFmts count="\d+"', f'<numFmts count="{len(self.num_formats)}"', xml, count=1)
+                xml = xml.replace('</numFmts>', added + '</numFmts>', 1)
+            else:
+                xml = re.sub(r'(<styleSheet\b[^>]*>)',
+                             lambda m: f'{m.group(1)}<numFmts count="{len(self.added_formats)}">{added}</numFmts>',
+                             xml, count=1)
+        xml = re.sub(r'<cellXfs count="\d+"', f'<cellXfs count="{len(self.xfs) + len(self.added_xfs)}"', xml, count=1)
+        return xml.replace('</cellXfs>', ''.join(self.added_xfs) + '</cellXfs>', 1)
+
+
+def _text(value: str) -> str:
+    return escape(_ILLEGAL_XML_CHARS.sub('', value))
+
+
+def _cell_xml(ref: str, value, style_attr: str) -> str:
+    if value is None or value == '':
+        return f'<c r="{ref}"{style_attr}/>'
+    if isinstance(value, datetime):
+        return f'<c r="{ref}"{style_attr}><v>{to_excel(value)}</v></c>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c r="{ref}"{style_attr}><v>{value}</v></c>'
+    return (f'<c r="{ref}"{style_attr} t="inlineStr"><is><t xml:space="preserve">'
+            f'{_text(str(value))}</t></is></c>')
+
+
+def _code_header_xml(ref: str, style: Optional[str], color: str, digit: str) -> str:
+    """コード1/コード2 ヘッダー（リッチテキスト）"""
+    style_attr = f' s="{style}"' if style is not None else ''
+    return (f'<c r="{ref}"{style_attr} t="inlineStr"><is><r><t>コード</t></r>'
+            f'<r><rPr><rFont val="メイリオ"/><color rgb="{color}"/><sz val="16"/></rPr><t>{digit}</t></r></is></c>')
+
+
+def _header_row_xml(template: _Template) -> str:
+    attrs, content = template.rows.get(TABLE_HEADER_ROW, (' spans="1:13"', ''))
+    styles = _cell_styles(content)
+    replaced = {get_column_letter(col) for col in CODE_HEADERS}
+
+    cells = []
+    for m in _CELL_PATTERN.finditer(content):
+        column = m.group(1)
+        if column in replaced:
+            continue
+        cells.append((_column_index(column), m.group(0)))
+    for col, (color, digit) in CODE_HEADERS.items():
+        letter = get_column_letter(col)
+        cells.append((col, _code_header_xml(f'{letter}{TABLE_HEADER_ROW}', styles.get(letter), color, digit)))
+    cells.sort(key=lambda item: item[0])
+    return f'<row r="{TABLE_HEADER_ROW}"{attrs}>' + ''.join(xml for _, xml in cells) + '</row>'
+
+
+def _column_index(letter: str) -> int:
+    index = 0
+    for char in letter:
+        index = index * 26 + ord(char) - 64
+    return index
+
+
+_DATA_LETTERS = [get_column_letter(col) for col in range(1, DATA_COLUMNS + 1)]
+
+
+class _RowLayout:
+    """データ行の書式（テンプレート行ごとに1回だけ解析する）"""
+
+    __slots__ = ('attrs', 'style_attrs', 'others')
+
+    def __init__(self, template: _Template, stylesheet: _StyleSheet, template_row: int):
+        attrs, content = template.row_template(template_row)
+        styles = _cell_styles(content)
+        style_attrs = []
+        for col, letter in enumerate(_DATA_LETTERS, start=1):
+            style = styles.get(letter)
+            if col in COLUMN_FORMATS:
+                style = stylesheet.style_for(style, COLUMN_FORMATS[col])
+            style_attrs.append(f' s="{style}"' if style is not None else '')
+        self.attrs = attrs
+        self.style_attrs = style_attrs
+        # A〜M列以外のセル（行番号は XMLに現れない文字で仮置きし、行ごとに置き換える）
+        self.others = _other_cells(content, _ROW_PLACEHOLDER, set(_DATA_LETTERS))
+
+
+def _data_row_xml(layout: _RowLayout, row_num: int, values: List) -> str:
+    cells = [_cell_xml(f'{letter}{row_num}', value, style_attr)
+             for letter, value, style_attr in zip(_DATA_LETTERS, values, layout.style_attrs)]
+    others = layout.others.replace(_ROW_PLACEHOLDER, str(row_num)) if layout.others else ''
+    return f'<row r="{row_num}"{layout.attrs}>' + ''.join(cells) + others + '</row>'
+
+
+class _Part(NamedTuple):
+    """そのままコピーするパート（展開済み）"""
+    filename: str
+    date_time: Tuple[int, ...]
+    compress_type: int
+    external_attr: int
+    data: bytes
+
+
+class TemplateForm(NamedTuple):
+    """
+    テンプレートxlsxを1回だけ解析した結果（読み取り専用、同じテンプレートの請求書で共有する）
+
+    請求書ごとに書き換えるのはデータ行（11行目以降）・dimension・テーブル範囲のみで、
+    それ以外はここに保持した文字列・バイト列をそのまま出力する。
+    """
+    sheet_path: str
+    table_path: Optional[str]
+    parts: Tuple[_Part, ...]             # シート・テーブル・styles.xml 以外のパート
+    head: str                            # <sheetData> まで（列幅 <cols> を含む）
+    header_rows: str                     # 1〜10行目のXML（10行目はコード1/コード2のリッチテキスト）
+    layouts: Mapping[int, _RowLayout]    # 11行目以降のテンプレート行ごとのデータ行の書式
+    row_numbers: Tuple[int, ...]         # 11行目以降のテンプレート行の行番号（昇順）
+    row_xml: Tuple[str, ...]             # row_numbers の各行のXML（データ行より後ろに残す行）
+    tail: str                            # </sheetData> 以降（結合セル <mergeCells> を含む）
+    last_row: int
+    last_column: str                     # dimension の最終列
+    table_xml: Optional[str]
+    styles_xml: str                      # 数値書式の調整済み
+
+
+# プロセス内で保持する TemplateForm の数（常駐するサービス・取り込み処理で
+# 異なるテンプレートが渡されても、最後に使用したものから順にこの数だけ保持する）
+FORM_CACHE_SIZE = 8
+
+# セル参照の行番号（r="A12" の 12）
+_CELL_ROW_PATTERN = re.compile(r'(?<= r="[A-Z])[A-Z]*\d+(?=")')
+# データ行をまとめて書き込む行数（zipへの書き込み回数を減らす）
+_WRITE_ROWS = 256
+
+
+@lru_cache(maxsize=FORM_CACHE_SIZE)
+def load_template_form(template_bytes: bytes) -> TemplateForm:
+    """テンプレートxlsxを解析した TemplateForm（同じテンプレートはプロセス内で1回のみ解析）"""
+    return parse_template_form(template_bytes)
+
+
+def parse_template_form(template_bytes: bytes) -> TemplateForm:
+    """テンプレートxlsxを解析（キャッシュなし。通常は load_template_form() を使う）"""
+    template = _Template(template_bytes)
+    changed = (template.sheet_path, template.table_path, 'xl/styles.xml')
+    parts = tuple(_Part(info.filename, info.date_time, info.compress_type, info.external_attr,
+                        template.zip.read(info.filename))
+                  for info in template.zip.infolist() if info.filename not in changed)
+
+    header_rows = ''.join(f'<row r="{row_num}"{template.rows[row_num][0]}>{template.rows[row_num][1]}</row>'
+                          for row_num in sorted(r for r in template.rows if r < TABLE_HEADER_ROW))
+    header_rows += _header_row_xml(template)
+
+    # 11行目以降の全テンプレート行の書式を先に決め、styles.xml の調整もここで確定させる
+    # （行番号以外が同じテンプレート行は同じ書式を共有する）
+    stylesheet = _StyleSheet(template.zip.read('xl/styles.xml').decode('utf-8'))
+    row_numbers = tuple(sorted(r for r in template.rows if r > TABLE_HEADER_ROW))
+    shared = {}
+    layouts = {}
+    for row_num in row_numbers + (TABLE_DATA_START_ROW,):
+        attrs, content = template.row_template(row_num)
+        key = (attrs, _CELL_ROW_PATTERN.sub('', content))
+        if key not in shared:
+            shared[key] = _RowLayout(template, stylesheet, row_num)
+        layouts[row_num] = shared[key]
+    row_xml = tuple(f'<row r="{row_num}"{template.rows[row_num][0]}>{template.rows[row_num][1]}</row>'
+                    for row_num in row_numbers)
+
+    table_xml = template.zip.read(template.table_path).decode('utf-8') if template.table_path else None
+
+    return TemplateForm(
+        sheet_path=template.sheet_path,
+        table_path=template.table_path,
+        parts=parts,
+        head=template.head,
+        header_rows=header_rows,
+        layouts=MappingProxyType(layouts),
+        row_numbers=row_numbers,
+        row_xml=row_xml,
+        tail=template.tail,
+        last_row=template.last_row,
+        last_column=template.last_column,
+        table_xml=table_xml,
+        styles_xml=stylesheet.render(),
+    )
+
+
+def _sheet_chunks(form: TemplateForm, grouped_patients: Sequence[Dict], pharmacy_name: str, medical_code: str,
+                  last_row: int):
+    """シートXMLを出力（データ行は _WRITE_ROWS 行ごとにまとめる）"""
+    dimension_end = max(last_row, form.last_row)
+    yield re.sub(r'<dimension ref="[^"]*"\s*/>', f'<dimension ref="A1:{form.last_column}{dimension_end}"/>', form.head, count=1)
+    yield form.header_rows
+
+    layouts = form.layouts
+    # テンプレートの範囲外の行は11行目の書式を共有する
+    default_layout = layouts[TABLE_DATA_START_ROW]
+    rows = []
+    for index, group in enumerate(grouped_patients):
+        row_num = TABLE_DATA_START_ROW + index
+        rows.append(_data_row_xml(layouts.get(row_num, default_layout), row_num,
+                                  build_row_values(index, group, pharmacy_name, medical_code)))
+        if len(rows) == _WRITE_ROWS:
+            yield ''.join(rows)
+            rows = []
+    if rows:
+        yield ''.join(rows)
+
+    # データ行より後ろのテンプレート行（入力規則・書式付きの空行）はそのまま残す
+    yield ''.join(form.row_xml[bisect_right(form.row_numbers, last_row):])
+    yield form.tail
+
+
+def write_excel_stream(grouped_patients: Sequence[Dict], template_bytes: bytes, output: Union[str, BinaryIO],
+                       pharmacy_name: str = '', medical_code: str = ''):
+    """
+    グループ化済み患者データから請求書Excelを output（パスまたはバイナリファイル）に書き込む
+
+    テンプレートの解析結果（TemplateForm）はプロセス内で共有し、請求書ごとにテンプレートを読み直さない。
+    テンプレートにテーブル「調剤請求」が無い場合、またはデータが0件の場合は
+    excel_writer.generate_excel() で作成する。
+    """
+    form = load_template_form(template_bytes)
+    if form.table_path is None or not grouped_patients:
+        data = generate_excel(list(grouped_patients), template_bytes, pharmacy_name, medical_code)
+        if isinstance(output, (str, bytes)) or hasattr(output, '__fspath__'):
+            with open(output, 'wb') as f:
+                f.write(data)
+        else:
+            output.write(data)
+        return
+
+    last_row = TABLE_DATA_START_ROW + len(grouped_patients) - 1
+    ref = f'A{TABLE_HEADER_ROW}:M{last_row}'
+
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as out:
+        for part in form.parts:
+            info = zipfile.ZipInfo(part.filename, part.date_time)
+            info.compress_type = part.compress_type
+            info.external_attr = part.external_attr
+            out.writestr(info, part.data)
+
+        with out.open(form.sheet_path, 'w') as sheet:
+            for chunk in _sheet_chunks(form, grouped_patients, pharmacy_name, medical_code, last_row):
+                sheet.write(chunk.encode('utf-8'))
+
+        table_xml = re.sub(r'(<table\b[^>]*?\bref=")[^"]*"', rf'\g<1>{ref}"', form.table_xml, count=1)
+        table_xml = re.sub(r'(<autoFilter\b[^>]*?\bref=")[^"]*"', rf'\g<1>{ref}"', table_xml, count=1)
+        out.writestr(form.table_path, table_xml)
+        out.writestr('xl/styles.xml', form.styles_xml)
+
+
+def generate_excel_stream(grouped_patients: Sequence[Dict], template_bytes: bytes,
+                          pharmacy_name: str = '', medical_code: str = '') -> bytes:
+    """write_excel_stream() の結果をバイト列で返す"""
+    output = BytesIO()
+    write_excel_stream(grouped_patients, template_bytes, output, pharmacy_name, medical_code)
+    return output.getvalue()
@@ -0,0 +1,3 @@
+// テンプレートマニフェスト（自動生成）
+// テンプレート本体は loadTemplate() の初回呼び出し時に読み込まれます
+const TEMPLATE_MANIFEST = {"file": "template-data.js", "sha256": "cf45f0ed0728af3e5efef4c80683c0f2cced0616e6dffb92bb950110d29eaee7", "size": 29075, "base64Length": 38768};
@@ -0,0 +1,55 @@
+"""
+テンプレート配布ファイルの書き出し（template-data.js + マニフェスト）
+
+index.html では小さな template-manifest.js のみを読み込み、テンプレート本体
+（template-data.js、Base64）は app.js の loadTemplate() を初めて呼んだ時に
+<script> タグを追加して読み込む（file:// でも動作するよう fetch は使わない）。
+テンプレート本体はxlsx（ZIP圧縮済み）のBase64のままとする（再圧縮しても小さくならず、
+<script> で読み込める文字列のうち atob() でそのままデコードできる形式のため）。
+
+create-clean-template.py / create-original-template.py（standalone-app・ルート）から使用する。
+"""
+
+import base64
+import hashlib
+import json
+import os
+
+TEMPLATE_DATA_FILE = 'template-data.js'
+MANIFEST_JS_FILE = 'template-manifest.js'
+MANIFEST_JSON_FILE = 'template-manifest.json'
+
+
+def write_template_artifacts(file_data, out_dir, comment='クリーンなテンプレートファイル (Base64エンコード済み)'):
+    """
+    テンプレート本体（template-data.js）とマニフェスト（JS/JSON）を書き出す
+
+    Returns:
+        マニフェスト（file / sha256 / size / base64Length）
+    """
+    base64_data = base64.b64encode(file_data).decode('utf-8')
+
+    # テンプレート本体（遅延読み込み用、形式は従来の template-data.js と同じ）
+    with open(os.path.join(out_dir, TEMPLATE_DATA_FILE), 'w', encoding='utf-8') as f:
+        f.write(f'// {comment}\n')
+        f.write('const TEMPLATE_BASE64 = \'')
+        f.write(base64_data)
+        f.write('\';\n')
+
+    manifest = {
+        'file': TEMPLATE_DATA_FILE,
+        'sha256': hashlib.sha256(file_data).hexdigest(),
+        'size': len(file_data),
+        'base64Length': len(base64_data),
+    }
+    manifest_json = json.dumps(manifest, ensure_ascii=False)
+
+    with open(os.path.join(out_dir, MANIFEST_JS_FILE), 'w', encoding='utf-8') as f:
+        f.write('// テンプレートマニフェスト（自動生成）\n')
+        f.write('// テンプレート本体は loadTemplate() の初回呼び出し時に読み込まれます\n')
+        f.write(f'const TEMPLATE_MANIFEST = {manifest_json};\n')
+
+    with open(os.path.join(out_dir, MANIFEST_JSON_FILE), 'w', encoding='utf-8') as f:
+        f.write(manifest_json + '\n')
+
+    return manifest
@@ -0,0 +1,22 @@
+"""
+pytest共通設定（Python版 一括作成エンジン・VBAインポートツールのテスト用）
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+STANDALONE_DIR = ROOT_DIR / 'standalone-app'
+SAMPLE_DIR = ROOT_DIR / 'sample'
+TOOL_DIR = ROOT_DIR / 'tool'
+
+for path in (STANDALONE_DIR, TOOL_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+@pytest.fixture
+def sample_dir():
+    return SAMPLE_DIR
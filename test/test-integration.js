@@ -114,6 +114,34 @@ describe('Code Quality Integration Tests', () => {
             'template-data.js should contain Base64 template data'
         );
     });
+
+    test('template-manifest.js が template-data.js の内容と一致する', () => {
+        const crypto = require('crypto');
+        const appDir = path.join(__dirname, '../standalone-app');
+        const manifest = JSON.parse(fs.readFileSync(path.join(appDir, 'template-manifest.json'), 'utf8'));
+        const manifestJs = fs.readFileSync(path.join(appDir, 'template-manifest.js'), 'utf8');
+        const templateJs = fs.readFileSync(path.join(appDir, manifest.file), 'utf8');
+
+        const manifestMatch = manifestJs.match(/const TEMPLATE_MANIFEST = (\{.*\});/);
+        assert.ok(manifestMatch, 'template-manifest.js should contain TEMPLATE_MANIFEST');
+        assert.deepStrictEqual(JSON.parse(manifestMatch[1]), manifest);
+
+        const match = templateJs.match(/const TEMPLATE_BASE64 = '([^']*)'/);
+        assert.ok(match, 'template-data.js should contain TEMPLATE_BASE64');
+        const bytes = Buffer.from(match[1], 'base64');
+        assert.strictEqual(match[1].length, manifest.base64Length);
+        assert.strictEqual(bytes.length, manifest.size);
+        assert.strictEqual(crypto.createHash('sha256').update(bytes).digest('hex'), manifest.sha256);
+    });
+
+    test('index.html は template-data.js を起動時に読み込まない', () => {
+        const html = fs.readFileSync(path.join(__dirname, '../standalone-app/index.html'), 'utf8');
+
+        assert.ok(html.includes('<script src="template-manifest.js"></script>'),
+            'index.html should load template-manifest.js');
+        assert.ok(!html.includes('<script src="template-data.js"></script>'),
+            'template-data.js should be loaded lazily by loadTemplate()');
+    });
 });
 
 describe('Documentation Integration Tests', () => {
@@ -0,0 +1,931 @@
+"""
+Unit Tests for invoice_batch (Python版 一括作成エンジン)
+"""
+
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+import openpyxl
+import pytest
+
+from invoice_batch import (
+    DateParser, MonthState, decode_csv_bytes, detect_encoding, detect_file_encoding, filter_patients, fix_kana_and_trim, generate_excel, group_patients_by_recipient,
+    load_template_bytes, parse_csv_text, parse_japanese_date, parse_yyyymmdd, read_csv_file, run_batch,
+    PatientRecord, process_csv_file, simple_hash, stream_csv_file,
+)
+from invoice_batch.batch import main as batch_main
+from invoice_batch.column_reader import READ_COLUMNS, stream_csv_columns
+from invoice_batch.csv_reader import get_column
+from invoice_batch.date_parser import default_parser
+from invoice_batch.excel_writer import TABLE_DATA_START_ROW, build_row_values, format_medical_code, js_parse_int
+from invoice_batch.parse_cache import ParseCache, ParsedCSV, encode_parsed
+from invoice_batch.fingerprint import FINGERPRINT_KEY_FORMAT, is_fingerprint_key, patient_fingerprint
+from invoice_batch.ingest import DONE, FAILED, TIMEOUT, DropFolderWatcher, IngestDaemon
+from invoice_batch.service import (InvoiceServer, InvoiceService, RequestError, is_loopback, parse_multipart,
+                                   render_invoice)
+from invoice_batch.patient_filter import KANA_MAP, create_patient_data, make_fingerprint_key, make_processed_key
+from invoice_batch.pdf_writer import format_row_values, format_wareki, generate_pdf, load_layout, rows_per_page
+from invoice_batch.profiling import STAGES, Profiler
+from invoice_batch.processed_keys import (AMBIGUOUS, BILLED, UNBILLED, ProcessedKeyStore, reconcile_keys,
+                                          split_processed_key)
+from invoice_batch import xlsx_stream
+from invoice_batch.xlsx_stream import generate_excel_stream, load_template_form
+from invoice_batch.vector_filter import (compute_flags, filter_patients_frame, fingerprint_keys_frame,
+                                        frame_from_records, read_csv_frame)
+from benchmarks.synthetic_hr import format_row, generate_rows, write_hr_csv
+
+
+class TestCSVReader:
+    def test_sjis_and_utf8_samples_parse_identically(self, sample_dir):
+        sjis_rows, sjis_encoding = read_csv_file(sample_dir / 'test_data_20250201_sjis.csv')
+        utf8_rows, utf8_encoding = read_csv_file(sample_dir / 'test_data_20250201_utf8.csv')
+        assert sjis_encoding == 'ANSI'
+        assert utf8_encoding == 'UTF-8 (BOM付き)'
+        assert sjis_rows == utf8_rows
+
+    def test_utf8_without_bom_falls_back_in_ansi_first_mode(self):
+        text, encoding = decode_csv_bytes('R1,\'旭川市\'\n'.encode('utf-8'), 'ansi-first')
+        assert encoding == 'UTF-8 (BOMなし)'
+        assert text == 'R1,\'旭川市\'\n'
+
+    def test_stream_matches_full_read(self, sample_dir):
+        for name in ('test_data_20250202_sjis.csv', 'test_data_20250202_utf8.csv'):
+            rows, encoding = read_csv_file(sample_dir / name)
+            stream, stream_encoding = stream_csv_file(sample_dir / name, chunk_size=64)
+            assert list(stream) == rows
+            assert stream_encoding == encoding
+
+    def test_stream_sniffs_past_ascii_prefix(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('invoice_batch.csv_reader.SNIFF_SIZE', 16)
+        path = tmp_path / 'ascii_prefix.csv'
+        path.write_bytes(b'R1,a\n' * 100 + "R2,'旭川市'\n".encode('utf-8'))
+        stream, encoding = stream_csv_file(path)
+        assert encoding == 'UTF-8 (BOMなし)'
+        assert list(stream)[-1] == ['R2', '旭川市']
+
+    def test_detect_encoding_from_sample(self, sample_dir):
+        sjis = detect_file_encoding(sample_dir / 'test_data_20250202_sjis.csv', 'utf8-first')
+        assert (sjis.codec, sjis.label) == ('cp932', 'Shift-JIS (フォールバック)')
+        assert sjis.confidence > 0.9
+
+        assert detect_encoding(b'\xef\xbb\xbfR1,a\n').codec == 'utf-8-sig'
+        assert detect_encoding(b'R1,a\n' * 10).confidence == 1.0
+        # CP932としても読める短いUTF-8は順序で決まるため確からしさが低い
+        ambiguous = detect_encoding('R1,薬局\n'.encode('utf-8'), 'utf8-first')
+        assert ambiguous.codec == 'utf-8' and ambiguous.confidence < 0.75
+        broken = detect_encoding(b'R1,\x81 \x81 \n')
+        assert broken.label == 'Shift-JIS (強制変換)' and broken.confidence < 0.5
+
+    def test_detect_encoding_reads_only_prefix(self, monkeypatch):
+        monkeypatch.setattr('invoice_batch.csv_reader.SNIFF_SIZE', 16)
+        data = 'R1,旭川市\n'.encode('cp932') + b'\xff\xfe'
+        text, encoding = decode_csv_bytes(data, 'ansi-first')
+        assert encoding == 'ANSI'
+        assert text.startswith('R1,旭川市')
+
+    def test_single_quote_fields(self):
+        rows = parse_csv_text("R1,'a,b','it''s',\r\n\r\nR2,'',x\r\n")
+        assert rows == [['R1', 'a,b', "it's", ''], ['R2', '', 'x']]
+
+    def test_selective_columns_match_stream(self, sample_dir, tmp_path):
+        def selected(rows):
+            return [[get_column(row, column) for column in READ_COLUMNS] for row in rows]
+
+        # 65列目より後ろの列、クォート内の , と改行、'' のエスケープ、値の途中のクォート、\r のみの改行
+        wide = ','.join(f"'{i}'" for i in range(2, 80))
+        path = tmp_path / 'wide.csv'
+        path.write_bytes(("R1,'a,b','it''s','',x'y," + wide + "\r\n\r\n"
+                          "R2," + wide + ",'tail,with\nnewline'\n"
+                          "R3,'ｶﾞｷﾞ','旭川市'\rR4,'''',z\nR5," + wide + "\n").encode('cp932'))
+        for csv_path in [path] + sorted(sample_dir.glob('*.csv')):
+            stream, encoding = stream_csv_file(csv_path)
+            columns, columns_encoding = stream_csv_columns(csv_path)
+            assert selected(columns) == selected(stream)
+            assert columns_encoding == encoding
+
+        rows = list(stream_csv_columns(path)[0])
+        assert [row[0] for row in rows] == ['R1', 'R2', 'R3', 'R4', 'R5']
+        # バイト単位で分割した行は65列目まで（読み飛ばした列は含まない）
+        assert rows[-1][64] == '65' and len(rows[-1]) == max(READ_COLUMNS)
+
+        result = process_csv_file(sample_dir / 'test_data_20250201_sjis.csv', tmp_path / 'out', selective_read=True)
+        expected = process_csv_file(sample_dir / 'test_data_20250201_sjis.csv', tmp_path / 'out')
+        assert result['processed_keys'] == expected['processed_keys'] and result['rows'] == 6
+
+
+class TestPatientFilter:
+    def test_simple_hash_matches_js(self):
+        # test/test-unit.js の simpleHash() と同じ値
+        assert simple_hash('') == ''
+        assert simple_hash(None) == ''
+        assert simple_hash('abc') == '17862'
+        assert simple_hash('佐藤 花子') == '656a3235'
+
+    def test_fix_kana_and_trim(self):
+        assert fix_kana_and_trim(' ｶﾞｯｺｳ ﾊﾟﾝ ') == 'ガッコウ パン'
+        assert fix_kana_and_trim(None) == ''
+
+    def test_fix_kana_matches_js_map(self, sample_dir):
+        # app.js の fixKanaAndTrim() の変換マップと同じ内容
+        source = (sample_dir.parent / 'standalone-app' / 'app.js').read_text(encoding='utf-8')
+        js_map = source[source.index('const kanaMap = {'):]
+        js_map = js_map[:js_map.index('};')]
+        assert dict(re.findall(r"'([^']+)': '([^']+)'", js_map)) == KANA_MAP
+
+        # app.js と同じ2段階の正規表現置換（2文字パターン優先）と結果が一致する
+        pattern2 = re.compile('|'.join(k for k in KANA_MAP if len(k) == 2))
+        pattern1 = re.compile('|'.join(k for k in KANA_MAP if len(k) == 1))
+
+        def reference(value):
+            result = pattern2.sub(lambda m: KANA_MAP[m.group(0)], value)
+            return pattern1.sub(lambda m: KANA_MAP[m.group(0)], result).strip()
+
+        alphabet = [chr(c) for c in range(0xFF61, 0xFFA0)] + list('カガア 旭川0１ﾞﾟ\u3000')
+        rng = random.Random(0)
+        for _ in range(2000):
+            value = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 12)))
+            assert fix_kana_and_trim(value) == reference(value), value
+
+    def test_asahikawa_filter(self, sample_dir):
+        rows, _ = read_csv_file(sample_dir / 'test_data_20250201_sjis.csv')
+        result = filter_patients(rows, 1)
+        assert len(result['all']) == 8
+        assert len(result['asahikawa']) == 6
+        assert all(p.is_included for p in result['target'])
+
+    def test_records_share_repeated_values(self, sample_dir):
+        rows, _ = read_csv_file(sample_dir / 'test_data_20250202_sjis.csv')
+        patients = filter_patients(rows, 1)['all']
+        assert not hasattr(patients[0], '__dict__')
+        assert patients[0].other_kohi_list == []
+        by_institution = {}
+        for patient in patients:
+            by_institution.setdefault(patient.medical_institution, set()).add(id(patient.medical_institution))
+        assert all(len(ids) == 1 for ids in by_institution.values())
+
+    def test_second_batch_marks_duplicates(self, sample_dir):
+        rows, _ = read_csv_file(sample_dir / 'test_data_20250201_sjis.csv')
+        first = filter_patients(rows, 1)['target'][0]
+        key = f'{first.treatment_date[:7]}_{simple_hash(first.patient_name)}_{first.medical_code}'
+        result = filter_patients(rows, 2, {key})
+        assert len(result['duplicate']) == 1
+        assert result['duplicate'][0].is_included is False
+
+
+class TestVectorFilter:
+    def test_matches_scalar_filter_on_samples(self, sample_dir):
+        for csv_path in sorted(sample_dir.glob('*.csv')):
+            rows, _ = read_csv_file(csv_path)
+            expected = filter_patients(rows, 1)
+            for frame in (frame_from_records(rows), read_csv_frame(csv_path)):
+                result = filter_patients_frame(frame, 1)
+                assert result['total'] == expected['total'], csv_path.name
+                assert [p.as_dict() for p in result['target']] == [p.as_dict() for p in expected['target']]
+
+    def test_rows_wider_than_max_columns(self, sample_dir, tmp_path):
+        lines = (sample_dir / 'test_data_20250201_utf8.csv').read_text(encoding='utf-8-sig').splitlines()
+        # 備考列を追加した130列の行
+        lines[3] += ",'備考'" * (130 - len(next(csv.reader([lines[3]], quotechar="'"))))
+        csv_path = tmp_path / 'wide.csv'
+        csv_path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+        rows, _ = read_csv_file(csv_path)
+        assert max(map(len, rows)) == 130
+        expected = filter_patients(rows, 1)
+        result = filter_patients_frame(read_csv_frame(csv_path), 1)
+        assert result['total'] == expected['total']
+        assert [p.as_dict() for p in result['target']] == [p.as_dict() for p in expected['target']]
+
+    def test_address_fallback_and_kohi_flags(self):
+        def row(first, insurer, recipient, address, codes):
+            values = [''] * 65
+            values[0], values[22], values[57], values[37] = first, insurer, recipient, address
+            values[21], values[25], values[29] = codes
+            return values
+
+        rows = [
+            row('項目解析結果', '12016010', '', '', ('', '', '')),
+            row('R7', '12016010', '1234567', '札幌市', ('21', '', '')),
+            row('R7', '01010016', '', '北海道旭川市', ('', ' 54', '')),
+            row('H31', '01010016', '7654321', '北海道旭川市', ('15', '', '16')),
+            row('12345', '12012019', '1234567', '', ('', '', '')),
+        ]
+        flags = compute_flags(frame_from_records(rows))
+        assert flags['is_data_row'].tolist() == [False, True, True, True, True]
+        assert flags['is_asahikawa'].tolist() == [False, True, True, False, True]
+        assert flags['has_jiritsu_shien'].tolist() == [False, True, False, True, False]
+        assert flags['has_jusho'].tolist() == [False, False, True, False, False]
+        assert flags['other_kohi'].tolist() == ['', '精', '', '更育', '']
+
+        result = filter_patients_frame(frame_from_records(rows), 1)
+        expected = filter_patients(rows, 1)
+        assert [p.as_dict() for p in result['target']] == [p.as_dict() for p in expected['target']]
+
+
+class TestFingerprint:
+    def test_normalized_and_matches_frame(self, sample_dir):
+        same = patient_fingerprint('佐藤 花子', '昭和35年5月10日', '1234567')
+        assert patient_fingerprint('佐藤\u3000花子', ' 1960/5/10 ', '１２３４５６７') == same
+        assert patient_fingerprint('佐藤 花子', '昭和35年5月11日', '1234567') != same
+        assert patient_fingerprint('佐藤 花子', '昭和35年5月10日', '') != same
+        assert patient_fingerprint('ｻﾄｳ ﾊﾅｺ', '', '') == patient_fingerprint('サトウハナコ', '', '')
+
+        rows = [row for row in generate_rows(300, seed=5) if row[0] not in ('H', '項目解析結果')]
+        for csv_path in sorted(sample_dir.glob('*.csv')):
+            rows.extend(read_csv_file(csv_path)[0])
+        rows = [row for row in rows if len(row) >= 65]
+        keys = fingerprint_keys_frame(frame_from_records(rows)).tolist()
+        assert keys == [make_fingerprint_key(create_patient_data(row)) for row in rows]
+        assert all(is_fingerprint_key(key) for key in keys)
+        assert not any(is_fingerprint_key(make_processed_key(create_patient_data(row))) for row in rows)
+
+    def test_fingerprint_keys_read_legacy_keys(self, sample_dir, tmp_path):
+        csv_dir = tmp_path / 'csv'
+        csv_dir.mkdir()
+        shutil.copy(sample_dir / 'test_data_20250201_sjis.csv', csv_dir / 'store.csv')
+
+        # 旧形式のキーで請求済みの患者は識別ハッシュ形式でも重複と判定
+        legacy = run_batch(csv_dir, tmp_path / 'out', 1, workers=1)[0]
+        second = run_batch(csv_dir, tmp_path / 'out2', 2, processed_keys=set(legacy['processed_keys']),
+                           workers=1, key_format=FINGERPRINT_KEY_FORMAT)[0]
+        assert second['duplicate'] == legacy['included'] and second['included'] == 0
+
+        first = run_batch(csv_dir, tmp_path / 'out3', 1, workers=1, key_format=FINGERPRINT_KEY_FORMAT)[0]
+        assert all(is_fingerprint_key(key) for key in first['processed_keys'])
+        frame = read_csv_frame(csv_dir / 'store.csv')
+        result = filter_patients_frame(frame, 2, set(first['processed_keys']), FINGERPRINT_KEY_FORMAT)
+        assert len(result['duplicate']) == first['included']
+
+        # 同姓同名の別の患者（生年月日・受給者番号が異なる）は請求済みにしない
+        rows, _ = read_csv_file(csv_dir / 'store.csv')
+        target = filter_patients(rows, 1)['target'][0]
+        other = [''] * 70
+        for column, value in ((1, 'R1'), (10, target.patient_name), (12, '平成2年1月1日'), (23, '12016010'),
+                              (55, target.treatment_date), (58, '7777777'), (65, target.medical_code)):
+            other[column - 1] = value
+        assert filter_patients([other], 2, set(legacy['processed_keys']))['duplicate']
+        assert not filter_patients([other], 2, set(first['processed_keys']),
+                                   key_format=FINGERPRINT_KEY_FORMAT)['duplicate']
+
+
+class TestGrouping:
+    def test_parse_dates(self):
+        assert parse_japanese_date('昭和35年5月10日') == datetime(1960, 5, 10)
+        assert parse_japanese_date('R7/2/15') == datetime(2025, 2, 15)
+        assert parse_japanese_date('H31/4/30') == datetime(2019, 4, 30)
+        assert parse_japanese_date('不明') == '不明'
+        # JavaScriptのDateと同様に日付を繰り上げる
+        assert parse_yyyymmdd('20250230') == datetime(2025, 3, 2)
+
+    def test_date_parser_cache(self):
+        parser = DateParser(maxsize=2)
+        for era, year in (('明治', 1868), ('大正', 1912), ('昭和', 1926), ('平成', 1989), ('令和', 2019)):
+            assert parser.parse_japanese_date(f'{era}1年1月8日') == datetime(year, 1, 8)
+        assert parser.parse_japanese_date(' 令和1年1月8日 ') == datetime(2019, 1, 8)
+
+        first = parser.parse_yyyymmdd('20250203')
+        assert parser.parse_yyyymmdd('20250203') is first
+        assert parser.parse_yyyymmdd("'20250203'") == first
+        assert parser.parse_yyyymmdd(20250203) == first
+
+        stats = parser.stats()
+        assert stats['japanese'] == {'hits': 0, 'misses': 6, 'size': 2, 'maxsize': 2, 'hit_rate': 0.0}
+        assert stats['yyyymmdd']['hits'] == 2 and stats['yyyymmdd']['misses'] == 2
+        assert stats['yyyymmdd']['hit_rate'] == 0.5
+        parser.clear()
+        assert parser.stats()['yyyymmdd']['size'] == 0
+
+        # 登録済みの日付は解析しない（登録数は maxsize まで）
+        parser.preload(yyyymmdd={'20250203': first, '20250204': first})
+        assert parser.parse_yyyymmdd('20250204') is first
+        parser.preload(yyyymmdd={'20250205': first})
+        assert parser.parse_yyyymmdd('20250204') == datetime(2025, 2, 4)
+        assert parser.stats()['yyyymmdd']['misses'] == 1
+
+    def test_group_by_month(self):
+        def patient(treatment_date):
+            return PatientRecord('1', '佐藤 花子', 'サトウ ハナコ', '19600510', treatment_date, '旭川中央病院',
+                                 '12345678', '公費単独', ('', '', ''), '北海道旭川市', '12016010')
+
+        patients = [patient('20250115'), patient('20250210'), patient('20250203'), patient('20250203')]
+        groups = group_patients_by_recipient(patients)
+        assert [g['year_month'] for g in groups] == ['2025-02', '2025-01']
+        assert groups[0]['treatment_dates'] == ['20250210', '20250203']
+        assert groups[0]['first_treatment_date'] == datetime(2025, 2, 3)
+        assert len(groups[0]['records']) == 3
+
+    def test_group_frequent_visitor(self):
+        def patient(name, treatment_date):
+            return PatientRecord('1', name, '', '19400101', treatment_date, '旭川施設クリニック',
+                                 '12345678', '公費単独', ('', '', ''), '北海道旭川市', '12016010')
+
+        # 施設調剤: 1人が月に25回以上（同じ日の重複・月跨ぎを含む）
+        days = [(i * 11) % 28 + 1 for i in range(40)]
+        patients = [patient('入居者A', f'202503{d:02d}') for d in days]
+        patients += [patient('入居者B', '20250110'), patient('入居者A', '20250215'), patient('入居者B', '20250301')]
+        groups = group_patients_by_recipient(patients)
+
+        assert [(g['records'][0].patient_name, g['year_month']) for g in groups] == [
+            ('入居者A', '2025-03'), ('入居者B', '2025-03'), ('入居者A', '2025-02'), ('入居者B', '2025-01')]
+        assert len(groups[0]['records']) == 40
+        assert groups[0]['treatment_dates'] == list(dict.fromkeys(f'202503{d:02d}' for d in days))
+        assert len(groups[0]['treatment_dates']) == 28
+        assert groups[0]['first_treatment_date'] == datetime(2025, 3, 1)
+
+
+class TestExcelWriter:
+    def test_format_helpers(self):
+        assert format_medical_code("'0101412345678'") == '12345678'
+        assert js_parse_int('0412001') == 412001
+        assert js_parse_int('') == 0
+
+    def test_generate_excel_rows(self, sample_dir):
+        rows, _ = read_csv_file(sample_dir / 'test_data_20250201_sjis.csv')
+        groups = group_patients_by_recipient(filter_patients(rows, 1)['target'])
+        data = generate_excel(groups, load_template_bytes(), 'テスト薬局', '0141234567')
+
+        worksheet = openpyxl.load_workbook(io.BytesIO(data)).worksheets[0]
+        assert worksheet.tables['調剤請求'].ref == f'A10:M{10 + len(groups)}'
+        first = [c.value for c in worksheet[11][:13]]
+        assert first[:8] == [1, 'テスト薬局', 41234567, '旭川中央病院', 12345678, 412901, '佐藤 花子', 'サトウ ハナコ']
+        assert first[8] == datetime(1960, 5, 10)
+        assert first[9] == datetime(2025, 2, 3)
+        assert worksheet['I11'].number_format == '[$-411]gee.mm.dd;@'
+
+    def test_stream_matches_openpyxl(self, sample_dir):
+        rows, _ = read_csv_file(sample_dir / 'test_data_20250202_sjis.csv')
+        groups = group_patients_by_recipient(filter_patients(rows, 1)['target'])
+        # テンプレートの行数（510行）を超える場合は11行目の書式で追加する
+        groups = groups * 35
+        template = load_template_bytes()
+
+        expected = openpyxl.load_workbook(io.BytesIO(generate_excel(groups, template, '薬局<&>', '0141234567')),
+                                          rich_text=True).worksheets[0]
+        actual = openpyxl.load_workbook(io.BytesIO(generate_excel_stream(groups, template, '薬局<&>', '0141234567')),
+                                        rich_text=True).worksheets[0]
+
+        assert actual.tables['調剤請求'].ref == expected.tables['調剤請求'].ref == f'A10:M{10 + len(groups)}'
+        assert actual.max_row == expected.max_row
+        for expected_row, actual_row in zip(expected.iter_rows(min_row=10), actual.iter_rows(min_row=10)):
+            for e, a in zip(expected_row, actual_row):
+                assert (e.value or None) == (a.value or None) or str(e.value) == str(a.value), e.coordinate
+                assert e.number_format == a.number_format, e.coordinate
+                if e.row <= 510:
+                    assert repr(e.font) == repr(a.font) and repr(e.border) == repr(a.border), e.coordinate
+
+    def test_stream_adds_missing_number_format(self, sample_dir, tmp_path):
+        workbook = openpyxl.load_workbook(io.BytesIO(load_template_bytes()))
+        workbook.worksheets[0]['C11'].number_format = 'General'
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+
+        rows, _ = read_csv_file(sample_dir / 'test_data_20250201_sjis.csv')
+        groups = group_patients_by_recipient(filter_patients(rows, 1)['target'])
+        data = generate_excel_stream(groups, buffer.getvalue(), 'テスト薬局', '0141234567')
+        worksheet = openpyxl.load_workbook(io.BytesIO(data)).worksheets[0]
+        assert worksheet['C11'].number_format == '00000000'
+        assert worksheet['C12'].number_format == '00000000'
+
+    def test_stream_dimension_follows_template(self, sample_dir):
+        rows, _ = read_csv_file(sample_dir / 'test_data_20250201_sjis.csv')
+        groups = group_patients_by_recipient(filter_patients(rows, 1)['target'])
+
+        def dimension(template):
+            with zipfile.ZipFile(io.BytesIO(generate_excel_stream(groups, template, 'テスト薬局', '0141234567'))) as z:
+                return re.search(r'<dimension ref="([^"]+)"', z.read('xl/worksheets/sheet1.xml').decode()).group(1)
+
+        assert dimension(load_template_bytes()) == 'A1:N510'
+        # N列より右に列があり、dimension が実際の範囲と異なるテンプレート（openpyxlで保存）
+        workbook = openpyxl.load_workbook(io.BytesIO(load_template_bytes()))
+        workbook.worksheets[0]['R3'] = '備考'
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        stale = io.BytesIO()
+        with zipfile.ZipFile(buffer) as source, zipfile.ZipFile(stale, 'w') as target:
+            for name in source.namelist():
+                data = source.read(name)
+                if name == 'xl/worksheets/sheet1.xml':
+                    data = re.sub(rb'<dimension ref="[^"]*"', b'<dimension ref="A1:B2"', data)
+                target.writestr(name, data)
+        assert dimension(stale.getvalue()) == 'A1:R510'
+
+    def test_template_form_parsed_once(self, sample_dir, monkeypatch):
+        template = load_template_bytes()
+        form = load_template_form(template)
+        assert load_template_form(template) is form
+        assert form.sheet_path not in {part.filename for part in form.parts}
+        assert '<col min="1" max="1" width="12"' in form.head
+        with pytest.raises(TypeError):
+            form.layouts[11] = None
+
+        # 2件目以降はテンプレートを解析し直さない（ZipFile を開かない）
+        rows, _ = read_csv_file(sample_dir / 'test_data_20250201_sjis.csv')
+        groups = group_patients_by_recipient(filter_patients(rows, 1)['target'])
+        first = generate_excel_stream(groups, template, 'テスト薬局', '0141234567')
+        monkeypatch.setattr(xlsx_stream, '_Template', None)
+        second = generate_excel_stream(groups, template, 'テスト薬局', '0141234567')
+        with zipfile.ZipFile(io.BytesIO(first)) as a, zipfile.ZipFile(io.BytesIO(second)) as b:
+            assert a.namelist() == b.namelist()
+            assert all(a.read(name) == b.read(name) for name in a.namelist())
+
+        # 保持するテンプレートの数は上限まで
+        load_template_form.cache_clear()
+        monkeypatch.setattr(xlsx_stream, 'parse_template_form', lambda data: object())
+        for index in range(xlsx_stream.FORM_CACHE_SIZE + 5):
+            load_template_form(template + bytes([index]))
+        assert load_template_form.cache_info().currsize == xlsx_stream.FORM_CACHE_SIZE
+
+
+class TestPdfWriter:
+    def test_formats_match_excel_cells(self):
+        assert format_wareki(datetime(2025, 2, 15)) == 'R07.02.15'
+        assert format_wareki(datetime(2019, 4, 30)) == 'H31.04.30'
+        assert format_wareki(datetime(1950, 1, 2)) == 'S25.01.02'
+        values = [1, 'A店', 1234567, '病院', 0, 123, '旭川 太郎', 'アサヒカワ タロウ',
+                  datetime(1950, 1, 2), datetime(2025, 2, 3), '◯', '', '']
+        assert format_row_values(values)[:6] == ['1', 'A店', '01234567', '病院', '00000000', '0000123']
+
+    def test_pages_and_cached_font(self, sample_dir, monkeypatch):
+        rows, _ = read_csv_file(sample_dir / 'test_data_20250201_sjis.csv')
+        grouped = group_patients_by_recipient(filter_patients(rows, 1)['target'])
+        layout = load_layout()
+        assert layout.headers[0] == '番号' and layout.headers[-1] == '難病' and len(layout.column_x) == 14
+
+        from reportlab.pdfbase import pdfmetrics
+        register = pdfmetrics.registerFont
+        registered = []
+        monkeypatch.setattr(pdfmetrics, 'registerFont', lambda font: (registered.append(font), register(font)))
+        monkeypatch.setattr('invoice_batch.pdf_writer._registered_fonts', {})
+        first_rows, next_rows = rows_per_page(layout)
+        for count, pages in ((len(grouped), 1), (first_rows + next_rows + 1, 3)):
+            groups = (grouped * count)[:count]
+            data = generate_pdf(groups, 'A店', '0112345')
+            assert data.startswith(b'%PDF') and data.count(b'/Type /Page\n') == pages
+        # 日本語フォントの登録はプロセス内で1回のみ
+        assert [font.fontName for font in registered].count('HeiseiKakuGo-W5') == 1
+
+
+class TestIncremental:
+    def test_daily_appends_match_full_run(self, tmp_path):
+        lines = [format_row(row) for row in generate_rows(900, seed=7)]
+        csv_path = tmp_path / 'daily.csv'
+        state = MonthState(tmp_path / 'state' / 'daily.sqlite3')
+
+        modes = []
+        for end in (300, 650, len(lines), len(lines)):
+            csv_path.write_bytes(('\n'.join(lines[:end]) + '\n').encode('cp932'))
+            modes.append(state.update(csv_path)['mode'])
+        assert modes == ['rescan', 'append', 'append', 'unchanged']
+
+        # 作り直されたCSV（出力日・連番が変わる）は処理済みの行を除外して追加分のみ処理
+        rebuilt = [line.replace("'2026/01/20'", "'2026/02/01'") for line in reversed(lines)]
+        extra = format_row(next(row for row in generate_rows(5, seed=99) if row[0] != 'H' and row[0] != '項目解析結果'))
+        csv_path.write_bytes(('\n'.join(rebuilt + [extra]) + '\n').encode('cp932'))
+        result = state.update(csv_path)
+        assert result['mode'] == 'rescan' and result['new_rows'] == 1
+
+        rows, _ = read_csv_file(csv_path)
+        full = group_patients_by_recipient(filter_patients(rows, 1)['target'])
+        incremental = group_patients_by_recipient(state.patients()['target'])
+        state.close()
+
+        def summary(groups):
+            return sorted((g['year_month'], g['records'][0].patient_name, g['records'][0].recipient_number,
+                           g['records'][0].medical_code, tuple(sorted(g['treatment_dates']))) for g in groups)
+
+        assert summary(incremental) == summary(full)
+
+    def test_edited_and_identical_rows_match_full_run(self, sample_dir, tmp_path):
+        lines = (sample_dir / 'test_data_20250201_utf8.csv').read_text(encoding='utf-8-sig').splitlines()
+        csv_path = tmp_path / 'store.csv'
+        state = MonthState(tmp_path / 'state' / 'store.sqlite3')
+
+        def check(expected_mode):
+            result = state.update(csv_path)
+            rows, _ = read_csv_file(csv_path)
+            full = filter_patients(rows, 1)
+            incremental = state.patients()
+            assert result['mode'] == expected_mode
+            assert incremental['total'] == full['total']
+            assert ([make_processed_key(p) for p in incremental['target']]
+                    == [make_processed_key(p) for p in full['target']])
+            return result
+
+        # 同じ内容の行が2件ある場合も行数はCSVと一致
+        csv_path.write_text('\n'.join(lines + [lines[1]]) + '\n', encoding='utf-8')
+        check('rescan')
+        csv_path.write_text('\n'.join(lines + [lines[1], lines[1]]) + '\n', encoding='utf-8')
+        assert check('append')['new_rows'] == 1
+
+        # 氏名を訂正して出力し直したCSVは訂正前の患者を削除
+        edited = [lines[0], lines[1].replace('佐藤 花子', '佐藤 花代')] + lines[2:] + [lines[1]]
+        csv_path.write_text('\n'.join(edited) + '\n', encoding='utf-8')
+        result = check('rescan')
+        assert (result['new_rows'], result['new_targets'], result['removed_rows']) == (1, 1, 2)
+        state.close()
+
+    def test_batch_state_dir(self, sample_dir, tmp_path):
+        csv_dir = tmp_path / 'csv'
+        csv_dir.mkdir()
+        shutil.copy(sample_dir / 'test_data_20250201_sjis.csv', csv_dir / 'store.csv')
+
+        first = run_batch(csv_dir, tmp_path / 'out', 1, workers=1, state_dir=tmp_path / 'state')[0]
+        second = run_batch(csv_dir, tmp_path / 'out', 1, workers=1, state_dir=tmp_path / 'state')[0]
+        full = run_batch(csv_dir, tmp_path / 'full', 1, workers=1)[0]
+
+        assert first['incremental']['mode'] == 'rescan'
+        assert second['incremental'] == {'mode': 'unchanged', 'new_rows': 0, 'new_targets': 0, 'removed_rows': 0}
+        assert first['rows'] == second['rows'] == full['rows'] == 6
+        assert second['processed_keys'] == full['processed_keys']
+
+
+class TestProcessedKeyStore:
+    def test_partition_and_retention(self, tmp_path):
+        assert split_processed_key('2025020_656a3235_412901') == ('202502', '412901')
+        assert split_processed_key('2025/02_656a3235_412901') == ('202502', '412901')
+
+        with ProcessedKeyStore(tmp_path / 'keys.db') as store:
+            keys = ['2024110_a_1', '2025010_b_1', '2025020_c_1', '2025020_d_2', '_e_1']
+            assert store.add_keys(keys) == 5
+            assert store.add_keys(keys[:2]) == 0
+            assert '2025020_c_1' in store and '2025020_x_1' not in store
+            assert store.keys_for_month('202502', '1') == {'2025020_c_1'}
+            assert store.months() == ['', '202411', '202501', '202502']
+
+            assert store.prune(2) == 1
+            assert set(store.keys_for_month('202411')) == set()
+            assert len(store) == 4
+
+    def test_second_batch_uses_sqlite_store(self, sample_dir, tmp_path):
+        csv_dir = tmp_path / 'csv'
+        csv_dir.mkdir()
+        shutil.copy(sample_dir / 'test_data_20250201_sjis.csv', csv_dir)
+        legacy = tmp_path / 'processed-keys.json'
+        legacy.write_text(json.dumps(['2025010_old_1']), encoding='utf-8')
+        db_path = tmp_path / 'processed-keys.db'
+
+        common = [str(csv_dir), '-o', str(tmp_path / 'out'), '--processed-keys', str(db_path), '-j', '1']
+        assert batch_main(common + ['--import-keys', str(legacy)]) == 0
+        with ProcessedKeyStore(db_path) as store:
+            assert len(store) == 7
+
+        results = run_batch(csv_dir, tmp_path / 'out2', 2, processed_keys=ProcessedKeyStore(db_path), workers=1)
+        assert results[0]['duplicate'] == 6
+        assert results[0]['included'] == 0
+
+    def test_reconcile_migrates_legacy_store(self, tmp_path):
+        db_path = tmp_path / 'legacy.db'
+        conn = sqlite3.connect(str(db_path))
+        conn.executescript(
+            'CREATE TABLE processed_keys (key TEXT PRIMARY KEY, year_month TEXT NOT NULL, '
+            'medical_code TEXT NOT NULL, created_at TEXT NOT NULL) WITHOUT ROWID;'
+            "INSERT INTO processed_keys VALUES ('2025020_a_1', '202502', '1', '2025-03-01T00:00:00');"
+            "INSERT INTO processed_keys VALUES ('2025010_b_2', '202501', '2', '2025-02-01T00:00:00');")
+        conn.close()
+
+        keys = ['2025020_a_1', '2025020_a_3', '2025010_a_1', '2025010_b_2', '_c_1']
+        expected = [BILLED, AMBIGUOUS, UNBILLED, BILLED, AMBIGUOUS]
+        with ProcessedKeyStore(db_path) as store:
+            assert store.reconcile(keys) == expected
+            store.add_keys(['2025010_a_4'])
+            assert store.reconcile(keys[2:3]) == [AMBIGUOUS]
+        assert reconcile_keys(keys, {'2025020_a_1', '2025010_b_2'}) == expected
+
+    def test_previous_month_late_claims(self, sample_dir, tmp_path):
+        csv_dir = tmp_path / 'csv'
+        previous_dir = tmp_path / 'previous'
+        csv_dir.mkdir()
+        previous_dir.mkdir()
+        shutil.copy(sample_dir / 'test_data_20250201_sjis.csv', csv_dir / 'store.csv')
+        # 前月分（2025年1月）のCSV
+        data = (sample_dir / 'test_data_20250201_sjis.csv').read_bytes()
+        (previous_dir / 'store.csv').write_bytes(data.replace(b'202502', b'202501').replace(b'2025/02', b'2025/01'))
+        db_path = tmp_path / 'processed-keys.db'
+        current = process_csv_file(csv_dir / 'store.csv', tmp_path / 'current', 1)
+
+        # 未請求の前月分はすべて月遅れ請求として当月分の後に追加
+        first = run_batch(csv_dir, tmp_path / 'out', 1, processed_keys=ProcessedKeyStore(db_path),
+                          workers=1, previous_dir=previous_dir)[0]
+        assert first['previous']['duplicate'] == 0
+        assert first['previous']['unbilled'] + first['previous']['ambiguous'] == first['previous']['asahikawa']
+        assert first['included'] == first['target'] + first['previous']['asahikawa']
+        # ファイル名は当月分の調剤年月
+        assert Path(first['output']).name == Path(current['output']).name
+        assert first['processed_keys'][:len(current['processed_keys'])] == current['processed_keys']
+        worksheet = openpyxl.load_workbook(first['output']).worksheets[0]
+        months = [row[9].strftime('%Y%m') for row in worksheet.iter_rows(min_row=TABLE_DATA_START_ROW, values_only=True)
+                  if isinstance(row[9], datetime)]
+        assert months == ['202502'] * current['rows'] + ['202501'] * (first['rows'] - current['rows'])
+
+        with ProcessedKeyStore(db_path) as store:
+            store.add_keys(first['processed_keys'])
+        second = run_batch(csv_dir, tmp_path / 'out2', 2, processed_keys=ProcessedKeyStore(db_path),
+                           workers=1, previous_dir=previous_dir)[0]
+        assert second['previous']['duplicate'] == second['previous']['asahikawa']
+        assert second['included'] == 0
+
+
+class TestBatch:
+    def test_run_batch(self, sample_dir, tmp_path):
+        csv_dir = tmp_path / 'csv'
+        csv_dir.mkdir()
+        for name in ('test_data_20250201_sjis.csv', 'test_data_20250201_utf8.csv'):
+            shutil.copy(sample_dir / name, csv_dir / name)
+        (csv_dir / 'broken.csv').write_bytes(b'\x00\x01')
+
+        results = run_batch(csv_dir, tmp_path / 'out', 1,
+                            stores={'test_data_20250201_sjis.csv': {'pharmacy_name': 'A店', 'medical_code': '1'}},
+                            workers=2)
+
+        assert [r['csv'] for r in results] == ['broken.csv', 'test_data_20250201_sjis.csv',
+                                               'test_data_20250201_utf8.csv']
+        assert results[0]['rows'] == 0
+        assert results[1]['rows'] == results[2]['rows'] == 6
+        assert results[1]['output'].endswith('_A店_1回目.xlsx')
+        assert len(results[1]['processed_keys']) == 6
+        json.dumps(results)
+
+    def test_profile_report(self, sample_dir, tmp_path):
+        # 計測時のストリーム読み込み（チャンクごとにデコード）も同じ行を返す
+        for name in ('test_data_20250202_sjis.csv', 'test_data_20250202_utf8.csv'):
+            profiler = Profiler()
+            stream, _ = stream_csv_file(sample_dir / name, chunk_size=64, profiler=profiler)
+            assert list(stream) == read_csv_file(sample_dir / name)[0]
+            assert profiler.counters['bytes_read'] == (sample_dir / name).stat().st_size
+            assert profiler.calls['decode'] > 1 and not profiler._stack
+
+        csv_dir = tmp_path / 'csv'
+        csv_dir.mkdir()
+        shutil.copy(sample_dir / 'test_data_20250201_sjis.csv', csv_dir / 'a.csv')
+        report_path = tmp_path / 'profile' / 'run.json'
+        assert batch_main([str(csv_dir), '-o', str(tmp_path / 'out'), '-j', '1',
+                           '--key-format', FINGERPRINT_KEY_FORMAT, '--profile', str(report_path), '--pdf']) == 0
+
+        report = json.loads(report_path.read_text(encoding='utf-8'))
+        assert [f['csv'] for f in report['files']] == ['a.csv']
+        profile = report['files'][0]
+        assert set(STAGES) <= set(profile['stages'])
+        assert all(profile['stages'][stage]['calls'] > 0 for stage in STAGES)
+        assert profile['counters']['rows_written'] == 6
+        assert profile['counters']['bytes_read'] == profile['counters']['input_bytes']
+        assert report['totals']['counters'] == profile['counters']
+        assert report['options']['key_format'] == FINGERPRINT_KEY_FORMAT
+        assert profile['stages']['pdf']['calls'] == 1
+
+        # 計測しない場合は結果に含めない
+        result = run_batch(csv_dir, tmp_path / 'out', 1, workers=1)[0]
+        assert 'profile' not in result
+
+    def test_parse_cache_reused_across_batches(self, sample_dir, tmp_path, monkeypatch):
+        csv_dir = tmp_path / 'csv'
+        previous_dir = tmp_path / 'previous'
+        csv_dir.mkdir()
+        previous_dir.mkdir()
+        shutil.copy(sample_dir / 'test_data_20250202_sjis.csv', csv_dir / 'store.csv')
+        shutil.copy(sample_dir / 'test_data_20250202_sjis.csv', previous_dir / 'store.csv')
+        cache = ParseCache(tmp_path / 'cache')
+
+        expected = process_csv_file(csv_dir / 'store.csv', tmp_path / 'plain', 1)
+        first = process_csv_file(csv_dir / 'store.csv', tmp_path / 'out1', 1, parse_cache=cache)
+        assert first['parse_cache'] == 'miss' and len(list(cache.cache_dir.iterdir())) == 1
+        assert first['processed_keys'] == expected['processed_keys']
+
+        # 2回目請求・前月分CSV（内容が同じ）はCSVを読まずに保存済みの解析結果を使う
+        def fail(*args, **kwargs):
+            raise AssertionError('CSVを解析しました')
+        monkeypatch.setattr('invoice_batch.batch.stream_csv_file', fail)
+        keys = set(first['processed_keys'])
+        second = process_csv_file(csv_dir / 'store.csv', tmp_path / 'out2', 2, processed_keys=keys,
+                                  previous_dir=previous_dir, parse_cache=cache)
+        assert second['parse_cache'] == 'hit'
+        assert (second['total'], second['target'], second['duplicate']) == (expected['total'], expected['target'],
+                                                                             expected['target'])
+        assert second['previous']['duplicate'] == second['previous']['asahikawa'] == expected['target']
+
+        parsed = cache.load(cache.key(csv_dir / 'store.csv', 'ansi-first'))
+        records, _ = read_csv_file(csv_dir / 'store.csv')
+        assert [p.as_dict() for p in parsed.patients] == \
+            [p.as_dict() for p in filter_patients(records, 1)['asahikawa']]
+        assert parsed.dates['birth_date'] == {p.birth_date: parse_japanese_date(p.birth_date) for p in parsed.patients}
+
+        # 読み込んだ解析済みの日付を使い、グループ化・Excelの行作成で日付を解析しない
+        default_parser.clear()
+        parsed = cache.load(cache.key(csv_dir / 'store.csv', 'ansi-first'))
+        groups = group_patients_by_recipient(parsed.patients)
+        for index, group in enumerate(groups):
+            build_row_values(index, group, 'テスト薬局', '0141234567')
+        assert groups and all(stats['misses'] == 0 for stats in default_parser.stats().values())
+
+        # 壊れたキャッシュは削除して解析し直す
+        cache_file = next(cache.cache_dir.iterdir())
+        cache_file.write_bytes(cache_file.read_bytes()[:-3])
+        assert cache.load(cache.key(csv_dir / 'store.csv', 'ansi-first')) is None
+        assert not cache_file.exists()
+
+    def test_parse_cache_evicts_least_recently_used(self, tmp_path):
+        parsed = ParsedCSV('ANSI', 1, [create_patient_data(['R1'] + [''] * 64)])
+        cache = ParseCache(tmp_path / 'cache', max_bytes=len(encode_parsed(parsed)) * 2)
+        paths = [tmp_path / f'{i}.csv' for i in range(3)]
+        keys = []
+        for i, path in enumerate(paths[:2]):
+            path.write_text(f'R{i}\n')
+            keys.append(cache.key(path, 'ansi-first'))
+            assert cache.store(path, keys[-1], parsed)
+            os.utime(cache.path(keys[-1]), ns=(i + 1, i + 1))
+
+        # 読み込んだものは最後に使用した日時が更新され、上限を超えた時点で最も古いものが削除される
+        assert cache.load(keys[0]).patients[0].is_asahikawa
+        paths[2].write_text('R2\n')
+        keys.append(cache.key(paths[2], 'ansi-first'))
+        assert cache.store(paths[2], keys[-1], parsed)
+        assert [cache.path(key).exists() for key in keys] == [True, False, True]
+
+
+def _flaky_processor(csv_path, *args):
+    """受付処理のテスト用（壊れたCSV・時間のかかるCSVを再現）"""
+    name = Path(csv_path).name
+    if name == 'corrupt.csv':
+        raise ValueError('壊れたCSV')
+    if name == 'slow.csv':
+        time.sleep(2)
+    return process_csv_file(csv_path, *args)
+
+
+def _slow_renderer(csv_bytes, batch_number, pharmacy_name, *args):
+    """請求書作成サービスのテスト用（タイムアウトより長くかかる処理を再現）"""
+    if pharmacy_name == '遅い店':
+        time.sleep(2)
+    return render_invoice(csv_bytes, batch_number, pharmacy_name, *args)
+
+
+class TestIngest:
+    def test_watcher_waits_until_settled(self, tmp_path):
+        now = [0.0]
+        watcher = DropFolderWatcher(tmp_path, settle_seconds=5, clock=lambda: now[0])
+        csv_path = tmp_path / 'a.csv'
+        csv_path.write_bytes(b'abc')
+        (tmp_path / '~$a.csv').write_bytes(b'')
+        (tmp_path / 'b.csv.tmp').write_bytes(b'')
+        assert watcher.scan() == []
+
+        # 書き込み途中（サイズが変わった）場合は待ち直す
+        now[0] = 4
+        with open(csv_path, 'ab') as f:
+            f.write(b'def')
+        assert watcher.scan() == []
+        now[0] = 8
+        assert watcher.scan() == []
+        now[0] = 9.5
+        assert watcher.scan() == [csv_path]
+        # 同じファイルは1回だけ
+        now[0] = 20
+        assert watcher.scan() == []
+
+    def test_slow_and_corrupt_files_do_not_block(self, sample_dir, tmp_path):
+        drop_dir = tmp_path / 'drop'
+        drop_dir.mkdir()
+        for name in ('slow.csv', 'a.csv', 'b.csv'):
+            shutil.copy(sample_dir / 'test_data_20250201_sjis.csv', drop_dir / name)
+        (drop_dir / 'corrupt.csv').write_bytes(b'\x00\x01')
+        # 前回の実行で処理途中だったCSVも再開する
+        (drop_dir / '.processing').mkdir()
+        shutil.copy(sample_dir / 'test_data_20250201_utf8.csv', drop_dir / '.processing' / 'c.csv')
+        keys_path = tmp_path / 'keys.json'
+
+        daemon = IngestDaemon(drop_dir, tmp_path / 'out', 1, processed_keys_path=keys_path, workers=2,
+                              queue_size=1, settle_seconds=0, poll_seconds=0.05, timeout=0.5,
+                              processor=_flaky_processor, log=lambda message: None)
+        counts = asyncio.run(daemon.run(once=True))
+        assert counts[DONE] == 3 and counts[FAILED] == 1 and counts[TIMEOUT] == 1
+
+        manifest = json.loads((tmp_path / 'out' / 'manifest.json').read_text(encoding='utf-8'))
+        assert manifest['counts'] == counts
+        jobs = {job['csv']: job for job in manifest['files']}
+        assert jobs['c.csv']['status'] == jobs['a.csv']['status'] == jobs['b.csv']['status'] == DONE
+        assert jobs['a.csv']['rows'] == 6 and Path(jobs['a.csv']['output']).exists()
+        assert jobs['corrupt.csv']['error'] == 'ValueError: 壊れたCSV'
+        assert jobs['slow.csv']['status'] == TIMEOUT
+        assert sorted(p.name.split('_', 1)[1] for p in (drop_dir / 'processed').iterdir()) == ['a.csv', 'b.csv', 'c.csv']
+        assert sorted(p.name.split('_', 1)[1] for p in (drop_dir / 'failed').iterdir()) == ['corrupt.csv', 'slow.csv']
+        assert not list(drop_dir.glob('*.csv')) and not list((drop_dir / '.processing').iterdir())
+        # 1回目請求の処理済みキーはCSVごとに保存される
+        assert len(json.loads(keys_path.read_text(encoding='utf-8'))) == 6
+
+
+class TestService:
+    def _post(self, url, body, content_type='text/csv'):
+        request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, dict(response.headers), response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, dict(e.headers), e.read()
+
+    def test_multipart_fields(self):
+        body = (b'--b\r\nContent-Disposition: form-data; name="pharmacy_name"\r\n\r\n'
+                + 'A店'.encode('utf-8') + b'\r\n--b\r\nContent-Disposition: form-data; name="file"; filename="a.csv"\r\n'
+                b'Content-Type: text/csv\r\n\r\nx,y\r\n1,2\r\n\r\n--b--\r\n')
+        fields = parse_multipart('multipart/form-data; boundary=b', body)
+        assert fields['pharmacy_name'] == (None, 'A店'.encode('utf-8'))
+        assert fields['file'] == ('a.csv', b'x,y\r\n1,2\r\n')
+        assert is_loopback('127.0.0.1') and is_loopback('::1') and is_loopback('localhost')
+        assert not is_loopback('0.0.0.0') and not is_loopback('192.168.1.10')
+
+    def test_upload_returns_workbook_and_stats(self, sample_dir, tmp_path):
+        keys_path = tmp_path / 'keys.json'
+        service = InvoiceService(workers=1, processed_keys_path=keys_path)
+        server = InvoiceServer(service, '127.0.0.1', 0, log=None)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+        csv_bytes = (sample_dir / 'test_data_20250201_sjis.csv').read_bytes()
+        try:
+            body = (b'--b\r\nContent-Disposition: form-data; name="pharmacy_name"\r\n\r\n' + 'A店'.encode('utf-8')
+                    + b'\r\n--b\r\nContent-Disposition: form-data; name="file"; filename="a.csv"\r\n\r\n'
+                    + csv_bytes + b'\r\n--b--\r\n')
+            status, headers, data = self._post(url + '/invoice', body, 'multipart/form-data; boundary=b')
+            assert status == 200
+            stats = json.loads(headers['X-Invoice-Stats'])
+            assert (stats['total'], stats['target'], stats['rows'], stats['processed_keys']) == (8, 6, 6, 6)
+            assert stats['file_name'].endswith('_A店_1回目.xlsx')
+            sheet = openpyxl.load_workbook(io.BytesIO(data)).worksheets[0]
+            assert sheet.cell(row=11, column=2).value == 'A店'
+            assert len(json.loads(keys_path.read_text(encoding='utf-8'))) == 6
+
+            # 1回目で保存した処理済みキーは、再起動しなくても2回目請求の照合に使われる
+            # （全員が請求済みの場合は請求書を作成しない）
+            status, _, data = self._post(url + '/invoice?batch=2', csv_bytes)
+            assert status == 422 and json.loads(data)['duplicate'] == 6
+            status, _, data = self._post(url + '/invoice?batch=2&format=json',
+                                         (sample_dir / 'test_data_20250202_sjis.csv').read_bytes())
+            result = json.loads(data)
+            assert status == 200 and result['rows'] > 0
+            assert openpyxl.load_workbook(io.BytesIO(base64.b64decode(result['xlsx'])))
+
+            assert self._post(url + '/invoice?batch=3', csv_bytes)[0] == 400
+            assert self._post(url + '/invoice', b'x,y\n1,2\n')[0] == 422
+            with urllib.request.urlopen(url + '/health') as response:
+                assert json.load(response)['completed'] == 4
+        finally:
+            server.shutdown()
+            server.server_close()
+            service.close()
+
+        with pytest.raises(ValueError):
+            InvoiceServer(service, '0.0.0.0', 0)
+
+    def test_timed_out_job_holds_its_slot_until_finished(self, sample_dir):
+        service = InvoiceService(workers=1, timeout=0.5, max_pending=1, renderer=_slow_renderer)
+        csv_bytes = (sample_dir / 'test_data_20250201_sjis.csv').read_bytes()
+        try:
+            with pytest.raises(RequestError) as error:
+                service.create_invoice(csv_bytes, 2, '遅い店', '')
+            assert error.value.status == 504
+            # タイムアウト後もワーカーは処理中のため、処理中として数え、新しいCSVは受け付けない
+            assert service.active == 1
+            with pytest.raises(RequestError) as error:
+                service.create_invoice(csv_bytes, 2, 'A店', '')
+            assert error.value.status == 503
+
+            deadline = time.monotonic() + 10
+            while service.active and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert service.active == 0
+            stats, data = service.create_invoice(csv_bytes, 2, 'A店', '')
+            assert stats['rows'] == 6 and data
+            assert service.active == 0 and service.completed == 1
+        finally:
+            service.close()
+
+
+class TestSyntheticData:
+    def test_generated_csv_round_trips(self, tmp_path):
+        results = []
+        for encoding in ('cp932', 'utf-8', 'utf-8-sig'):
+            path = write_hr_csv(tmp_path / f'{encoding}.csv', 1200, encoding, seed=3)
+            assert detect_file_encoding(path).codec == encoding
+            rows, _ = read_csv_file(path)
+            result = filter_patients(rows, 1)
+            assert result['total'] == 1200
+            results.append(result)
+
+        target = results[0]['target']
+        assert 0 < len(target) < 1200
+        assert [p.patient_kana for p in target] == [p.patient_kana for p in results[1]['target']]
+        assert all(isinstance(parse_japanese_date(p.birth_date), datetime) for p in target)
+        assert all(' ' in p.patient_kana and not any('ｦ' <= c <= 'ﾟ' for c in p.patient_kana) for p in target)
+        assert group_patients_by_recipient(target)
@@ -0,0 +1,196 @@
+"""
+VBAモジュール インポート バッチモード（tool/vba_import_batch.py）のテスト
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from vba_import_batch import (ComImportBackend, ImportBackend, StubImportBackend, classify_encoding, main,
+                              run_batch_import)
+
+UTF8_MODULE = 'Attribute VB_Name = "{name}"\n\' 旭川市の請求書\nSub Hello()\nEnd Sub\n'
+SJIS_MODULE = 'Attribute VB_Name = "{name}"\r\n\' 調剤券\r\nSub Hello()\r\nEnd Sub\r\n'
+# CSVの文字化け判定に該当する文字（「???」「□」）をコメントに含むモジュール
+QUESTION_MODULE = 'Attribute VB_Name = "Confirm"\r\n\' 削除しますか???\r\nSub Hello()\r\nEnd Sub\r\n'
+SQUARE_MODULE = 'Attribute VB_Name = "Square"\r\n\' □ 未チェックの項目\r\nSub Hello()\r\nEnd Sub\r\n'
+
+
+def make_project(tmp_path, modules):
+    modules_dir = tmp_path / 'modules'
+    modules_dir.mkdir()
+    for name, (text, encoding) in modules.items():
+        (modules_dir / name).write_bytes(text.format(name=name[:-4]).encode(encoding))
+    (tmp_path / 'book.xlsm').write_bytes(b'PK')
+    config_path = tmp_path / 'vba_import_config.json'
+    config_path.write_text(json.dumps({
+        'workbook': 'book.xlsm',
+        'modules': list(modules) + ['Missing.bas'],
+        'auto_backup': False,
+        'modules_dir': 'modules',
+    }), encoding='utf-8')
+    return config_path
+
+
+class FakeComponent:
+    def __init__(self, name):
+        self.Name = name
+
+
+class FakeComponents:
+    """VBProject.VBComponents の代わり（列挙した要素数を数える）"""
+
+    def __init__(self, names):
+        self.items = [FakeComponent(name) for name in names]
+        self.iterated = 0
+
+    def __iter__(self):
+        for item in self.items:
+            self.iterated += 1
+            yield item
+
+    def Remove(self, component):
+        self.items.remove(component)
+
+    def Import(self, path):
+        component = FakeComponent(Path(path).stem)
+        self.items.append(component)
+        return component
+
+
+class FakeWorkbook:
+    def __init__(self, names):
+        self.VBProject = type('VBProject', (), {'VBComponents': FakeComponents(names)})()
+        self.closed = None
+
+    def Close(self, SaveChanges):
+        self.closed = SaveChanges
+
+
+class FakeExcel:
+    def __init__(self):
+        self.DisplayAlerts = False
+        self.quit = False
+
+    def Quit(self):
+        self.quit = True
+
+
+class TestBatchImport:
+    def test_classify_encoding(self):
+        for text in (UTF8_MODULE.format(name='Module1'), QUESTION_MODULE, SQUARE_MODULE):
+            assert classify_encoding(text.encode('utf-8')) == 'UTF-8'
+            assert classify_encoding(b'\xef\xbb\xbf' + text.encode('utf-8')) == 'UTF-8'
+            assert classify_encoding(text.encode('cp932')) == 'Shift-JIS'
+        assert classify_encoding(b'\xff\xfe\x00\x80') == 'Unknown'
+
+    def test_gui_stages_utf8_module_as_shift_jis(self, tmp_path):
+        pytest.importorskip('tkinterdnd2')
+        pytest.importorskip('chardet')
+        from vba_import_gui_v2 import VBAImportGUI
+
+        # ウィンドウを作らずに判定・変換のみ実行
+        gui = VBAImportGUI.__new__(VBAImportGUI)
+        gui.log = lambda message, level='INFO': None
+        gui.staging_dir = tmp_path / 'staging'
+        gui.staging_dir.mkdir()
+        gui.staged_paths = {}
+        source = tmp_path / 'Confirm.bas'
+        data = QUESTION_MODULE.encode('utf-8')
+        source.write_bytes(data)
+        gui.bas_data = {source: data}
+
+        encoding = gui.detect_encoding(data)
+        assert encoding == 'UTF-8'
+        staged, status = gui.stage_file(source, encoding)
+        assert status == '変換完了'
+        assert staged.read_bytes() == QUESTION_MODULE.encode('shift_jis')
+
+    def test_converts_into_staging_and_skips_unchanged(self, tmp_path):
+        config_path = make_project(tmp_path, {
+            'Utf8Module.bas': (UTF8_MODULE, 'utf-8'),
+            'SjisModule.bas': (SJIS_MODULE, 'cp932'),
+        })
+        source = tmp_path / 'modules' / 'Utf8Module.bas'
+        original = source.read_bytes()
+        logs = []
+
+        backend = StubImportBackend()
+        result = run_batch_import(config_path, backend, workers=2, log=lambda m, level: logs.append(level))
+        assert result['imported'] == ['Utf8Module.bas', 'SjisModule.bas']
+        assert result['missing'] == ['Missing.bas']
+        assert backend.saved
+        # 元のファイルは変更せず、ステージングフォルダのShift-JISファイルをインポート
+        assert source.read_bytes() == original
+        assert backend.imported['Utf8Module'] == original.decode('utf-8').encode('shift_jis')
+        assert backend.imported['SjisModule'] == (tmp_path / 'modules' / 'SjisModule.bas').read_bytes()
+
+        backend = StubImportBackend()
+        result = run_batch_import(config_path, backend, log=lambda m, level: None)
+        assert result['skipped'] == ['Utf8Module.bas', 'SjisModule.bas'] and backend.imported == {}
+
+        source.write_bytes(original + b"' changed\n")
+        backend = StubImportBackend()
+        result = run_batch_import(config_path, backend, log=lambda m, level: None)
+        assert result['imported'] == ['Utf8Module.bas'] and result['skipped'] == ['SjisModule.bas']
+
+        # ワークブックが前回の保存後に変更された場合は全モジュールをインポート
+        (tmp_path / 'book.xlsm').write_bytes(b'PK\x03\x04')
+        result = run_batch_import(config_path, StubImportBackend(), log=lambda m, level: None)
+        assert result['imported'] == ['Utf8Module.bas', 'SjisModule.bas']
+
+    def test_cli_with_stub_backend(self, tmp_path, capsys):
+        config_path = make_project(tmp_path, {'Utf8Module.bas': (UTF8_MODULE, 'utf-8')})
+        assert main(['--config', str(config_path), '--backend', 'stub', '-j', '4']) == 0
+        assert main(['--config', str(config_path), '--backend', 'stub']) == 0
+        output = capsys.readouterr().out
+        assert '完了: インポート 1 / スキップ 0' in output
+        assert '完了: インポート 0 / スキップ 1' in output
+
+    def test_com_backend_enumerates_components_once(self, tmp_path):
+        existing = [f'Module{i:03d}' for i in range(60)]
+        workbook = FakeWorkbook(['ThisWorkbook'] + existing)
+        components = workbook.VBProject.VBComponents
+        backend = ComImportBackend()
+        backend.attach(workbook)
+
+        replaced = [backend.import_module(tmp_path / f'{name}.bas') for name in existing + ['NewModule']]
+        assert replaced == [True] * len(existing) + [False]
+        # 既存モジュールの列挙は開いた時の1回のみ（モジュールごとに全件を走査しない）
+        assert components.iterated == len(existing) + 1
+        assert sorted(c.Name for c in components.items) == sorted(['ThisWorkbook', 'NewModule'] + existing)
+        # 同じモジュールを2回インポートしても重複しない
+        assert backend.import_module(tmp_path / 'NewModule.bas')
+        assert [c.Name for c in components.items].count('NewModule') == 1
+
+    def test_com_backend_quits_excel_it_started(self):
+        # バッチモード（非表示）: 起動したExcelはワークブックを閉じて終了
+        backend = ComImportBackend()
+        backend.excel, backend.started = FakeExcel(), True
+        workbook = FakeWorkbook([])
+        backend.attach(workbook)
+        excel = backend.excel
+        backend.close()
+        assert workbook.closed is False and excel.quit
+        assert backend.excel is None and not backend.started
+
+        # GUI版（表示）: Excelとワークブックは開いたまま
+        backend = ComImportBackend(visible=True)
+        backend.excel = FakeExcel()
+        workbook = FakeWorkbook([])
+        backend.attach(workbook)
+        excel = backend.excel
+        backend.close()
+        assert workbook.closed is None and not excel.quit and excel.DisplayAlerts
+
+    def test_backend_without_required_methods_cannot_be_created(self):
+        class NoSave(ImportBackend):
+            def open(self, workbook_path):
+                pass
+
+            def import_module(self, module_path):
+                return False
+
+        with pytest.raises(TypeError):
+            NoSave()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+VBAモジュール インポート バッチモード（GUIなし）
+
+vba_import_config.json に従って、GUI版（vba_import_gui_v2.py）と同じ
+エンコーディング判定 → Shift-JIS変換 → Excelへインポート を実行する。
+- 全モジュールの読み込み・判定・変換をスレッドプールで並列に実行
+- 前回インポートした時から内容（SHA-256）が変わっていないモジュールはスキップ
+- 変換後のファイルはステージングフォルダに書き出す（元の .bas ファイルは変更しない）
+- インポート処理はバックエンドとして差し替え可能（com: Excel COM / stub: 記録のみ、Linuxでの動作確認・計測用）
+
+使い方:
+python vba_import_batch.py --config vba_import_config.json
+python vba_import_batch.py --config vba_import_config.json --backend stub -j 8
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# 共通のエンコーディング定義（standalone-app/invoice_batch/encoding_detect.py）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'standalone-app'))
+from invoice_batch.encoding_detect import UTF8_BOM  # noqa: E402
+
+# ========================================
+# デフォルト設定
+# ========================================
+DEFAULT_CONFIG = {
+    "workbook": "許認可表書き差込保存マクロ20250829.xlsm",
+    "modules": [
+        "ExcelDocumentModule.bas",
+        "ExcelMappingModule.bas",
+        "ExcelLicenseRenewalController.bas",
+        "TemplateFileMapping.bas"
+    ],
+    "auto_backup": True,
+    "modules_dir": "modules"
+}
+
+# 前回インポートしたモジュールの内容ハッシュ（設定ファイルと同じフォルダ）
+STATE_FILE = '.vba_import_state.json'
+DEFAULT_STAGING_DIR = '.vba_import_staging'
+
+Log = Callable[[str, str], None]
+
+
+def print_log(message: str, level: str = "INFO"):
+    """ログ出力（GUI版と同じ [レベル] 形式）"""
+    print(f"[{level}] {message}", flush=True)
+
+
+class PreparedModule(NamedTuple):
+    """読み込み・変換済みのモジュール"""
+    name: str                # ファイル名（例: ExcelMappingModule.bas）
+    source: Path             # 元のファイル
+    staged: Optional[Path]   # インポートするファイル（ステージングフォルダ）
+    encoding: str            # 'UTF-8' / 'Shift-JIS' / 'Unknown'
+    digest: str              # 元のファイルの内容の SHA-256
+    status: str              # '変換完了' / '変換不要' / '未変換' / '変更なし' / '見つかりません' / '変換失敗'
+    error: str = ''
+
+
+def load_config(config_path) -> Dict:
+    """設定ファイルを読み込む（無い項目はデフォルト設定）"""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return {**DEFAULT_CONFIG, **config}
+
+
+def classify_encoding(data: bytes) -> str:
+    """
+    エンコーディング判定（GUI版の detect_encoding と同じ分類、読み込み済みのバイト列から）
+
+    UTF-8 → Shift-JIS の順に厳密にデコードできるかで判定する。CSV用の判定（encoding_detect）の
+    文字化け検出（「□」「?」の連続など）はVBAのコメントで正しく使われるため使わない。
+
+    Returns:
+        'UTF-8' / 'Shift-JIS' / 'Unknown'
+    """
+    if data.startswith(UTF8_BOM):
+        data = data[len(UTF8_BOM):]
+    for codec, encoding in (('utf-8', 'UTF-8'), ('shift_jis', 'Shift-JIS')):
+        try:
+            data.decode(codec)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    return 'Unknown'
+
+
+def stage_module(name: str, data: bytes, encoding: str, staging_dir: Path) -> Tuple[Path, str]:
+    """
+    読み込み済みのバイト列を変換し、ステージングフォルダに1回で書き出す
+
+    Returns:
+        (書き出したファイル, '変換完了' / '変換不要' / '未変換')
+    """
+    if encoding == 'UTF-8':
+        # UTF-8 → Shift-JIS（VBEのインポートはShift-JISのみ対応）
+        output = data.decode('utf-8-sig').encode('shift_jis', errors='replace')
+        status = '変換完了'
+    else:
+        output = data
+        status = '変換不要' if encoding == 'Shift-JIS' else '未変換'
+    staged = staging_dir / name
+    staged.write_bytes(output)
+    return staged, status
+
+
+def prepare_module(source: Path, staging_dir: Path, previous_digest: Optional[str] = None) -> PreparedModule:
+    """
+    モジュール1件を読み込み、判定・変換してステージングフォルダに書き出す
+
+    ファイルは1回だけ読み、判定・ハッシュ・変換はメモリ上のバイト列で行う。
+    内容ハッシュが previous_digest と同じ場合は判定・変換をせずに '変更なし' を返す。
+    """
+    try:
+        data = source.read_bytes()
+    except OSError as e:
+        return PreparedModule(source.name, source, None, 'Unknown', '', '見つかりません', str(e))
+
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == previous_digest:
+        return PreparedModule(source.name, source, None, '', digest, '変更なし')
+    encoding = classify_encoding(data)
+    try:
+        staged, status = stage_module(source.name, data, encoding, staging_dir)
+    except (OSError, UnicodeError) as e:
+        return PreparedModule(source.name, source, None, encoding, digest, '変換失敗', str(e))
+    return PreparedModule(source.name, source, staged, encoding, digest, status)
+
+
+def prepare_modules(sources: List[Path], staging_dir: Path, workers: Optional[int] = None,
+                    previous_digests: Optional[Dict[str, str]] = None) -> List[PreparedModule]:
+    """全モジュールを並列に読み込み・変換（結果は sources と同じ順）"""
+    previous_digests = previous_digests or {}
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            lambda source: prepare_module(source, staging_dir, previous_digests.get(source.name)), sources))
+
+
+# ========================================
+# インポートのバックエンド
+# ========================================
+class ImportBackend(ABC):
+    """Excelへのインポート処理（open → import_module × N → save → close）"""
+
+    @abstractmethod
+    def open(self, workbook_path: Path):
+        """ワークブックを開く"""
+
+    @abstractmethod
+    def import_module(self, module_path: Path) -> bool:
+        """
+        同じ名前の既存モジュールを削除してからインポート
+
+        Returns:
+            既存モジュールを置き換えたか
+        """
+
+    @abstractmethod
+    def save(self):
+        """ワークブックを保存"""
+
+    def close(self):
+        pass
+
+
+class ComImportBackend(ImportBackend):
+    """
+    Excel COM（Windows + pywin32）
+
+    visible=False（バッチモード）では専用のExcelを起動し、close() でワークブックを閉じてExcelを終了する
+    （非表示のExcelが残ってワークブックをロックしないように）。visible=True（GUI版）では
+    インポート結果を確認できるよう、close() 後もExcelとワークブックを開いたままにする。
+    """
+
+    def __init__(self, visible: bool = False):
+        self.visible = visible
+        self.excel = None
+        self.workbook = None
+        self.components = None
+        self.components_by_name = {}
+        # open() でExcelを起動したか（close() で終了する）
+        self.started = False
+
+    def open(self, workbook_path: Path):
+        import win32com.client as win32
+
+        if self.visible:
+            self.excel = win32.Dispatch("Excel.Application")
+        else:
+            # 起動中のExcelに接続せず、新しいExcelを起動する
+            self.excel = win32.DispatchEx("Excel.Application")
+            self.started = True
+        self.excel.Visible = self.visible
+        self.excel.DisplayAlerts = False
+        self.attach(self.excel.Workbooks.Open(str(workbook_path.absolute())))
+
+    def attach(self, workbook):
+        """開いたワークブックの既存モジュール名 → コンポーネントの対応表を作る（COMの列挙は1回のみ）"""
+        self.workbook = workbook
+        self.components = workbook.VBProject.VBComponents
+        self.components_by_name = {component.Name: component for component in self.components}
+
+    def import_module(self, module_path: Path) -> bool:
+        existing = self.components_by_name.pop(module_path.stem, None)
+        if existing is not None:
+            self.components.Remove(existing)
+        imported = self.components.Import(str(module_path.absolute()))
+        self.components_by_name[imported.Name] = imported
+        return existing is not None
+
+    def save(self):
+        self.workbook.Save()
+
+    def close(self):
+        if self.excel is not None:
+            try:
+                if self.started:
+                    if self.workbook is not None:
+                        self.workbook.Close(SaveChanges=False)
+                    self.excel.Quit()
+                else:
+                    self.excel.DisplayAlerts = True
+            finally:
+                self.started = False
+        self.excel = None
+        self.workbook = None
+        self.components = None
+        self.components_by_name = {}
+
+
+class StubImportBackend(ImportBackend):
+    """インポートした内容を記録するだけのバックエンド（COMの処理時間は delay 秒で模擬）"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.workbook_path = None
+        self.imported: Dict[str, bytes] = {}
+        self.saved = False
+
+    def open(self, workbook_path: Path):
+        self.workbook_path = workbook_path
+
+    def import_module(self, module_path: Path) -> bool:
+        if self.delay:
+            time.sleep(self.delay)
+        replaced = module_path.stem in self.imported
+        self.imported[module_path.stem] = module_path.read_bytes()
+        return replaced
+
+    def save(self):
+        self.saved = True
+
+
+BACKENDS = {
+    'com': ComImportBackend,
+    'stub': StubImportBackend,
+}
+
+
+# ========================================
+# インポート状態（内容ハッシュ）
+# ========================================
+def _workbook_signature(workbook_path: Path) -> List[int]:
+    stat = workbook_path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_state(state_path: Path, workbook_path: Path) -> Dict[str, str]:
+    """
+    前回インポートしたモジュールの内容ハッシュ
+
+    ワークブックが別のファイルに変わった場合・前回の保存後に変更された場合は空（全モジュールをインポート）。
+    """
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if state.get('workbook') != workbook_path.name or state.get('signature') != _workbook_signature(workbook_path):
+        return {}
+    return dict(state.get('modules', {}))
+
+
+def save_state(state_path: Path, workbook_path: Path, modules: Dict[str, str]):
+    """内容ハッシュを保存（ワークブックの保存後に呼ぶ。一時ファイルに書いてから置き換える）"""
+    state = {'workbook': workbook_path.name, 'signature': _workbook_signature(workbook_path), 'modules': modules}
+    fd, tmp_path = tempfile.mkstemp(dir=state_path.parent, prefix=state_path.name, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def create_backup(workbook_path: Path, log: Log = print_log) -> Optional[Path]:
+    """バックアップ作成"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_path = workbook_path.with_suffix(f'.backup_{timestamp}.xlsm')
+    try:
+        shutil.copy2(workbook_path, backup_path)
+        log(f"バックアップ作成: {backup_path.name}", "SUCCESS")
+        return backup_path
+    except OSError as e:
+        log(f"バックアップ作成失敗: {e}", "WARNING")
+        return None
+
+
+def run_batch_import(config_path, backend: ImportBackend, workers: Optional[int] = None,
+                     force: bool = False, backup: Optional[bool] = None, staging_dir=None,
+                     log: Log = print_log) -> Dict:
+    """
+    設定ファイルのモジュールを一括インポート
+
+    Args:
+        config_path: vba_import_config.json（ワークブック・モジュールフォルダはこのフォルダからの相対パス）
+        backend: インポート処理（ComImportBackend / StubImportBackend）
+        workers: 読み込み・変換のスレッド数
+        force: 内容が変わっていないモジュールもインポート
+        backup: ワークブックのバックアップ（None の場合は設定ファイルの auto_backup）
+
+    Returns:
+        {'imported', 'skipped', 'failed', 'missing', 'backup', 'seconds'}
+    """
+    start = time.perf_counter()
+    config_path = Path(config_path)
+    config = load_config(config_path)
+    project_root = config_path.parent
+    workbook_path = project_root / config["workbook"]
+    modules_dir = project_root / config.get("modules_dir", "modules")
+    staging_dir = Path(staging_dir) if staging_dir else project_root / DEFAULT_STAGING_DIR
+    state_path = project_root / STATE_FILE
+
+    if not workbook_path.exists():
+        raise FileNotFoundError(f"ワークブックが見つかりません: {workbook_path}")
+
+    # フェーズ1: 読み込み・エンコーディング変換（並列、内容が変わっていないモジュールは変換しない）
+    state = load_state(state_path, workbook_path)
+    prepared = prepare_modules([modules_dir / name for name in config["modules"]], staging_dir, workers,
+                               None if force else state)
+
+    result = {'imported': [], 'skipped': [], 'failed': [], 'missing': [], 'backup': None, 'seconds': 0.0}
+    pending = []
+    for module in prepared:
+        if module.status == '変更なし':
+            result['skipped'].append(module.name)
+        elif module.staged is None:
+            key = 'missing' if module.status == '見つかりません' else 'failed'
+            result[key].append(module.name)
+            log(f"{module.name}: {module.status} {module.error}", "WARNING" if key == 'missing' else "ERROR")
+        else:
+            pending.append(module)
+            log(f"{module.name}: {module.encoding} ({module.status})", "INFO")
+
+    if result['skipped']:
+        log(f"変更なしのためスキップ: {len(result['skipped'])}個", "INFO")
+    if not pending:
+        result['seconds'] = time.perf_counter() - start
+        log("インポートするモジュールはありません", "SUCCESS")
+        return result
+
+    # フェーズ2: Excelへインポート（COMは1つのワークブックに順番に行う）
+    if backup is None:
+        backup = config.get("auto_backup", True)
+    if backup:
+        result['backup'] = create_backup(workbook_path, log)
+
+    backend.open(workbook_path)
+    try:
+        for module in pending:
+            try:
+                backend.import_module(module.staged)
+            except Exception as e:
+                result['failed'].append(module.name)
+                log(f"インポート失敗: {module.name} - {e}", "ERROR")
+                continue
+            state[module.name] = module.digest
+            result['imported'].append(module.name)
+            log(f"インポート成功: {module.name}", "SUCCESS")
+        backend.save()
+    finally:
+        backend.close()
+
+    save_state(state_path, workbook_path, state)
+    result['seconds'] = time.perf_counter() - start
+    log(f"インポート結果: {len(result['imported'])}/{len(pending)} 成功", "INFO")
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='VBAモジュール インポート（バッチモード）')
+    parser.add_argument('--config', default='vba_import_config.json', help='設定ファイル（既定: vba_import_config.json）')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='com', help='インポート処理（stub: 記録のみ）')
+    parser.add_argument('-j', '--workers', type=int, help='読み込み・変換のスレッド数')
+    parser.add_argument('--force', action='store_true', help='変更のないモジュールもインポート')
+    parser.add_argument('--no-backup', action='store_true', help='ワークブックのバックアップを作成しない')
+    parser.add_argument('--staging-dir', help=f'変換後のファイルの書き出し先（既定: {DEFAULT_STAGING_DIR}）')
+    args = parser.parse_args(argv)
+
+    try:
+        result = run_batch_import(args.config, BACKENDS[args.backend](), args.workers, args.force,
+                                  False if args.no_backup else None, args.staging_dir)
+    except Exception as e:
+        print_log(f"インポート処理エラー: {e}", "ERROR")
+        return 1
+
+    print_log(f"完了: インポート {len(result['imported'])} / スキップ {len(result['skipped'])} / "
+              f"失敗 {len(result['failed'])} / 見つかりません {len(result['missing'])} "
+              f"({result['seconds']:.2f} 秒)", "SUCCESS" if not result['failed'] else "ERROR")
+    return 1 if result['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
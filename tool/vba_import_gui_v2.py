@@ -3,7 +3,7 @@
 VBAモジュール インポート GUI ツール v2
 - JSON設定ファイル対応
 - ドラッグ&ドロップで.basファイルを追加
-- UTF-8/Shift-JIS自動変換
+- UTF-8/Shift-JIS自動変換（元ファイルは書き換えず、ステージングフォルダに変換）
 - Excelワークブック選択
 - 自動バックアップ
 - 一括インポート
@@ -21,20 +21,13 @@ from tkinter import ttk, filedialog, messagebox
 from tkinterdnd2 import DND_FILES, TkinterDnD
 import chardet
 
-# ========================================
-# デフォルト設定
-# ========================================
-DEFAULT_CONFIG = {
-    "workbook": "許認可表書き差込保存マクロ20250829.xlsm",
-    "modules": [
-        "ExcelDocumentModule.bas",
-        "ExcelMappingModule.bas",
-        "ExcelLicenseRenewalController.bas",
-        "TemplateFileMapping.bas"
-    ],
-    "auto_backup": True,
-    "modules_dir": "modules"
-}
+# 共通のエンコーディング判定（standalone-app/invoice_batch/encoding_detect.py）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'standalone-app'))
+from invoice_batch.encoding_detect import DEFAULT_SAMPLE_SIZE  # noqa: E402
+# デフォルト設定・判定・変換・インポートはバッチモード（vba_import_batch.py）と共通
+from vba_import_batch import (DEFAULT_CONFIG, DEFAULT_STAGING_DIR, ComImportBackend,  # noqa: E402
+                              classify_encoding, stage_module)
+
 
 class VBAImportGUI:
     def __init__(self, root):
@@ -44,10 +37,14 @@ class VBAImportGUI:
 
         # データ
         self.bas_files = []  # [(path, encoding, status)]
+        self.bas_data = {}  # path → 追加時に1回だけ読み込んだ内容
+        self.staged_paths = {}  # path → ステージングフォルダの変換済みファイル
+        self.tree_items = {}  # ファイル名 → Treeviewのアイテム
         self.excel_path = None
         self.config = DEFAULT_CONFIG.copy()
         self.config_path = None
         self.project_root = Path.cwd()
+        self.staging_dir = self.project_root / DEFAULT_STAGING_DIR
 
         self.setup_ui()
         self.try_load_config()
@@ -318,25 +315,15 @@ class VBAImportGUI:
             self.excel_path_var.set(self.excel_path.name)
             self.log(f"Excelワークブック選択: {self.excel_path.name}", "SUCCESS")
 
-    def detect_encoding(self, file_path: Path) -> str:
-        """エンコーディング検出"""
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                f.read()
-            return 'UTF-8'
-        except UnicodeDecodeError:
-            pass
-
-        try:
-            with open(file_path, 'r', encoding='shift_jis') as f:
-                f.read()
-            return 'Shift-JIS'
-        except UnicodeDecodeError:
-            pass
+    def detect_encoding(self, data: bytes) -> str:
+        """エンコーディング検出（読み込み済みのバイト列から判定）"""
+        encoding = classify_encoding(data)
+        if encoding != 'Unknown':
+            return encoding
 
+        # UTF-8 / Shift-JIS のどちらでもない場合のみ chardet（先頭サンプルのみ）
         try:
-            with open(file_path, 'rb') as f:
-                result = chardet.detect(f.read())
+            result = chardet.detect(data[:DEFAULT_SAMPLE_SIZE])
             return result['encoding'] if result['encoding'] else 'Unknown'
         except:
             return 'Unknown'
@@ -359,14 +346,22 @@ class VBAImportGUI:
                 self.log(f"既に追加済み: {file_path.name}", "WARNING")
                 return
 
+        # 1回だけ読み込み、判定・変換はメモリ上の内容で行う
+        try:
+            data = file_path.read_bytes()
+        except OSError as e:
+            self.log(f"読み込み失敗: {file_path.name} - {e}", "ERROR")
+            return
+
         # エンコーディング検出
-        encoding = self.detect_encoding(file_path)
+        encoding = self.detect_encoding(data)
 
         # リストに追加
         self.bas_files.append((file_path, encoding, "待機中"))
+        self.bas_data[file_path] = data
 
         # Treeviewに追加
-        self.tree.insert("", tk.END, values=(file_path.name, encoding, "待機中"))
+        self.tree_items[file_path.name] = self.tree.insert("", tk.END, values=(file_path.name, encoding, "待機中"))
 
         self.log(f"追加: {file_path.name} ({encoding})", "INFO")
 
@@ -396,6 +391,10 @@ class VBAImportGUI:
 
             # リストから削除
             self.bas_files = [(p, e, s) for p, e, s in self.bas_files if p.name != file_name]
+            for path in [p for p in self.bas_data if p.name == file_name]:
+                del self.bas_data[path]
+                self.staged_paths.pop(path, None)
+            self.tree_items.pop(file_name, None)
 
             # Treeviewから削除
             self.tree.delete(item)
@@ -406,25 +405,24 @@ class VBAImportGUI:
         """全ファイルをクリア"""
         if messagebox.askyesno("確認", "全てのファイルをクリアしますか？"):
             self.bas_files.clear()
+            self.bas_data.clear()
+            self.staged_paths.clear()
+            self.tree_items.clear()
             self.tree.delete(*self.tree.get_children())
             self.log("全ファイルをクリアしました", "INFO")
 
     # ========================================
     # インポート実行
     # ========================================
-    def convert_to_shift_jis(self, file_path: Path) -> bool:
-        """UTF-8からShift-JISに変換"""
+    def stage_file(self, file_path: Path, encoding: str):
+        """読み込み済みの内容を変換してステージングフォルダに書き出す（元ファイルは変更しない）"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-
-            with open(file_path, 'w', encoding='shift_jis', errors='replace') as f:
-                f.write(content)
-
-            return True
-        except Exception as e:
+            staged, status = stage_module(file_path.name, self.bas_data[file_path], encoding, self.staging_dir)
+        except (OSError, UnicodeError) as e:
             self.log(f"変換エラー: {file_path.name} - {e}", "ERROR")
-            return False
+            return None, '変換失敗'
+        self.staged_paths[file_path] = staged
+        return staged, status
 
     def create_backup(self, workbook_path: Path) -> Path:
         """バックアップ作成"""
@@ -466,25 +464,25 @@ class VBAImportGUI:
         # フェーズ1: エンコーディング変換
         self.log("\nフェーズ1: エンコーディング変換", "INFO")
 
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        self.staged_paths.clear()
+
         for i, (file_path, encoding, _) in enumerate(self.bas_files):
             if encoding == 'UTF-8':
                 self.log(f"{file_path.name}: UTF-8 → Shift-JIS 変換中...", "INFO")
-
-                if self.convert_to_shift_jis(file_path):
-                    self.bas_files[i] = (file_path, 'Shift-JIS', '変換完了')
-                    self.update_tree_item(file_path.name, encoding='Shift-JIS', status='変換完了')
-                    self.log(f"{file_path.name}: 変換成功", "SUCCESS")
-                else:
-                    self.bas_files[i] = (file_path, encoding, '変換失敗')
-                    self.update_tree_item(file_path.name, status='変換失敗')
             elif encoding == 'Shift-JIS':
                 self.log(f"{file_path.name}: すでにShift-JIS", "INFO")
-                self.bas_files[i] = (file_path, encoding, '変換不要')
-                self.update_tree_item(file_path.name, status='変換不要')
             else:
                 self.log(f"{file_path.name}: エンコーディング不明、そのまま続行", "WARNING")
-                self.bas_files[i] = (file_path, encoding, '未変換')
-                self.update_tree_item(file_path.name, status='未変換')
+
+            staged, status = self.stage_file(file_path, encoding)
+            if status == '変換完了':
+                self.bas_files[i] = (file_path, 'Shift-JIS', status)
+                self.update_tree_item(file_path.name, encoding='Shift-JIS', status=status)
+                self.log(f"{file_path.name}: 変換成功", "SUCCESS")
+            else:
+                self.bas_files[i] = (file_path, encoding, status)
+                self.update_tree_item(file_path.name, status=status)
 
         # フェーズ2: インポート実行
         self.log("\nフェーズ2: Excelへインポート", "INFO")
@@ -517,48 +515,32 @@ class VBAImportGUI:
 
     def update_tree_item(self, file_name, encoding=None, status=None):
         """Treeviewアイテムを更新"""
-        for item in self.tree.get_children():
-            values = list(self.tree.item(item, 'values'))
-            if values[0] == file_name:
-                if encoding:
-                    values[1] = encoding
-                if status:
-                    values[2] = status
-                self.tree.item(item, values=values)
-                break
+        item = self.tree_items.get(file_name)
+        if item is None:
+            return
+        values = list(self.tree.item(item, 'values'))
+        if encoding:
+            values[1] = encoding
+        if status:
+            values[2] = status
+        self.tree.item(item, values=values)
 
     def import_to_excel(self) -> bool:
-        """Excelへインポート（COM経由）"""
+        """Excelへインポート（COM経由、既存モジュールは開いた時に1回だけ列挙）"""
+        backend = ComImportBackend(visible=True)
         try:
-            import win32com.client as win32
-
             # Excel起動
             self.log("Excelを起動中...", "INFO")
-            excel = win32.Dispatch("Excel.Application")
-            excel.Visible = True
-            excel.DisplayAlerts = False
-
-            # ワークブックを開く
             self.log(f"ワークブックを開いています: {self.excel_path.name}", "INFO")
-            wb = excel.Workbooks.Open(str(self.excel_path.absolute()))
-            vb_project = wb.VBProject
+            backend.open(self.excel_path)
 
-            # モジュールをインポート
+            # モジュールをインポート（ステージングフォルダの変換済みファイル）
             success_count = 0
 
             for file_path, encoding, status in self.bas_files:
                 try:
-                    module_name = file_path.stem
-
-                    # 既存モジュール削除
-                    for vb_comp in vb_project.VBComponents:
-                        if vb_comp.Name == module_name:
-                            self.log(f"既存モジュールを削除: {module_name}", "INFO")
-                            vb_project.VBComponents.Remove(vb_comp)
-                            break
-
-                    # モジュールインポート
-                    vb_project.VBComponents.Import(str(file_path.absolute()))
+                    if backend.import_module(self.staged_paths.get(file_path, file_path)):
+                        self.log(f"既存モジュールを置き換え: {file_path.stem}", "INFO")
                     self.log(f"インポート成功: {file_path.name}", "SUCCESS")
                     self.update_tree_item(file_path.name, status='インポート成功')
                     success_count += 1
@@ -569,17 +551,17 @@ class VBAImportGUI:
 
             # 保存
             self.log("ワークブックを保存中...", "INFO")
-            wb.Save()
+            backend.save()
 
             self.log(f"インポート結果: {success_count}/{len(self.bas_files)} 成功", "INFO")
 
-            excel.DisplayAlerts = True
-
             return success_count == len(self.bas_files)
 
         except Exception as e:
             self.log(f"Excel処理エラー: {e}", "ERROR")
             return False
+        finally:
+            backend.close()
 
 def main():
     root = TkinterDnD.Tk()